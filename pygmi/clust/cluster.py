@@ -295,6 +295,7 @@ class Cluster(QtWidgets.QDialog):
             masktmp += i.data.mask
         for i, _ in enumerate(data):
             data[i].data.mask = masktmp
+            data[i].clear_cache()
         X = np.array([i.data.compressed() for i in data]).T
         Xorig = X.copy()
 
@@ -261,6 +261,7 @@ class CrispClust(QtWidgets.QDialog):
             masktmp += i.data.mask
         for i, _ in enumerate(data):    # Apply this to all the bands
             data[i].data.mask = masktmp
+            data[i].clear_cache()
 # #############################################################################
 
 #        dat_in = np.array([i.data.flatten() for i in data]).T
@@ -271,6 +271,7 @@ class FuzzyClust(QtWidgets.QDialog):
             masktmp += i.data.mask
         for i, _ in enumerate(data):    # Apply this to all the bands
             data[i].data.mask = masktmp
+            data[i].clear_cache()
 # #############################################################################
 
         dat_in = np.array([i.data.compressed() for i in data]).T
@@ -61,6 +61,11 @@ class MyMplCanvas(FigureCanvas):
         self.x = None
         self.z = None
         self.cnum = 10
+        self.data1 = None
+        self.rcol = None
+        self.bcol = None
+        self.shaded = None
+        self.shade_cmap = None
 
         FigureCanvas.setSizePolicy(self, QtWidgets.QSizePolicy.Expanding,
                                    QtWidgets.QSizePolicy.Expanding)
@@ -179,6 +184,11 @@ class MyMplCanvas(FigureCanvas):
         None.
 
         """
+        # The shaded relief only depends on the data and scale, so it is kept
+        # when just the rotation angle changes.
+        if data1 is not self.data1 or scale != self.scale:
+            self.shaded = None
+        self.data1 = data1
         self.scale = scale
         self.rotang = rotang
 
@@ -186,12 +196,15 @@ class MyMplCanvas(FigureCanvas):
 
         self.z = data1.data*scale
         dxy = data1.xdim
-        y, x = np.indices(self.z.shape)
+        _, x = np.indices(self.z.shape)
         self.x = x*int(dxy)
-        y = y*int(dxy)
 
-        self.red1 = rot_and_clean(self.x, y, self.z, rotang, 'red')
-        self.blue1 = rot_and_clean(self.x, y, self.z, rotang, 'blue')
+        self.rcol = stereo_columns(self.x, self.z, rotang, 'red')
+        self.bcol = stereo_columns(self.x, self.z, rotang, 'blue')
+
+        zi = np.ma.filled(self.z-np.mean(self.z), 0)
+        self.red1 = np.ma.masked_equal(shift_columns(zi, self.rcol), 0)
+        self.blue1 = np.ma.masked_equal(shift_columns(zi, self.bcol), 0)
 
         self.update_colors(shade, cmap, atype)
 
@@ -229,14 +242,22 @@ class MyMplCanvas(FigureCanvas):
             self.blue = cmap(tmp)
             self.blue[:, :, 3] = np.logical_not(self.blue1.mask)
         else:
-            alpha = 0
-            cell = 100
-            azim = np.deg2rad(45)
-            elev = np.deg2rad(45)
-            self.red = sunshade(self.red1, azim=azim, elev=elev, alpha=alpha,
-                                cell=cell, cmap=cmap)
-            self.blue = sunshade(self.blue1, azim=azim, elev=elev, alpha=alpha,
-                                 cell=cell, cmap=cmap)
+            if self.shaded is None or self.shade_cmap != cmap.name:
+                alpha = 0
+                cell = 100
+                azim = np.deg2rad(45)
+                elev = np.deg2rad(45)
+                zmean = np.mean(self.z)
+                zi = np.ma.array(np.ma.filled(self.z, zmean),
+                                 mask=np.ma.getmaskarray(self.z))
+                self.shaded = sunshade(zi, azim=azim, elev=elev, alpha=alpha,
+                                       cell=cell, cmap=cmap)
+                self.shade_cmap = cmap.name
+
+            self.red = shift_columns(self.shaded, self.rcol)
+            self.red[:, :, 3] = np.logical_not(self.red1.mask)
+            self.blue = shift_columns(self.shaded, self.bcol)
+            self.blue[:, :, 3] = np.logical_not(self.blue1.mask)
 
         self.update_atype(atype)
 
@@ -786,39 +807,102 @@ def rot_and_clean(x, y, z, rotang=5, rtype='red'):
         Output data.
 
     """
-    if rtype == 'red':
-        rotang = -1. * abs(rotang)
-    else:
-        rotang = -1. * abs(rotang)
+    scol = stereo_columns(x, z, rotang, rtype)
+
+    zi = np.ma.filled(z-np.mean(z), 0)
+    zmap = shift_columns(zi, scol)
+
+    zmap = np.ma.masked_equal(zmap, 0)
+
+    return zmap
+
+
+def stereo_columns(x, z, rotang=5, rtype='red'):
+    """
+    Find the source columns seen in a rotated view of the data.
+
+    The data is rotated about the y-axis, and for every output pixel the
+    fractional column of z which projects onto it is found. All rows are
+    interpolated together in a single pass.
+
+    Parameters
+    ----------
+    x : numpy array
+        X coordinates.
+    z : numpy array
+        Z coordinates (or data values).
+    rotang : float, optional
+        Rotation angle. The default is 5.
+    rtype : str, optional
+        Rotation type. The default is 'red'.
+
+    Returns
+    -------
+    scol : numpy array
+        Fractional source columns, with the same shape as z.
+
+    """
+    if rtype != 'red':
         z = z[:, ::-1]
 
-    a = np.deg2rad(rotang)
-    m = [[np.cos(a), 0, np.sin(a)], [0, 1, 0], [-np.sin(a), 0, np.cos(a)]]
+    a = np.deg2rad(-1. * abs(rotang))
 
     x = x-x.min()
-    y = y-y.min()
-    z = z-np.mean(z)
+    z = np.ma.filled(z-np.mean(z), 0)
 
-    z.set_fill_value(0)
-    z = z.filled()
+    x1 = x*np.cos(a) - z*np.sin(a)
 
-    t = np.transpose([x, y, z])
-    x1, _, _ = np.transpose(t @ m)
+# When you rotate about the y-axis, a peak can fold back over the terrain
+# behind it, giving more than one solution for an x coordinate. A running
+# maximum hides the folded part, keeping the first solution, and leaves each
+# row increasing as np.interp requires.
+    x1 = np.maximum.accumulate(x1, axis=1)
 
-    zmap = np.zeros(x.shape)
+    rows, cols = x1.shape
 
-# Note that when you rotate about the y-axis, a peak will be rotated
-# this means that you can have more that one solution for an x coordinate
-# np.interp always takes the first solution, which co-incidentally happens
-# to be the one we want in this case.
+# Offset each row past the end of the previous one so that the whole grid
+# can be interpolated at once. Queries are clipped to their own row first.
+    offset = np.arange(rows)[:, np.newaxis]*(np.ptp(x1)+1.)
+    xq = np.clip(x[0], x1[:, :1], x1[:, -1:]) + offset
+    x1 = x1 + offset
 
-    zi = np.ma.filled(z)
-    for j, xi in enumerate(x1):
-        zmap[j] = np.interp(x[0], xi, zi[j])
+    scol = np.interp(xq.ravel(), x1.ravel(), np.tile(np.arange(cols), rows))
+    scol = scol.reshape(rows, cols)
 
     if rtype != 'red':
-        zmap = zmap[:, ::-1]
+        scol = (cols-1) - scol[:, ::-1]
 
-    zmap = np.ma.masked_equal(zmap, 0)
+    return scol
 
-    return zmap
+
+def shift_columns(data, scol):
+    """
+    Resample data along its rows at fractional columns.
+
+    Parameters
+    ----------
+    data : numpy array
+        Input data, with rows and columns as the first two dimensions, e.g.
+        a grid or an RGBA image.
+    scol : numpy array
+        Fractional source columns, from stereo_columns.
+
+    Returns
+    -------
+    dout : numpy array
+        Linearly interpolated output data.
+
+    """
+    cols = data.shape[1]
+
+    col0 = np.clip(np.floor(scol).astype(int), 0, max(cols-2, 0))
+    col1 = np.minimum(col0+1, cols-1)
+    frac = scol-col0
+    rows = np.arange(data.shape[0])[:, np.newaxis]
+
+    if data.ndim > 2:
+        frac = frac.reshape(frac.shape+(1,)*(data.ndim-2))
+
+    dout = data[rows, col0]*(1.-frac) + data[rows, col1]*frac
+
+    return dout
@@ -33,9 +33,11 @@
 import copy
 from PyQt5 import QtWidgets, QtCore
 import numpy as np
-import scipy.signal as si
+import scipy.fft as sfft
+from numba import jit, prange
 
 import pygmi.menu_default as menu_default
+from pygmi.raster.smooth import correlate2d
 
 
 class Gradients(QtWidgets.QDialog):
@@ -374,6 +376,8 @@ def visibility2d(data, wsize, dh, piter=iter):
         window size, must be odd
     dh : float
         height of observer above surface
+    piter : function, optional
+        Progress bar iterable. Default is iter.
 
     Returns
     -------
@@ -386,88 +390,120 @@ def visibility2d(data, wsize, dh, piter=iter):
 
     """
     nr, nc = np.shape(data)
-    wsize = abs(np.real(wsize))
+    wsize = int(abs(np.real(wsize)))
     w2 = int(np.floor(wsize/2))
-    vn = np.zeros([nr, nc])
-    vs = np.zeros([nr, nc])
-    ve = np.zeros([nr, nc])
-    vw = np.zeros([nr, nc])
-    vd1 = np.zeros([nr, nc])
-    vd2 = np.zeros([nr, nc])
-    vd3 = np.zeros([nr, nc])
-    vd4 = np.zeros([nr, nc])
-    vstd = np.zeros([nr, nc])
     mask = np.ma.getmaskarray(data)
     mean = data.mean()
-    data = data.data
-    data[mask] = mean
-
-    for j in piter(range(nc)):    # Columns
-        for i in range(w2, nr-w2):
-            dtmp = data[i-w2:i+w2+1, j]
-            vn[i, j] = __visible1(dtmp, wsize, w2+1, dh)
-            vs[i, j] = __visible2(dtmp, w2+1, dh)
-
-    for j in piter(range(w2, nc-w2)):    # Rows
-        for i in range(nr):
-            dtmp = data[i, j-w2:j+w2+1]
-            ve[i, j] = __visible1(dtmp, wsize, w2+1, dh)
-            vw[i, j] = __visible2(dtmp, w2+1, dh)
-
-    for j in piter(range(w2, nc-w2)):
-        for i in range(w2, nr-w2):
-            dtmp = np.zeros(wsize)
-            for k in range(wsize):
-                dtmp[k] = data[i-w2+k, j-w2+k]
-            vd1[i, j] = __visible1(dtmp, wsize, w2+1, dh)
-            vd2[i, j] = __visible2(dtmp, w2+1, dh)
-            dtmp = np.zeros(wsize)
-            for k in range(wsize):
-                dtmp[k] = data[i+w2-k, j-w2+k]
-            vd3[i, j] = __visible1(dtmp, wsize, w2+1, dh)
-            vd4[i, j] = __visible2(dtmp, w2+1, dh)
-
-    vtot = vn+vs+ve+vw+vd1+vd2+vd3+vd4
-    vtot = vtot[w2:nr-w2, w2:nc-w2]
-
-    for j in piter(range(nc)):
-        for i in range(nr):
-            vstd[i, j] = np.std([vn[i, j], vs[i, j], ve[i, j], vw[i, j],
-                                 vd1[i, j], vd2[i, j], vd3[i, j],
-                                 vd4[i, j]], ddof=1)
-
-    vstd = vstd[w2:nr-w2, w2:nc-w2]
+    data = np.ma.filled(data, mean).astype(np.float64)
 
-    dtr = np.pi/180
-    c45 = np.cos(45*dtr)
-    s45 = np.sin(45*dtr)
-    vsumx = ve-vw+vd1*c45-vd2*c45+vd3*c45-vd4*c45
-    vsumy = vn-vs+vd1*s45-vd2*s45-vd3*s45+vd4*s45
-    vsum = np.sqrt(vsumx*vsumx+vsumy*vsumy)
-    vsum = vsum[w2:nr-w2, w2:nc-w2]
+    vtot = np.zeros([nr-2*w2, nc-2*w2])
+    vstd = np.zeros([nr-2*w2, nc-2*w2])
+    vsum = np.zeros([nr-2*w2, nc-2*w2])
+
+    # The rows are processed in strips so that progress can be reported.
+    rstep = 64
+    for r0 in piter(range(w2, nr-w2, rstep)):
+        r1 = min(r0+rstep, nr-w2)
+        _visibility_rows(data, wsize, w2, float(dh), r0, r1, vtot, vstd,
+                         vsum)
 
     vtot = np.ma.array(vtot)
     vstd = np.ma.array(vstd)
     vsum = np.ma.array(vsum)
-    vtot.mask = mask[w2:-w2, w2:-w2]
-    vstd.mask = mask[w2:-w2, w2:-w2]
-    vsum.mask = mask[w2:-w2, w2:-w2]
+    vtot.mask = mask[w2:nr-w2, w2:nc-w2]
+    vstd.mask = mask[w2:nr-w2, w2:nc-w2]
+    vsum.mask = mask[w2:nr-w2, w2:nc-w2]
 
     return vtot, vstd, vsum
 
 
-def __visible1(dat, nr, cp, dh):
+@jit(nopython=True, parallel=True)
+def _visibility_rows(data, wsize, w2, dh, r0, r1, vtot, vstd, vsum):
+    """
+    Visibility for a strip of rows, in all eight directions.
+
+    Parameters
+    ----------
+    data : numpy array
+        Input dataset with no masked values.
+    wsize : int
+        Window size.
+    w2 : int
+        Half window size.
+    dh : float
+        Observer height.
+    r0 : int
+        First row to process.
+    r1 : int
+        Row to stop before.
+    vtot : numpy array
+        Output total visibility. Offset by w2 from data.
+    vstd : numpy array
+        Output visibility variation. Offset by w2 from data.
+    vsum : numpy array
+        Output visibility vector resultant. Offset by w2 from data.
+
+    Returns
+    -------
+    None.
+
+    """
+    nc = data.shape[1]
+    dtr = np.pi/180
+    c45 = np.cos(45*dtr)
+    s45 = np.sin(45*dtr)
+
+    for i in prange(r0, r1):
+        vis = np.zeros(8)
+        for j in range(w2, nc-w2):
+            vis[0] = _visible1(data, i, j, 1, 0, wsize, w2, dh)
+            vis[1] = _visible2(data, i, j, 1, 0, w2, dh)
+            vis[2] = _visible1(data, i, j, 0, 1, wsize, w2, dh)
+            vis[3] = _visible2(data, i, j, 0, 1, w2, dh)
+            vis[4] = _visible1(data, i, j, 1, 1, wsize, w2, dh)
+            vis[5] = _visible2(data, i, j, 1, 1, w2, dh)
+            vis[6] = _visible1(data, i, j, -1, 1, wsize, w2, dh)
+            vis[7] = _visible2(data, i, j, -1, 1, w2, dh)
+
+            vmean = vis.sum()/8.
+            var = 0.
+            for k in range(8):
+                var += (vis[k]-vmean)**2
+
+            vsumx = (vis[2]-vis[3]+vis[4]*c45-vis[5]*c45+vis[6]*c45 -
+                     vis[7]*c45)
+            vsumy = (vis[0]-vis[1]+vis[4]*s45-vis[5]*s45-vis[6]*s45 +
+                     vis[7]*s45)
+
+            vtot[i-w2, j-w2] = vis.sum()
+            vstd[i-w2, j-w2] = np.sqrt(var/7.)
+            vsum[i-w2, j-w2] = np.sqrt(vsumx*vsumx+vsumy*vsumy)
+
+
+@jit(nopython=True)
+def _visible1(data, i, j, di, dj, nr, w2, dh):
     """
     Visible 1.
 
+    The profile is data[i+(k-w2)*di, j+(k-w2)*dj], with k the position in
+    the window.
+
     Parameters
     ----------
-    dat : numpy array
-        Input vector.
+    data : numpy array
+        Input dataset.
+    i : int
+        Row of center point.
+    j : int
+        Column of center point.
+    di : int
+        Row step along the profile.
+    dj : int
+        Column step along the profile.
     nr : int
         Window size. Must be odd.
-    cp : int
-        Center point.
+    w2 : int
+        Half window size. The center point is at w2.
     dh : float
         Observer height.
 
@@ -479,12 +515,12 @@ def __visible1(dat, nr, cp, dh):
     """
     num = 1
 
-    if cp < nr-1 and dat.size > 0:
+    if w2+1 < nr-1:
         num = 2
-        cpn = cp-1
-        thetamax = float(dat[cpn+1]-dat[cpn]-dh)
-        for i in range(cpn+2, nr):
-            theta = ((dat[i]-dat[cpn]-dh)/float(i-cpn))
+        dcp = data[i, j]
+        thetamax = data[i+di, j+dj]-dcp-dh
+        for k in range(w2+2, nr):
+            theta = (data[i+(k-w2)*di, j+(k-w2)*dj]-dcp-dh)/(k-w2)
             if theta >= thetamax:
                 num = num + 1
                 thetamax = theta
@@ -492,16 +528,28 @@ def __visible1(dat, nr, cp, dh):
     return num
 
 
-def __visible2(dat, cp, dh):
+@jit(nopython=True)
+def _visible2(data, i, j, di, dj, w2, dh):
     """
     Visible 2.
 
+    The profile is data[i+(k-w2)*di, j+(k-w2)*dj], with k the position in
+    the window.
+
     Parameters
     ----------
-    dat : numpy array
-        Input vector.
-    cp : int
-        Center point.
+    data : numpy array
+        Input dataset.
+    i : int
+        Row of center point.
+    j : int
+        Column of center point.
+    di : int
+        Row step along the profile.
+    dj : int
+        Column step along the profile.
+    w2 : int
+        Half window size. The center point is at w2.
     dh : float
         Observer height.
 
@@ -513,12 +561,12 @@ def __visible2(dat, cp, dh):
     """
     num = 0
 
-    if cp > 2 and dat.size > 0:
+    if w2+1 > 2:
         num = 1
-        cpn = cp-1
-        thetamax = (dat[cpn-1]-dat[cpn]-dh)
-        for i in range(cpn-2, -1, -1):
-            theta = ((dat[i]-dat[cpn]-dh)/(cpn-i))
+        dcp = data[i, j]
+        thetamax = data[i-di, j-dj]-dcp-dh
+        for k in range(w2-2, -1, -1):
+            theta = (data[i+(k-w2)*di, j+(k-w2)*dj]-dcp-dh)/(w2-k)
             if theta >= thetamax:
                 num = num + 1
                 thetamax = theta
@@ -637,6 +685,7 @@ class Tilt1(QtWidgets.QDialog):
 
         for i in data2:
             i.data.data[i.data.mask] = i.nullvalue
+            i.clear_cache()
 
         self.outdata['Raster'] = data2
         return True
@@ -677,11 +726,10 @@ def tilt1(data, azi, s):
 
     if s > 0:
         se = np.ones((s, s))/(s*s)
-        data2 = si.convolve2d(data, se, 'valid')  # smooth
-        mask = si.convolve2d(data.mask, se, 'valid')
-        data = np.ma.array(data2, mask=mask)
+        data2 = correlate2d(data.data, se, 'valid')  # smooth
+        mask = correlate2d(np.ma.getmaskarray(data), se, 'valid')
+        data = np.ma.array(data2, mask=(mask > 0.5/(s*s)))
 
-    nr, nc = data.shape
     dtr = np.pi/180.0
     azi = azi*dtr
 
@@ -689,9 +737,7 @@ def tilt1(data, azi, s):
 #    dx = dx.astype(np.float64)
 #    dy = dy.astype(np.float64)
     dxtot = np.ma.sqrt(dx*dx+dy*dy)
-    nmax = np.max([nr, nc])
-    npts = int(2**nextpow2(nmax))
-    dz = vertical(data, npts, 1)
+    dz = vertical(data, None, 1)
     t1 = np.ma.arctan(dz/dxtot)
     th = np.real(np.arctanh(np.nan_to_num(dz/dxtot)+(0+0j)))
     tdx = np.real(np.ma.arctan(dxtot/abs(dz)))
@@ -707,9 +753,9 @@ def tilt1(data, azi, s):
     if s < 3:
         s = 3
     se = np.ones([s, s])/(s*s)
-    ts = si.convolve2d(t1, se, 'same')
+    ts = correlate2d(np.ma.getdata(t1), se, 'same')
     [dxs, dys] = np.gradient(ts)
-    dzs = vertical(ts, npts, 1)
+    dzs = vertical(ts, None, 1)
     dxtots = np.ma.sqrt(dxs*dxs+dys*dys)
     t2 = np.ma.arctan(dzs/dxtots)
 
@@ -749,12 +795,16 @@ def vertical(data, npts=None, xint=1):
     """
     Vertical derivative.
 
+    The wavenumber grid is built by broadcasting and applied to a real FFT
+    of the padded data.
+
     Parameters
     ----------
     data : numpy array
         Input data.
     npts : int, optional
-        Number of points. The default is None.
+        Number of points to pad both axes to. The default is None, which
+        pads to the power of two above the longest axis.
     xint : float, optional
         X interval. The default is 1.
 
@@ -771,29 +821,26 @@ def vertical(data, npts=None, xint=1):
         z = z.filled(0.)
 
     if npts is None:
-        nmax = np.max([nr, nc])
-        npts = int(2**nextpow2(nmax))
-
-    cdiff = int(np.floor((npts-nc)/2))
-    rdiff = int(np.floor((npts-nr)/2))
-    cdiff2 = npts-cdiff-nc
-    rdiff2 = npts-rdiff-nr
+        npts = int(2**nextpow2(max(nr, nc)))
+    nrpts = npts
+    ncpts = npts
+
+    cdiff = int(np.floor((ncpts-nc)/2))
+    rdiff = int(np.floor((nrpts-nr)/2))
+    cdiff2 = ncpts-cdiff-nc
+    rdiff2 = nrpts-rdiff-nr
     data1 = np.pad(z, [[rdiff, rdiff2], [cdiff, cdiff2]], 'edge')
 
-    f = np.fft.fft2(data1)
-    fz = f
-    wn = 2.0*np.pi/(xint*(npts-1))
-    f = np.fft.fftshift(f)
-    cx = npts/2+1
-    cy = cx
-    for i in range(npts):
-        freqx = (i+1-cx)*wn
-        for j in range(npts):
-            freqy = (j+1-cy)*wn
-            freq = np.sqrt(freqx*freqx+freqy*freqy)
-            fz[i, j] = f[i, j]*freq
-    fz = np.fft.fftshift(fz)
-    fzinv = np.fft.ifft2(fz)
-    dz = np.real(fzinv[rdiff:nr+rdiff, cdiff:nc+cdiff])
+    f = sfft.rfft2(data1, workers=-1)
+
+    # Wavenumber spacing is 2*pi/(xint*(n-1)) along each axis.
+    wny = 2.0*np.pi/(xint*max(nrpts-1, 1))
+    wnx = 2.0*np.pi/(xint*max(ncpts-1, 1))
+    freqy = sfft.fftfreq(nrpts, 1./nrpts)*wny
+    freqx = sfft.rfftfreq(ncpts, 1./ncpts)*wnx
+    freq = np.sqrt(freqy[:, np.newaxis]**2+freqx[np.newaxis, :]**2)
+
+    fzinv = sfft.irfft2(f*freq, s=data1.shape, workers=-1)
+    dz = fzinv[rdiff:nr+rdiff, cdiff:nc+cdiff]
 
     return dz
@@ -28,13 +28,17 @@ from __future__ import print_function
 
 import os
 import copy
+import tempfile
 from collections import Counter
+from functools import lru_cache
 from PyQt5 import QtWidgets, QtCore, QtGui
 import numpy as np
-from osgeo import gdal, osr, ogr
+from osgeo import gdal, gdal_array, osr, ogr
 import pandas as pd
-from PIL import Image, ImageDraw
+import scipy.fft as sfft
 import scipy.ndimage as ndimage
+from scipy.spatial import cKDTree
+from numba import jit, prange
 import pygmi.menu_default as menu_default
 from pygmi.raster.datatypes import Data
 
@@ -121,7 +125,8 @@ class DataGrid(QtWidgets.QDialog):
     """
     Grid Point Data.
 
-    This class grids point data using a nearest neighbourhood technique.
+    This class grids point data using a quick nearest neighbourhood
+    technique, minimum curvature or inverse distance weighting.
 
     Attributes
     ----------
@@ -145,8 +150,12 @@ class DataGrid(QtWidgets.QDialog):
 #        self.dsb_null = QtWidgets.QDoubleSpinBox()
         self.dsb_dxy = QtWidgets.QLineEdit('1.0')
         self.dsb_null = QtWidgets.QLineEdit('0.0')
+        self.dsb_bdist = QtWidgets.QLineEdit('0.0')
+        self.dsb_tension = QtWidgets.QDoubleSpinBox()
+        self.sb_tilesize = QtWidgets.QSpinBox()
 
         self.dataid = QtWidgets.QComboBox()
+        self.grid_method = QtWidgets.QComboBox()
         self.label_rows = QtWidgets.QLabel('Rows: 0')
         self.label_cols = QtWidgets.QLabel('Columns: 0')
 
@@ -167,6 +176,10 @@ class DataGrid(QtWidgets.QDialog):
         label_band = QtWidgets.QLabel('Column to Grid:')
         label_dxy = QtWidgets.QLabel('Cell Size:')
         label_null = QtWidgets.QLabel('Null Value:')
+        label_method = QtWidgets.QLabel('Gridding Method:')
+        label_bdist = QtWidgets.QLabel('Blanking Distance (0 for none):')
+        label_tension = QtWidgets.QLabel('Tension:')
+        label_tilesize = QtWidgets.QLabel('Tile Size (nodes):')
 
 #        self.dsb_null.setMaximum(np.finfo(np.double).max)
 #        self.dsb_null.setMinimum(np.finfo(np.double).min)
@@ -178,6 +191,17 @@ class DataGrid(QtWidgets.QDialog):
 
         self.dsb_dxy.setValidator(val)
         self.dsb_null.setValidator(val)
+        self.dsb_bdist.setValidator(val)
+
+        self.grid_method.addItems(['Quick Grid', 'Minimum Curvature',
+                                   'Inverse Distance Weighting',
+                                   'Nearest Neighbour'])
+        self.dsb_tension.setMaximum(1.)
+        self.dsb_tension.setSingleStep(0.05)
+        self.dsb_tension.setValue(0.25)
+        self.sb_tilesize.setRange(64, 8192)
+        self.sb_tilesize.setSingleStep(64)
+        self.sb_tilesize.setValue(512)
 
 #        self.dsb_dxy.setMaximum(9999999999.0)
 #        self.dsb_dxy.setMinimum(0.0000001)
@@ -196,8 +220,16 @@ class DataGrid(QtWidgets.QDialog):
         gridlayout_main.addWidget(self.dataid, 3, 1, 1, 1)
         gridlayout_main.addWidget(label_null, 4, 0, 1, 1)
         gridlayout_main.addWidget(self.dsb_null, 4, 1, 1, 1)
-        gridlayout_main.addWidget(helpdocs, 5, 0, 1, 1)
-        gridlayout_main.addWidget(buttonbox, 5, 1, 1, 3)
+        gridlayout_main.addWidget(label_method, 5, 0, 1, 1)
+        gridlayout_main.addWidget(self.grid_method, 5, 1, 1, 1)
+        gridlayout_main.addWidget(label_bdist, 6, 0, 1, 1)
+        gridlayout_main.addWidget(self.dsb_bdist, 6, 1, 1, 1)
+        gridlayout_main.addWidget(label_tension, 7, 0, 1, 1)
+        gridlayout_main.addWidget(self.dsb_tension, 7, 1, 1, 1)
+        gridlayout_main.addWidget(label_tilesize, 8, 0, 1, 1)
+        gridlayout_main.addWidget(self.sb_tilesize, 8, 1, 1, 1)
+        gridlayout_main.addWidget(helpdocs, 9, 0, 1, 1)
+        gridlayout_main.addWidget(buttonbox, 9, 1, 1, 3)
 
         buttonbox.accepted.connect(self.accept)
         buttonbox.rejected.connect(self.reject)
@@ -296,6 +328,8 @@ class DataGrid(QtWidgets.QDialog):
         """
         dxy = float(self.dsb_dxy.text())
         nullvalue = float(self.dsb_null.text())
+        bdist = float(self.dsb_bdist.text())
+        method = self.grid_method.currentText()
         key = list(self.indata['Line'].keys())[0]
         data = self.indata['Line'][key]
         data = data.dropna()
@@ -306,7 +340,22 @@ class DataGrid(QtWidgets.QDialog):
         y = data.pygmiY.values[filt]
         z = data[self.dataid.currentText()].values[filt]
 
-        tmp = quickgrid(x, y, z, dxy)
+        tilesize = self.sb_tilesize.value()
+
+        if bdist <= 0.:
+            bdist = None
+
+        if method == 'Minimum Curvature':
+            tmp = mincurvgrid(x, y, z, dxy, self.dsb_tension.value(), bdist,
+                              tilesize, piter=self.pbar.iter)
+        elif method == 'Inverse Distance Weighting':
+            tmp = idwgrid(x, y, z, dxy, bdist=bdist, tilesize=tilesize,
+                          piter=self.pbar.iter)
+        elif method == 'Nearest Neighbour':
+            tmp = idwgrid(x, y, z, dxy, nnear=1, bdist=bdist,
+                          tilesize=tilesize, piter=self.pbar.iter)
+        else:
+            tmp = quickgrid(x, y, z, dxy)
         mask = np.ma.getmaskarray(tmp)
         gdat = tmp.data
 
@@ -348,6 +397,10 @@ class DataMerge(QtWidgets.QDialog):
         self.indata = {}
         self.outdata = {}
         self.parent = parent
+        if parent is not None:
+            self.piter = parent.pbar.iter
+        else:
+            self.piter = iter
 
         self.dsb_dxy = QtWidgets.QDoubleSpinBox()
         self.label_rows = QtWidgets.QLabel('Rows: 0')
@@ -400,20 +453,8 @@ class DataMerge(QtWidgets.QDialog):
         None.
 
         """
-        data = self.indata['Raster'][0]
         dxy = self.dsb_dxy.value()
-
-        xmin0, xmax0, ymin0, ymax0 = data.extent
-
-        for data in self.indata['Raster']:
-            xmin, xmax, ymin, ymax = data.extent
-            xmin = min(xmin, xmin0)
-            xmax = max(xmax, xmax0)
-            ymin = min(ymin, ymin0)
-            ymax = max(ymax, ymax0)
-
-        cols = int((xmax - xmin)/dxy)
-        rows = int((ymax - ymin)/dxy)
+        _, rows, cols = common_grid(self.indata['Raster'], dxy)
 
         self.label_rows.setText('Rows: '+str(rows))
         self.label_cols.setText('Columns: '+str(cols))
@@ -428,10 +469,7 @@ class DataMerge(QtWidgets.QDialog):
             True if successful, False otherwise.
 
         """
-        data = self.indata['Raster'][0]
-        dxy0 = min(data.xdim, data.ydim)
-        for data in self.indata['Raster']:
-            dxy = min(dxy0, data.xdim, data.ydim)
+        dxy = min(min(data.xdim, data.ydim) for data in self.indata['Raster'])
 
         self.dsb_dxy.setValue(dxy)
         tmp = self.exec_()
@@ -455,45 +493,14 @@ class DataMerge(QtWidgets.QDialog):
 
         """
         dxy = self.dsb_dxy.value()
-        data = self.indata['Raster'][0]
-        orig_wkt = data.wkt
-
-        xmin0, xmax0, ymin0, ymax0 = data.extent
-
-        for data in self.indata['Raster']:
-            xmin, xmax, ymin, ymax = data.extent
-            xmin = min(xmin, xmin0)
-            xmax = max(xmax, xmax0)
-            ymin = min(ymin, ymin0)
-            ymax = max(ymax, ymax0)
-
-        cols = int((xmax - xmin)/dxy)
-        rows = int((ymax - ymin)/dxy)
-        gtr = (xmin, dxy, 0.0, ymax, 0.0, -dxy)
+        _, rows, cols = common_grid(self.indata['Raster'], dxy)
 
         if cols == 0 or rows == 0:
             print('Your rows or cols are zero. Your input projection may be '
                   'wrong')
             return
 
-        dat = []
-        for data in self.indata['Raster']:
-            doffset = 0.0
-            if data.data.min() <= 0:
-                doffset = data.data.min()-1.
-                data.data = data.data - doffset
-            gtr0 = data.get_gtr()
-
-            drows, dcols = data.data.shape
-            src = data_to_gdal_mem(data, gtr0, orig_wkt, dcols, drows)
-            dest = data_to_gdal_mem(data, gtr, orig_wkt, cols, rows, True)
-
-            gdal.ReprojectImage(src, dest, orig_wkt, orig_wkt,
-                                gdal.GRA_Bilinear)
-
-            dat.append(gdal_to_dat(dest, data.dataid))
-            dat[-1].data = dat[-1].data + doffset
-            data.data = data.data + doffset
+        dat = resample_to_grid(self.indata['Raster'], dxy, piter=self.piter)
 
         self.outdata['Raster'] = dat
 
@@ -575,86 +582,14 @@ class DataReproj(QtWidgets.QDialog):
             print('Could not reproject')
             return
 
-# Input stuff
-        orig_wkt = self.in_proj.wkt
-
-        orig = osr.SpatialReference()
-        orig.ImportFromWkt(orig_wkt)
-        orig.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
-
-# Output stuff
-        targ_wkt = self.out_proj.wkt
-
-        targ = osr.SpatialReference()
-        targ.ImportFromWkt(targ_wkt)
-        targ.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
-
-# Set transformation
-        ctrans = osr.CoordinateTransformation(orig, targ)
-
-# Now create virtual dataset
         dat = []
         for data in self.pbar.iter(self.indata['Raster']):
-            datamin = data.data.min()
-            if datamin <= 0:
-                data.data = data.data-(datamin-1)
-
-# Work out the boundaries of the new dataset in the target projection
-            rows, cols = data.data.shape
-            u_l = ctrans.TransformPoint(data.extent[0], data.extent[-1])
-            u_r = ctrans.TransformPoint(data.extent[1], data.extent[-1])
-            l_l = ctrans.TransformPoint(data.extent[0], data.extent[-2])
-            l_r = ctrans.TransformPoint(data.extent[1], data.extent[-2])
-
-            lrx = l_r[0]
-            llx = l_l[0]
-            ulx = u_l[0]
-            urx = u_r[0]
-            lry = l_r[1]
-            lly = l_l[1]
-            uly = u_l[1]
-            ury = u_r[1]
-
-            drows, dcols = data.data.shape
-            minx = min(llx, ulx, urx, lrx)
-            maxx = max(llx, ulx, urx, lrx)
-            miny = min(lly, lry, ury, uly)
-            maxy = max(lly, lry, ury, uly)
-            newdimx = (maxx-minx)/dcols
-            newdimy = (maxy-miny)/drows
-            newdim = min(newdimx, newdimy)
-            cols = round((maxx - minx)/newdim)
-            rows = round((maxy - miny)/newdim)
-
-            if cols == 0 or rows == 0:
-                print('Your rows or cols are zero. Your input projection may '
-                      'be wrong')
+            try:
+                data2 = data_reproject(data, self.in_proj.wkt,
+                                       self.out_proj.wkt)
+            except ValueError as err:
+                print(err)
                 return
-
-# top left x, w-e pixel size, rotation, top left y, rotation, n-s pixel size
-            old_geo = data.get_gtr()
-            drows, dcols = data.data.shape
-            src = data_to_gdal_mem(data, old_geo, orig_wkt, dcols, drows)
-
-            new_geo = (minx, newdim, 0, maxy, 0, -newdim)
-            dest = data_to_gdal_mem(data, new_geo, targ_wkt, cols, rows, True)
-
-            gdal.ReprojectImage(src, dest, orig_wkt, targ_wkt,
-                                gdal.GRA_Bilinear)
-
-            data2 = gdal_to_dat(dest, data.dataid)
-            data2.data = data2.data.astype(data.data.dtype)
-
-            if datamin <= 0:
-                data2.data = data2.data+(datamin-1)
-                data.data = data.data+(datamin-1)
-            data2.data = np.ma.masked_equal(data2.data.filled(data.nullvalue),
-                                            data.nullvalue)
-            data2.nullvalue = data.nullvalue
-            data2.data = np.ma.masked_invalid(data2.data)
-            data2.data = np.ma.masked_less(data2.data, data.data.min())
-            data2.data = np.ma.masked_greater(data2.data, data.data.max())
-
             dat.append(data2)
 
         self.outdata['Raster'] = dat
@@ -1028,6 +963,7 @@ class Metadata(QtWidgets.QDialog):
                     if i.units != '':
                         tmp.dataid += ' ('+i.units+')'
                     tmp.data.mask = (tmp.data.data == i.nullvalue)
+                    tmp.clear_cache()
 
     def rename_id(self):
         """
@@ -1192,6 +1128,9 @@ class RTP(QtWidgets.QDialog):
         self.dataid = QtWidgets.QComboBox()
         self.dsb_inc = QtWidgets.QDoubleSpinBox()
         self.dsb_dec = QtWidgets.QDoubleSpinBox()
+        self.cb_pinc = QtWidgets.QCheckBox('Pseudo-inclination for '
+                                           'amplitude correction:')
+        self.dsb_pinc = QtWidgets.QDoubleSpinBox()
 
         self.setupui()
 
@@ -1215,6 +1154,10 @@ class RTP(QtWidgets.QDialog):
         self.dsb_inc.setMinimum(-90.0)
         self.dsb_dec.setMaximum(360.0)
         self.dsb_dec.setMinimum(-360.0)
+        self.dsb_pinc.setMaximum(90.0)
+        self.dsb_pinc.setMinimum(-90.0)
+        self.dsb_pinc.setValue(-30.0)
+        self.dsb_pinc.setEnabled(False)
         buttonbox.setOrientation(QtCore.Qt.Horizontal)
         buttonbox.setCenterButtons(True)
         buttonbox.setStandardButtons(buttonbox.Cancel | buttonbox.Ok)
@@ -1228,11 +1171,14 @@ class RTP(QtWidgets.QDialog):
         gridlayout_main.addWidget(self.dsb_inc, 1, 1, 1, 1)
         gridlayout_main.addWidget(label_dec, 2, 0, 1, 1)
         gridlayout_main.addWidget(self.dsb_dec, 2, 1, 1, 1)
-        gridlayout_main.addWidget(helpdocs, 3, 0, 1, 1)
-        gridlayout_main.addWidget(buttonbox, 3, 1, 1, 3)
+        gridlayout_main.addWidget(self.cb_pinc, 3, 0, 1, 1)
+        gridlayout_main.addWidget(self.dsb_pinc, 3, 1, 1, 1)
+        gridlayout_main.addWidget(helpdocs, 4, 0, 1, 1)
+        gridlayout_main.addWidget(buttonbox, 4, 1, 1, 3)
 
         buttonbox.accepted.connect(self.accept)
         buttonbox.rejected.connect(self.reject)
+        self.cb_pinc.stateChanged.connect(self.dsb_pinc.setEnabled)
 
     def settings(self):
         """
@@ -1277,20 +1223,21 @@ class RTP(QtWidgets.QDialog):
         """
         I_deg = self.dsb_inc.value()
         D_deg = self.dsb_dec.value()
+        I_a = None
+        if self.cb_pinc.isChecked():
+            I_a = self.dsb_pinc.value()
 
-        newdat = []
-        for data in self.pbar.iter(self.indata['Raster']):
-            if data.dataid != self.dataid.currentText():
-                continue
-            dat = rtp(data, I_deg, D_deg)
-            newdat.append(dat)
+        data = [i for i in self.indata['Raster']
+                if i.dataid == self.dataid.currentText()]
+
+        newdat = rtp_batch(data, I_deg, D_deg, I_a, piter=self.pbar.iter)
 
         self.outdata['Raster'] = newdat
 
 
-def rtp(data, I_deg, D_deg):
+def rtp(data, I_deg, D_deg, I_a=None):
     """
-    Reduction to th epole.
+    Reduction to the pole.
 
     Parameters
     ----------
@@ -1300,6 +1247,9 @@ def rtp(data, I_deg, D_deg):
         Magnetic inclination.
     D_deg : float
         Magnetic declination.
+    I_a : float, optional
+        Pseudo-inclination used for the amplitude correction at low
+        latitudes. The default is None, which uses I_deg.
 
     Returns
     -------
@@ -1307,44 +1257,149 @@ def rtp(data, I_deg, D_deg):
         PyGMI raster data.
 
     """
-    datamedian = np.ma.median(data.data)
-    ndat = data.data - datamedian
-    ndat.data[ndat.mask] = 0
+    dat = rtp_batch([data], I_deg, D_deg, I_a)[0]
 
-    fftmod = np.fft.fft2(ndat)
+    return dat
 
-    ny, nx = fftmod.shape
-    nyqx = 1/(2*data.xdim)
-    nyqy = 1/(2*data.ydim)
 
-    kx = np.linspace(-nyqx, nyqx, nx)
-    ky = np.linspace(-nyqy, nyqy, ny)
+def rtp_batch(data, I_deg, D_deg, I_a=None, workers=-1, piter=iter):
+    """
+    Reduction to the pole of several grids.
 
-    KX, KY = np.meshgrid(kx, ky)
+    Grids with the same shape and cell size are stacked and transformed
+    together, and share a single filter.
 
-    I = np.deg2rad(I_deg)
-    D = np.deg2rad(D_deg)
-    alpha = np.arctan2(KY, KX)
+    Parameters
+    ----------
+    data : list
+        List of PyGMI Data.
+    I_deg : float
+        Magnetic inclination.
+    D_deg : float
+        Magnetic declination.
+    I_a : float, optional
+        Pseudo-inclination used for the amplitude correction at low
+        latitudes. The default is None, which uses I_deg.
+    workers : int, optional
+        Number of threads used for the FFTs. -1 uses all available
+        processors. The default is -1.
+    piter : iter, optional
+        Progress bar iterable. The default is iter.
 
-    filt = 1/(np.sin(I)+1j*np.cos(I)*np.cos(D-alpha))**2
+    Returns
+    -------
+    dat : list
+        List of PyGMI Data, in the same order as data.
 
-    zrtp = np.fft.ifft2(fftmod*filt)
-    zrtp = zrtp.real + datamedian
-    zrtp[data.data.mask] = data.data.fill_value
+    """
+    groups = {}
+    for i, band in enumerate(data):
+        key = (band.data.shape, band.xdim, band.ydim)
+        groups.setdefault(key, []).append(i)
+
+    dat = [None]*len(data)
+    for (shape, xdim, ydim), idx in piter(groups.items()):
+        nr, nc = shape
+        nrpts = sfft.next_fast_len(nr, real=True)
+        ncpts = sfft.next_fast_len(nc, real=True)
+        rdiff = (nrpts-nr)//2
+        cdiff = (ncpts-nc)//2
+
+        zstack = np.empty((len(idx), nrpts, ncpts))
+        medians = []
+        for j, k in enumerate(idx):
+            datamedian = np.ma.median(data[k].data)
+            ndat = np.ma.filled(data[k].data - datamedian, 0.)
+            zstack[j] = np.pad(ndat, [[rdiff, nrpts-nr-rdiff],
+                                      [cdiff, ncpts-nc-cdiff]], 'edge')
+            medians.append(datamedian)
+
+        filt = rtp_filter(nrpts, ncpts, xdim, ydim, I_deg, D_deg, I_a)
+
+        fftmod = sfft.rfft2(zstack, workers=workers, overwrite_x=True)
+        fftmod *= filt
+        zstack = sfft.irfft2(fftmod, s=(nrpts, ncpts), workers=workers,
+                             overwrite_x=True)
+        del fftmod
+
+        for j, k in enumerate(idx):
+            band = data[k]
+            zrtp = zstack[j, rdiff:rdiff+nr, cdiff:cdiff+nc] + medians[j]
+            zrtp[np.ma.getmaskarray(band.data)] = band.data.fill_value
 
 # Create dataset
-    dat = Data()
-    dat.data = np.ma.masked_invalid(zrtp)
-    dat.data.mask = np.ma.getmaskarray(data.data)
-    dat.nullvalue = data.data.fill_value
-    dat.dataid = 'RTP_'+data.dataid
-    dat.extent = data.extent
-    dat.xdim = data.xdim
-    dat.ydim = data.ydim
+            tmp = Data()
+            tmp.data = np.ma.masked_invalid(zrtp)
+            tmp.data.mask = np.ma.getmaskarray(band.data)
+            tmp.nullvalue = band.data.fill_value
+            tmp.dataid = 'RTP_'+band.dataid
+            tmp.extent = band.extent
+            tmp.xdim = band.xdim
+            tmp.ydim = band.ydim
+            dat[k] = tmp
 
     return dat
 
 
+@lru_cache(maxsize=2)
+def rtp_filter(nrows, ncols, xdim, ydim, I_deg, D_deg, I_a=None):
+    """
+    Reduction to the pole filter for a real FFT spectrum.
+
+    The last two filters are cached, so repeated calls for the same grid
+    shape and field parameters return the same read-only array. The cache is
+    kept small because filters for large grids use a lot of memory.
+
+    Parameters
+    ----------
+    nrows : int
+        Number of rows in the padded grid.
+    ncols : int
+        Number of columns in the padded grid.
+    xdim : float
+        Cell size in the x direction.
+    ydim : float
+        Cell size in the y direction.
+    I_deg : float
+        Magnetic inclination.
+    D_deg : float
+        Magnetic declination.
+    I_a : float, optional
+        Pseudo-inclination used for the amplitude correction at low
+        latitudes. The default is None, which uses I_deg.
+
+    Returns
+    -------
+    filt : numpy array
+        Complex filter, with shape (nrows, ncols//2+1).
+
+    """
+    if I_a is None:
+        I_a = I_deg
+
+    ky = sfft.fftfreq(nrows, ydim)
+    kx = sfft.rfftfreq(ncols, xdim)
+
+    # Wavenumber azimuth, clockwise from north. Rows run from north to south,
+    # so northward wavenumbers are negative ky.
+    alpha = np.arctan2(kx[np.newaxis, :], -ky[:, np.newaxis])
+
+    I = np.deg2rad(I_deg)
+    D = np.deg2rad(D_deg)
+    Ia = np.deg2rad(I_a)
+    cosda = np.cos(D-alpha)
+
+# Phase from the true inclination, amplitude from the pseudo-inclination.
+# When I_a equals I_deg this is 1/(sin(I)+i*cos(I)*cos(D-alpha))**2.
+    filt = (np.sin(I)-1j*np.cos(I)*cosda)**2
+    filt /= ((np.sin(Ia)**2+np.cos(Ia)**2*cosda**2) *
+             (np.sin(I)**2+np.cos(I)**2*cosda**2))
+    filt[0, 0] = 1.
+    filt.flags.writeable = False
+
+    return filt
+
+
 def check_dataid(out):
     """
     Check dataid for duplicates and renames where necessary.
@@ -1409,7 +1464,9 @@ def cluster_to_raster(indata):
 def cut_raster(data, ifile):
     """Cuts a raster dataset.
 
-    Cut a raster dataset using a shapefile.
+    Cut a raster dataset using a shapefile. All the polygons in the
+    shapefile are used, including multipart polygons. Only the window of
+    each band covering the polygons is read.
 
     Parameters
     ----------
@@ -1423,68 +1480,181 @@ def cut_raster(data, ifile):
     data : Data
         PyGMI Dataset
     """
+    geoms = _get_polygons(ifile)
+    if not geoms:
+        return None
+
+    geoms = [i[1] for i in geoms]
+    bounds = _geom_bounds(geoms)
+
+    out = []
+    for idata in data:
+        odata = _cut_band(idata, geoms, bounds)
+        if odata is not None:
+            out.append(odata)
+
+    if not out:
+        return None
+
+    out = trim_raster(out)
+    return out
+
+
+def cut_raster_polygons(data, ifile, piter=iter):
+    """
+    Cut a raster dataset with each polygon in a shapefile.
+
+    The polygons are worked through from north to south, so that datasets
+    read lazily from disk reuse cached blocks and the source is read in a
+    single pass.
+
+    Parameters
+    ----------
+    data : list of PyGMI Data
+        PyGMI raster datasets.
+    ifile : str
+        shapefile with the polygons.
+    piter : iter, optional
+        Progress bar iterable. The default is iter.
+
+    Returns
+    -------
+    out : dictionary
+        Cut datasets for each polygon, keyed by feature id. Polygons which
+        do not overlap the data are left out.
+    """
+    geoms = _get_polygons(ifile)
+    if not geoms:
+        return None
+
+    bounds = [_geom_bounds([geom]) for _, geom in geoms]
+    order = np.argsort([-i[3] for i in bounds], kind='stable')
+
+    out = {}
+    for i in piter(order):
+        fid, geom = geoms[i]
+        odata = []
+        for idata in data:
+            tmp = _cut_band(idata, [geom], bounds[i])
+            if tmp is not None:
+                odata.append(tmp)
+        if odata:
+            out[fid] = odata
+
+    return out
+
+
+def _get_polygons(ifile):
+    """
+    Get the polygons in a shapefile.
+
+    Parameters
+    ----------
+    ifile : str
+        shapefile name.
+
+    Returns
+    -------
+    geoms : list or None
+        list of (feature id, geometry) for each polygon feature, or None if
+        the file could not be opened.
+    """
     shapef = ogr.Open(ifile)
     if shapef is None:
         return None
     lyr = shapef.GetLayer()
-    poly = lyr.GetNextFeature()
-    geom = poly.GetGeometryRef()
 
-    if 'POLYGON' not in geom.GetGeometryName() or poly is None:
+    geoms = []
+    for feat in lyr:
+        geom = feat.GetGeometryRef()
+        if geom is None or 'POLYGON' not in geom.GetGeometryName():
+            continue
+        geoms.append((feat.GetFID(), geom.Clone()))
+
+    shapef = None
+    return geoms
+
+
+def _geom_bounds(geoms):
+    """
+    Get the combined bounds of a list of geometries.
+
+    Parameters
+    ----------
+    geoms : list
+        list of OGR geometries.
+
+    Returns
+    -------
+    tuple
+        bounds as (minx, maxx, miny, maxy).
+    """
+    env = np.array([geom.GetEnvelope() for geom in geoms])
+    return (env[:, 0].min(), env[:, 1].max(), env[:, 2].min(),
+            env[:, 3].max())
+
+
+def _cut_band(idata, geoms, bounds):
+    """
+    Cut a single band with polygons.
+
+    Only the window of the band covering the polygon bounds is read. The
+    polygons are burnt into a mask with GDAL.
+
+    Parameters
+    ----------
+    idata : PyGMI Data
+        PyGMI raster dataset.
+    geoms : list
+        list of OGR polygon geometries.
+    bounds : tuple
+        bounds of the polygons as (minx, maxx, miny, maxy).
+
+    Returns
+    -------
+    odata : PyGMI Data or None
+        cut dataset, or None if the polygons do not overlap the band.
+    """
+    minx, maxx, miny, maxy = bounds
+    xmin, _, _, ymax = idata.extent
+    rows, cols = idata.shape
+
+    col0 = max(0, int(np.floor((minx - xmin)/idata.xdim)))
+    col1 = min(cols, int(np.ceil((maxx - xmin)/idata.xdim)))
+    row0 = max(0, int(np.floor((ymax - maxy)/idata.ydim)))
+    row1 = min(rows, int(np.ceil((ymax - miny)/idata.ydim)))
+
+    if row0 >= row1 or col0 >= col1:
         return None
 
-    for idata in data:
-        # Convert the layer extent to image pixel coordinates
-        minX, maxX, minY, maxY = lyr.GetExtent()
-        itlx = idata.extent[0]
-        itly = idata.extent[-1]
-
-        ulX = max(0, int((minX - itlx) / idata.xdim))
-        ulY = max(0, int((itly - maxY) / idata.ydim))
-        lrX = int((maxX - itlx) / idata.xdim)
-        lrY = int((itly - minY) / idata.ydim)
-
-        # Map points to pixels for drawing the
-        # boundary on a mas image
-        points = []
-        pixels = []
-
-        ifin = 0
-        imax = 0
-        if geom.GetGeometryName() == 'MULTIPOLYGON':
-            for i in range(geom.GetGeometryCount()):
-                geom.GetGeometryRef(i)
-                itmp = geom.GetGeometryRef(i)
-                itmp = itmp.GetGeometryRef(0).GetPointCount()
-                if itmp > imax:
-                    imax = itmp
-                    ifin = i
-            geom = geom.GetGeometryRef(ifin)
-
-        pts = geom.GetGeometryRef(0)
-        for p in range(pts.GetPointCount()):
-            points.append((pts.GetX(p), pts.GetY(p)))
-        for p in points:
-            tmpx = int((p[0] - idata.extent[0]) / idata.xdim)
-            tmpy = int((idata.extent[-1] - p[1]) / idata.ydim)
-            pixels.append((tmpx, tmpy))
-        irows, icols = idata.data.shape
-        rasterPoly = Image.new('L', (icols, irows), 1)
-        rasterize = ImageDraw.Draw(rasterPoly)
-        rasterize.polygon(pixels, 0)
-        mask = np.array(rasterPoly)
-
-        idata.data.mask = mask
-        idata.data = idata.data[ulY:lrY, ulX:lrX]
-        ixmin = ulX*idata.xdim + idata.extent[0]  # minX
-        iymax = idata.extent[-1] - ulY*idata.ydim  # maxY
-        ixmax = ixmin + icols*idata.xdim
-        iymin = iymax - irows*idata.ydim
-        idata.extent = [ixmin, ixmax, iymin, iymax]
+    wrows = row1 - row0
+    wcols = col1 - col0
+    window = idata.get_window(row0, col0, wrows, wcols)
 
-    shapef = None
-    data = trim_raster(data)
-    return data
+    gtr = (xmin + col0*idata.xdim, idata.xdim, 0.0,
+           ymax - row0*idata.ydim, 0.0, -idata.ydim)
+
+    driver = ogr.GetDriverByName('Memory')
+    shapef = driver.CreateDataSource('')
+    lyr = shapef.CreateLayer('cut', geom_type=ogr.wkbMultiPolygon)
+    for geom in geoms:
+        feat = ogr.Feature(lyr.GetLayerDefn())
+        feat.SetGeometry(geom)
+        lyr.CreateFeature(feat)
+
+    dest = gdal.GetDriverByName('MEM').Create('', wcols, wrows, 1,
+                                              gdal.GDT_Byte)
+    dest.SetGeoTransform(gtr)
+    gdal.RasterizeLayer(dest, [1], lyr, burn_values=[1])
+    mask = dest.GetRasterBand(1).ReadAsArray() == 0
+    mask |= np.ma.getmaskarray(window)
+
+    odata = copy.copy(idata)
+    odata.set_values(np.array(window), mask)
+    odata.extent_from_gtr(gtr)
+    odata.metadata = copy.deepcopy(idata.metadata)
+
+    return odata
 
 
 def data_to_gdal_mem(data, gtr, wkt, cols, rows, nodata=False):
@@ -1512,14 +1682,14 @@ def data_to_gdal_mem(data, gtr, wkt, cols, rows, nodata=False):
         GDAL memory format data
 
     """
-    data.data = np.ma.array(data.data)
-    dtype = data.data.dtype
+    values = data.get_values()
+    dtype = values.dtype
 # Get rid of array() which can break driver.create later
     cols = int(cols)
     rows = int(rows)
 
     if data.isrgb is True:
-        nbands = data.data.shape[2]
+        nbands = values.shape[2]
     else:
         nbands = 1
 
@@ -1543,9 +1713,9 @@ def data_to_gdal_mem(data, gtr, wkt, cols, rows, nodata=False):
             if data.nullvalue is not None:
                 src.GetRasterBand(i+1).SetNoDataValue(data.nullvalue)
             if data.isrgb is True:
-                src.GetRasterBand(i+1).WriteArray(data.data[:, :, i])
+                src.GetRasterBand(i+1).WriteArray(values[:, :, i])
             else:
-                src.GetRasterBand(i+1).WriteArray(data.data)
+                src.GetRasterBand(i+1).WriteArray(values)
         else:
             tmp = np.zeros((rows, cols))
             tmp = np.ma.masked_equal(tmp, 0)
@@ -1555,6 +1725,118 @@ def data_to_gdal_mem(data, gtr, wkt, cols, rows, nodata=False):
     return src
 
 
+def data_reproject(data, ifrom, ito, ofile=None, resampling='bilinear',
+                   blockrows=1024, warpmem=256):
+    """
+    Reproject a dataset.
+
+    The dataset is warped with GDAL's multithreaded warper. In memory, the
+    output is filled one strip of rows at a time. If an output file is
+    given, GDAL writes the output straight to a tiled GeoTIFF, and the
+    returned dataset reads it from disk as needed, so large rasters can be
+    reprojected with bounded memory.
+
+    Parameters
+    ----------
+    data : PyGMI Data
+        PyGMI raster dataset.
+    ifrom : str
+        Input projection in wkt (well known text) format.
+    ito : str
+        Output projection in wkt (well known text) format.
+    ofile : str, optional
+        Output GeoTIFF file name. The default is None, which keeps the
+        output in memory.
+    resampling : str, optional
+        GDAL resampling algorithm, e.g. 'near', 'bilinear' or 'cubic'. The
+        default is 'bilinear'.
+    blockrows : int, optional
+        Number of output rows warped at a time. The default is 1024.
+    warpmem : float, optional
+        Memory available to the GDAL warper, in MB. The default is 256.
+
+    Returns
+    -------
+    data2 : PyGMI Data
+        Reprojected dataset.
+
+    """
+    orig = osr.SpatialReference()
+    orig.ImportFromWkt(ifrom)
+    orig.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+
+    targ = osr.SpatialReference()
+    targ.ImportFromWkt(ito)
+    targ.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+
+    ctrans = osr.CoordinateTransformation(orig, targ)
+
+# Work out the boundaries of the new dataset in the target projection
+    xmin, xmax, ymin, ymax = data.extent
+    corners = [ctrans.TransformPoint(x, y) for x in (xmin, xmax)
+               for y in (ymin, ymax)]
+    xcrn = [i[0] for i in corners]
+    ycrn = [i[1] for i in corners]
+
+    drows, dcols = data.shape
+    minx, maxx = min(xcrn), max(xcrn)
+    miny, maxy = min(ycrn), max(ycrn)
+    newdim = min((maxx-minx)/dcols, (maxy-miny)/drows)
+    cols = round((maxx - minx)/newdim)
+    rows = round((maxy - miny)/newdim)
+
+    if cols == 0 or rows == 0:
+        raise ValueError('Your rows or cols are zero. Your input projection '
+                         'may be wrong.')
+
+# top left x, w-e pixel size, rotation, top left y, rotation, n-s pixel size
+    new_geo = (minx, newdim, 0, maxy, 0, -newdim)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        src = _warp_source(data, ifrom, tmpdir)
+
+        if ofile is not None:
+            from pygmi.raster.iodefs import get_raster
+
+            driver = gdal.GetDriverByName('GTiff')
+            dest = driver.Create(ofile, cols, rows, 1, gdal.GDT_Float64,
+                                 ['TILED=YES', 'BIGTIFF=IF_SAFER'])
+            dest.SetGeoTransform(new_geo)
+            dest.SetProjection(ito)
+            dest.GetRasterBand(1).SetNoDataValue(data.nullvalue)
+
+            gdal.Warp(dest, src, resampleAlg=resampling, multithread=True,
+                      warpMemoryLimit=warpmem, dstNodata=data.nullvalue,
+                      warpOptions=['NUM_THREADS=ALL_CPUS',
+                                   'INIT_DEST=NO_DATA'])
+            dest = None
+
+            data2 = get_raster(ofile, lazy=True)[0]
+        else:
+            values = np.empty((rows, cols))
+            for row in range(0, rows, blockrows):
+                nrows = min(blockrows, rows-row)
+                values[row:row+nrows] = _warp_window(src, new_geo, ito, row,
+                                                     row+nrows, 0, cols,
+                                                     resampling, warpmem)[0]
+
+            mask = np.isnan(values)
+            values = _cast_values(values, mask, [data])
+
+            data2 = Data()
+            data2.set_values(values, mask)
+            data2.extent_from_gtr(new_geo)
+            data2.wkt = ito
+
+        src = None
+
+    data2.dataid = data.dataid
+    data2.nullvalue = data.nullvalue
+    data2.units = data.units
+
+    return data2
+
+
 def epsgtowkt(epsg):
     """
     Routine to get a WKT from an epsg code.
@@ -1710,9 +1992,9 @@ def merge(dat):
         return dat
 
     needsmerge = False
-    rows, cols = dat[0].data.shape
+    rows, cols = dat[0].shape
     for i in dat:
-        irows, icols = i.data.shape
+        irows, icols = i.shape
         if irows != rows or icols != cols:
             needsmerge = True
 
@@ -1721,22 +2003,437 @@ def merge(dat):
         return dat
 
     print('Merging data...')
-    mrg = DataMerge()
-    mrg.indata['Raster'] = dat
-    data = dat[0]
-    dxy0 = min(data.xdim, data.ydim)
-    for data in dat:
-        dxy = min(dxy0, data.xdim, data.ydim)
+    out = resample_to_grid(dat)
+    out = check_dataid(out)
+
+    return out
 
-    mrg.dsb_dxy.setValue(dxy)
-    mrg.acceptall()
-    out = mrg.outdata['Raster']
 
-    out = check_dataid(out)
+def common_grid(dat, dxy=None):
+    """
+    Get a grid which covers all the datasets in a list.
+
+    Parameters
+    ----------
+    dat : list of PyGMI Data
+        PyGMI raster datasets.
+    dxy : float, optional
+        Cell size of the grid. The default is None, which uses the smallest
+        cell size of the datasets.
+
+    Returns
+    -------
+    gtr : tuple
+        Geotransform of the grid.
+    rows : int
+        Number of rows in the grid.
+    cols : int
+        Number of columns in the grid.
+
+    """
+    if dxy is None:
+        dxy = min(min(data.xdim, data.ydim) for data in dat)
+
+    xmin = min(data.extent[0] for data in dat)
+    xmax = max(data.extent[1] for data in dat)
+    ymin = min(data.extent[2] for data in dat)
+    ymax = max(data.extent[3] for data in dat)
+
+    cols = int((xmax - xmin)/dxy)
+    rows = int((ymax - ymin)/dxy)
+    gtr = (xmin, dxy, 0.0, ymax, 0.0, -dxy)
+
+    return gtr, rows, cols
+
+
+def mosaic(dat, dxy=None, method='first', feather=10, gtr=None, rows=None,
+           cols=None, resampling='bilinear', blockrows=1024, warpmem=256,
+           piter=iter):
+    """
+    Mosaic datasets covering different areas into a single band.
+
+    Each dataset is warped onto a common grid with GDAL's multithreaded
+    warper, one strip of rows at a time, and composited into the output.
+    Datasets are warped from their files, or from temporary files, so only
+    the output is held in memory. The output keeps the data type of the
+    inputs if they all share one. This does not need a QApplication, so it
+    can be used from scripts. All datasets are assumed to share the
+    projection of the first dataset.
+
+    Parameters
+    ----------
+    dat : list of PyGMI Data
+        PyGMI raster datasets, in order of priority.
+    dxy : float, optional
+        Cell size of the output. The default is None, which uses the
+        smallest cell size of the datasets.
+    method : str, optional
+        How overlapping values are combined. 'first' keeps the first valid
+        value, 'last' the last valid value, 'mean' averages valid values and
+        'feather' takes a mean weighted by the distance from the edge of
+        each dataset's valid data. The default is 'first'.
+    feather : float, optional
+        Width of the feathered edge in output cells. Only used by the
+        'feather' method. The default is 10.
+    gtr : tuple, optional
+        Geotransform of the output grid. The default is None, which uses
+        common_grid. rows and cols must be given with gtr.
+    rows : int, optional
+        Number of rows in the output grid.
+    cols : int, optional
+        Number of columns in the output grid.
+    resampling : str, optional
+        GDAL resampling algorithm, e.g. 'near', 'bilinear' or 'cubic'. The
+        default is 'bilinear'.
+    blockrows : int, optional
+        Number of output rows warped at a time. The default is 1024.
+    warpmem : float, optional
+        Memory available to the GDAL warper, in MB. The default is 256.
+    piter : iter, optional
+        Progress bar iterable. The default is iter.
+
+    Returns
+    -------
+    out : PyGMI Data
+        Mosaiced dataset.
+
+    """
+    if method not in ('first', 'last', 'mean', 'feather'):
+        raise ValueError('Unknown mosaic method: '+str(method))
+
+    if gtr is None:
+        gtr, rows, cols = common_grid(dat, dxy)
+
+    if rows == 0 or cols == 0:
+        raise ValueError('Your rows or cols are zero. Your input projection '
+                         'may be wrong.')
+
+    wkt = dat[0].wkt
+    usedist = (method == 'feather')
+
+    values = np.full((rows, cols), np.nan)
+    if method in ('mean', 'feather'):
+        weights = np.zeros((rows, cols))
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        srcs = [_warp_source(data, wkt, tmpdir, usedist) for data in dat]
+
+        for row in piter(range(0, rows, blockrows)):
+            nrows = min(blockrows, rows-row)
+            for data, src in zip(dat, srcs):
+                win = _grid_window(data, gtr, row, nrows, cols)
+                if win is None:
+                    continue
+                r0, r1, c0, c1 = win
+                tmp = _warp_window(src, gtr, wkt, r0, r1, c0, c1, resampling,
+                                   warpmem)
+                valid = ~np.isnan(tmp[0])
+                out = values[r0:r1, c0:c1]
+
+                if method == 'first':
+                    filt = valid & np.isnan(out)
+                    out[filt] = tmp[0][filt]
+                elif method == 'last':
+                    out[valid] = tmp[0][valid]
+                else:
+                    if method == 'mean':
+                        wgt = valid.astype(float)
+                    else:
+                        wgt = np.clip(tmp[1]/(feather*gtr[1]), 1e-6, 1.)
+                        wgt[~valid | np.isnan(wgt)] = 0.
+                    out[np.isnan(out)] = 0.
+                    out += np.where(valid, tmp[0]*wgt, 0.)
+                    weights[r0:r1, c0:c1] += wgt
+
+        srcs = None
+
+    if method in ('mean', 'feather'):
+        mask = weights == 0.
+        values /= np.where(mask, 1., weights)
+    else:
+        mask = np.isnan(values)
+
+    values = _cast_values(values, mask, dat)
+
+    out = Data()
+    out.set_values(values, mask)
+    out.extent_from_gtr(gtr)
+    out.dataid = dat[0].dataid
+    out.nullvalue = dat[0].nullvalue
+    out.units = dat[0].units
+    out.wkt = wkt
+
+    return out
+
+
+def resample_to_grid(dat, dxy=None, resampling='bilinear', blockrows=1024,
+                     warpmem=256, piter=iter):
+    """
+    Resample datasets onto a common grid.
+
+    This gives all the datasets the same rows and columns, covering the
+    combined area of the datasets. It does not need a QApplication, so it
+    can be used from scripts.
+
+    Parameters
+    ----------
+    dat : list of PyGMI Data
+        PyGMI raster datasets.
+    dxy : float, optional
+        Cell size of the output. The default is None, which uses the
+        smallest cell size of the datasets.
+    resampling : str, optional
+        GDAL resampling algorithm. The default is 'bilinear'.
+    blockrows : int, optional
+        Number of output rows warped at a time. The default is 1024.
+    warpmem : float, optional
+        Memory available to the GDAL warper, in MB. The default is 256.
+    piter : iter, optional
+        Progress bar iterable. The default is iter.
+
+    Returns
+    -------
+    out : list of PyGMI Data
+        Resampled datasets.
+
+    """
+    gtr, rows, cols = common_grid(dat, dxy)
+
+    out = []
+    for data in piter(dat):
+        out.append(mosaic([data], method='last', gtr=gtr, rows=rows,
+                          cols=cols, resampling=resampling,
+                          blockrows=blockrows, warpmem=warpmem))
+        out[-1].wkt = dat[0].wkt
 
     return out
 
 
+def _grid_window(data, gtr, row, nrows, cols):
+    """
+    Find the part of an output strip covered by a dataset.
+
+    Parameters
+    ----------
+    data : PyGMI Data
+        PyGMI raster dataset.
+    gtr : tuple
+        Geotransform of the output grid.
+    row : int
+        First row of the strip.
+    nrows : int
+        Number of rows in the strip.
+    cols : int
+        Number of columns in the output grid.
+
+    Returns
+    -------
+    tuple or None
+        Output window as (row0, row1, col0, col1), or None if the dataset
+        does not cover the strip.
+
+    """
+    xmin, xmax, ymin, ymax = data.extent
+
+    r0 = max(row, int(np.floor((gtr[3]-ymax)/-gtr[5]))-1)
+    r1 = min(row+nrows, int(np.ceil((gtr[3]-ymin)/-gtr[5]))+1)
+    c0 = max(0, int(np.floor((xmin-gtr[0])/gtr[1]))-1)
+    c1 = min(cols, int(np.ceil((xmax-gtr[0])/gtr[1]))+1)
+
+    if r0 >= r1 or c0 >= c1:
+        return None
+
+    return r0, r1, c0, c1
+
+
+def _warp_source(data, wkt, tmpdir, usedist=False):
+    """
+    Make a GDAL dataset to warp from.
+
+    Datasets read lazily from a file are warped from the file itself, through
+    a virtual dataset. Other datasets are written to a temporary tiled
+    GeoTIFF one strip at a time, so that GDAL reads them back in blocks and
+    no full copy is kept in memory. If usedist is True, a second band holds
+    the distance of each cell from the edge of the valid data, in map units.
+
+    Parameters
+    ----------
+    data : PyGMI Data
+        PyGMI raster dataset.
+    wkt : str
+        Projection in wkt (well known text) format.
+    tmpdir : str
+        Directory for temporary files.
+    usedist : bool, optional
+        Add the distance band. The default is False.
+
+    Returns
+    -------
+    src : GDAL dataset
+        GDAL virtual or GeoTIFF dataset.
+
+    """
+    source = data.source
+    if (hasattr(source, 'get_band') and not usedist and
+            not source.lessequal):
+        band = source.get_band()
+        if band.GetNoDataValue() == source.nval:
+            src = gdal.Translate('', source.ifile, format='VRT',
+                                 bandList=[source.bandnum])
+            src.SetGeoTransform(data.get_gtr())
+            src.SetProjection(wkt)
+            return src
+
+    rows, cols = data.shape
+    dtype = data.get_window(0, 0, 1, 1).dtype
+    nodata = np.nan
+    fmt = None
+    if dtype.kind in 'iu' and not usedist and _fits_dtype(data.nullvalue,
+                                                          dtype):
+        fmt = gdal_array.NumericTypeCodeToGDALTypeCode(dtype)
+        nodata = data.nullvalue
+    elif dtype == np.float32:
+        fmt = gdal.GDT_Float32
+    if fmt is None:
+        fmt = gdal.GDT_Float64
+        dtype = np.float64
+        nodata = np.nan
+
+    ofile = tempfile.mkstemp('.tif', dir=tmpdir)
+    os.close(ofile[0])
+    driver = gdal.GetDriverByName('GTiff')
+    src = driver.Create(ofile[1], cols, rows, 1+usedist, fmt,
+                        ['TILED=YES', 'BIGTIFF=IF_SAFER'])
+    src.SetGeoTransform(data.get_gtr())
+    src.SetProjection(wkt)
+
+    band = src.GetRasterBand(1)
+    band.SetNoDataValue(nodata)
+    for row, strip in data.blocks(1024):
+        band.WriteArray(np.ma.filled(strip.astype(dtype), nodata), 0, row)
+
+    if usedist:
+        valid = np.pad(~data.get_mask(), 1)
+        dist = ndimage.distance_transform_edt(valid, sampling=(data.ydim,
+                                                               data.xdim))
+        dist = dist[1:-1, 1:-1]
+        dist[~valid[1:-1, 1:-1]] = np.nan
+        band = src.GetRasterBand(2)
+        band.SetNoDataValue(np.nan)
+        band.WriteArray(dist)
+
+    src.FlushCache()
+
+    return src
+
+
+def _fits_dtype(value, dtype):
+    """
+    Check if a value can be stored exactly in an integer data type.
+
+    Parameters
+    ----------
+    value : float
+        Value to check.
+    dtype : numpy dtype
+        Integer data type.
+
+    Returns
+    -------
+    bool
+        True if the value fits.
+
+    """
+    info = np.iinfo(dtype)
+    return (np.isfinite(value) and value == int(value) and
+            info.min <= value <= info.max)
+
+
+def _cast_values(values, mask, dat):
+    """
+    Set null values and cast warped values to the data type of the inputs.
+
+    Values are only cast if all the inputs share a data type, and the null
+    value of the first input can be stored in it. Integer types are rounded.
+
+    Parameters
+    ----------
+    values : numpy array
+        Float64 warped values. Changed in place.
+    mask : numpy array
+        Boolean array which is True at null values.
+    dat : list of PyGMI Data
+        Input datasets.
+
+    Returns
+    -------
+    values : numpy array
+        Values with null values set.
+
+    """
+    nullvalue = dat[0].nullvalue
+    dtypes = {data.get_window(0, 0, 1, 1).dtype for data in dat}
+    dtype = dtypes.pop() if len(dtypes) == 1 else values.dtype
+
+    if dtype.kind in 'iu':
+        if not _fits_dtype(nullvalue, dtype):
+            dtype = values.dtype
+        else:
+            np.rint(values, out=values)
+    elif dtype.kind != 'f':
+        dtype = values.dtype
+
+    values[mask] = nullvalue
+    if dtype != values.dtype:
+        values = values.astype(dtype)
+
+    return values
+
+
+def _warp_window(src, gtr, wkt, r0, r1, c0, c1, resampling='bilinear',
+                 warpmem=256):
+    """
+    Warp a source dataset into a window of an output grid.
+
+    Parameters
+    ----------
+    src : GDAL dataset
+        Source dataset, from _warp_source.
+    gtr : tuple
+        Geotransform of the output grid.
+    wkt : str
+        Projection in wkt (well known text) format.
+    r0, r1, c0, c1 : int
+        Output window rows and columns.
+    resampling : str, optional
+        GDAL resampling algorithm. The default is 'bilinear'.
+    warpmem : float, optional
+        Memory available to the GDAL warper, in MB. The default is 256.
+
+    Returns
+    -------
+    numpy array
+        Warped bands, with NaN at null values.
+
+    """
+    nbands = src.RasterCount
+    driver = gdal.GetDriverByName('MEM')
+    dest = driver.Create('', c1-c0, r1-r0, nbands, gdal.GDT_Float64)
+    dest.SetGeoTransform((gtr[0]+c0*gtr[1], gtr[1], 0.0,
+                          gtr[3]+r0*gtr[5], 0.0, gtr[5]))
+    dest.SetProjection(wkt)
+    for i in range(nbands):
+        band = dest.GetRasterBand(i+1)
+        band.SetNoDataValue(np.nan)
+        band.Fill(np.nan)
+
+    gdal.Warp(dest, src, resampleAlg=resampling, multithread=True,
+              warpMemoryLimit=warpmem, dstNodata=np.nan,
+              warpOptions=['NUM_THREADS=ALL_CPUS', 'INIT_DEST=NO_DATA'])
+
+    return dest.ReadAsArray().reshape((nbands, r1-r0, c1-c0))
+
+
 def trim_raster(olddata):
     """
     Trim nulls from a raster dataset.
@@ -1756,36 +2453,26 @@ def trim_raster(olddata):
         PyGMI dataset
     """
     for data in olddata:
-        mask = np.ma.getmaskarray(data.data)
-        data.data.data[mask] = data.nullvalue
-
-        rowstart = 0
-        for i in range(mask.shape[0]):
-            if bool(mask[i].min()) is False:
-                break
-            rowstart += 1
-
-        rowend = mask.shape[0]
-        for i in range(mask.shape[0]-1, -1, -1):
-            if bool(mask[i].min()) is False:
-                break
-            rowend -= 1
-
-        colstart = 0
-        for i in range(mask.shape[1]):
-            if bool(mask[:, i].min()) is False:
-                break
-            colstart += 1
-
-        colend = mask.shape[1]
-        for i in range(mask.shape[1]-1, -1, -1):
-            if bool(mask[:, i].min()) is False:
-                break
-            colend -= 1
+        mask = data.get_mask()
+        values = data.get_values()
+        if data.maskmode != 'nan':
+            values[mask] = data.nullvalue
+
+        rowsvalid = np.flatnonzero(~mask.all(1))
+        colsvalid = np.flatnonzero(~mask.all(0))
+        if rowsvalid.size == 0:
+            rowstart, rowend = mask.shape[0], 0
+            colstart, colend = mask.shape[1], 0
+        else:
+            rowstart, rowend = rowsvalid[0], rowsvalid[-1]+1
+            colstart, colend = colsvalid[0], colsvalid[-1]+1
 
-        drows, dcols = data.data.shape
-        data.data = data.data[rowstart:rowend, colstart:colend]
-        data.data.mask = (data.data.data == data.nullvalue)
+        values = values[rowstart:rowend, colstart:colend]
+        drows, dcols = values.shape
+        if data.maskmode == 'nan':
+            data.set_values(values)
+        else:
+            data.set_values(values, values == data.nullvalue)
         xmin = data.extent[0] + colstart*data.xdim
         ymax = data.extent[-1] - rowstart*data.ydim
         xmax = xmin + data.xdim*dcols
@@ -1828,45 +2515,47 @@ def quickgrid(x, y, z, dxy, numits=4):
     xmax = x.max()
     ymin = y.min()
     ymax = y.max()
-    newmask = np.array([1])
-    j = -1
     rows = int((ymax-ymin)/dxy)+1
     cols = int((xmax-xmin)/dxy)+1
 
     if numits < 1:
         numits = int(max(np.log2(cols), np.log2(rows)))
 
-    while np.max(newmask) > 0 and j < (numits-1):
-        j += 1
-        jj = 2**j
-        dxy2 = dxy*jj
-        rows = int((ymax-ymin)/dxy2)+1
-        cols = int((xmax-xmin)/dxy2)+1
+    xindex = ((x-xmin)/dxy).astype(int)
+    yindex = ((y-ymin)/dxy).astype(int)
+    cellindex = yindex*cols+xindex
 
-        newz = np.zeros([rows, cols])
-        zdiv = np.zeros([rows, cols])
+    zsum = np.bincount(cellindex, weights=z, minlength=rows*cols)
+    zdiv = np.bincount(cellindex, minlength=rows*cols)
+    zsum.shape = (rows, cols)
+    zdiv.shape = (rows, cols)
 
-        xindex = ((x-xmin)/dxy2).astype(int)
-        yindex = ((y-ymin)/dxy2).astype(int)
+    newmask = (zdiv == 0)
+    filt = np.logical_not(newmask)
+    zfin = np.zeros([rows, cols])
+    zfin[filt] = zsum[filt]/zdiv[filt]
 
-        for i in range(z.size):
-            newz[yindex[i], xindex[i]] += z[i]
-            zdiv[yindex[i], xindex[i]] += 1
+    print('Iteration done: 1 of '+str(numits))
 
-        filt = zdiv > 0
-        newz[filt] = newz[filt]/zdiv[filt]
+    for j in range(1, numits):
+        if not newmask.any():
+            break
 
-        if j == 0:
-            newmask = np.ones([rows, cols])
-            for i in range(z.size):
-                newmask[yindex[i], xindex[i]] = 0
-            zfin = newz
-        else:
-            xx, yy = newmask.nonzero()
-            xx2 = xx//jj
-            yy2 = yy//jj
-            zfin[xx, yy] = newz[xx2, yy2]
-            newmask[xx, yy] = np.logical_not(zdiv[xx2, yy2])
+        # Each level is built from 2x2 block sums of the previous level.
+        zsum = _sum2x2(zsum)
+        zdiv = _sum2x2(zdiv)
+
+        jj = 2**j
+        yy, xx = newmask.nonzero()
+        yy2 = yy//jj
+        xx2 = xx//jj
+        filt = zdiv[yy2, xx2] > 0
+        yy = yy[filt]
+        xx = xx[filt]
+        yy2 = yy2[filt]
+        xx2 = xx2[filt]
+        zfin[yy, xx] = zsum[yy2, xx2]/zdiv[yy2, xx2]
+        newmask[yy, xx] = False
 
         print('Iteration done: '+str(j+1)+' of '+str(numits))
 
@@ -1875,3 +2564,406 @@ def quickgrid(x, y, z, dxy, numits=4):
     newz = np.ma.array(zfin)
     newz.mask = newmask
     return newz
+
+
+def _sum2x2(dat):
+    """
+    Sum 2x2 blocks of an array, to make an array of half the size.
+
+    Parameters
+    ----------
+    dat : numpy array
+        Input array. Odd dimensions are padded with zeros.
+
+    Returns
+    -------
+    numpy array
+        Output array.
+
+    """
+    rows, cols = dat.shape
+    dat = np.pad(dat, [[0, rows % 2], [0, cols % 2]], 'constant')
+    rows, cols = dat.shape
+    return dat.reshape(rows//2, 2, cols//2, 2).sum(axis=(1, 3))
+
+
+def mincurvgrid(x, y, z, dxy, tension=0.25, bdist=None, tilesize=512,
+                overlap=32, maxiter=500, tol=1e-4, piter=iter):
+    """
+    Grid scattered data using minimum curvature with tension.
+
+    Data are averaged onto the nearest grid node, and the surface is then
+    solved for on a coarse grid first, and refined on successively finer
+    grids down to the final cell size. The grid has the same layout as
+    quickgrid.
+
+    Parameters
+    ----------
+    x : numpy array
+        array of x coordinates
+    y : numpy array
+        array of y coordinates
+    z : numpy array
+        array of z values - this is the column being gridded
+    dxy : float
+        cell size for the grid, in both the x and y direction.
+    tension : float, optional
+        Tension, between 0 (minimum curvature) and 1 (harmonic surface). The
+        default is 0.25.
+    bdist : float, optional
+        Blanking distance. Nodes further than this from a data point are
+        masked. The default is None.
+    tilesize : int, optional
+        The grid is made in tiles of this many nodes square, to bound memory
+        use. None makes the grid in one piece. The default is 512.
+    overlap : int, optional
+        Number of nodes by which tiles overlap. The default is 32.
+    maxiter : int, optional
+        Maximum number of iterations at each grid level. The default is 500.
+    tol : float, optional
+        Relative residual at which iterations stop. The default is 1e-4.
+    piter : function, optional
+        Progress bar iterable. Default is iter.
+
+    Returns
+    -------
+    newz : numpy masked array
+        M x N array of z values
+    """
+    print('Creating Grid')
+    x = x.flatten()
+    y = y.flatten()
+    z = z.flatten().astype(np.float64)
+
+    xmin = x.min()
+    ymin = y.min()
+    rows = int((y.max()-ymin)/dxy)+1
+    cols = int((x.max()-xmin)/dxy)+1
+
+    xindex = ((x-xmin)/dxy).astype(int)
+    yindex = ((y-ymin)/dxy).astype(int)
+
+    if tilesize is None:
+        zfin = _mincurv(xindex, yindex, z, rows, cols, tension, maxiter, tol)
+    else:
+        zfin = np.full((rows, cols), np.nan)
+        tiles = [(r0, c0) for r0 in range(0, rows, tilesize)
+                 for c0 in range(0, cols, tilesize)]
+        for r0, c0 in piter(tiles):
+            r1 = min(r0+tilesize, rows)
+            c1 = min(c0+tilesize, cols)
+            pr0 = max(r0-overlap, 0)
+            pc0 = max(c0-overlap, 0)
+            pr1 = min(r1+overlap, rows)
+            pc1 = min(c1+overlap, cols)
+
+            filt = ((yindex >= pr0) & (yindex < pr1) &
+                    (xindex >= pc0) & (xindex < pc1))
+            if not filt.any():
+                continue
+
+            ztile = _mincurv(xindex[filt]-pc0, yindex[filt]-pr0, z[filt],
+                             pr1-pr0, pc1-pc0, tension, maxiter, tol)
+            zfin[r0:r1, c0:c1] = ztile[r0-pr0:r1-pr0, c0-pc0:c1-pc0]
+
+    newmask = np.isnan(zfin)
+    if bdist is not None:
+        newmask |= _blankmask(x, y, xmin, ymin, dxy, rows, cols, bdist,
+                              tilesize)
+
+    print('Finished!')
+
+    newz = np.ma.array(zfin)
+    newz.mask = newmask
+    return newz
+
+
+def idwgrid(x, y, z, dxy, nnear=8, power=2., bdist=None, tilesize=512,
+            workers=-1, piter=iter):
+    """
+    Grid scattered data using inverse distance weighting.
+
+    The nearest points to each grid node are found using a KD-tree, so no
+    triangulation is needed. With nnear set to 1, this is a nearest
+    neighbour grid. The grid has the same layout as quickgrid.
+
+    Parameters
+    ----------
+    x : numpy array
+        array of x coordinates
+    y : numpy array
+        array of y coordinates
+    z : numpy array
+        array of z values - this is the column being gridded
+    dxy : float
+        cell size for the grid, in both the x and y direction.
+    nnear : int, optional
+        Number of nearest points used for each node. The default is 8.
+    power : float, optional
+        Power of the inverse distance weights. The default is 2.
+    bdist : float, optional
+        Blanking distance. Only points within this distance of a node are
+        used, and nodes with no points are masked. The default is None.
+    tilesize : int, optional
+        Nodes are calculated this many rows at a time, to bound memory use.
+        None calculates all rows at once. The default is 512.
+    workers : int, optional
+        Number of threads for the KD-tree queries. -1 uses all available
+        processors. The default is -1.
+    piter : function, optional
+        Progress bar iterable. Default is iter.
+
+    Returns
+    -------
+    newz : numpy masked array
+        M x N array of z values
+    """
+    print('Creating Grid')
+    x = x.flatten()
+    y = y.flatten()
+    z = z.flatten().astype(np.float64)
+
+    xmin = x.min()
+    ymin = y.min()
+    rows = int((y.max()-ymin)/dxy)+1
+    cols = int((x.max()-xmin)/dxy)+1
+    nnear = min(nnear, z.size)
+
+    if bdist is None:
+        bdist = np.inf
+    if tilesize is None:
+        tilesize = rows
+
+    tree = cKDTree(np.transpose([x, y]))
+    xnode = xmin+(np.arange(cols)+0.5)*dxy
+
+    zfin = np.zeros([rows, cols])
+    newmask = np.zeros([rows, cols], dtype=bool)
+
+    for r0 in piter(range(0, rows, tilesize)):
+        r1 = min(r0+tilesize, rows)
+        ynode = ymin+(np.arange(r0, r1)+0.5)*dxy
+        xx, yy = np.meshgrid(xnode, ynode)
+
+        dist, idx = tree.query(np.transpose([xx.ravel(), yy.ravel()]),
+                               k=nnear, distance_upper_bound=bdist,
+                               workers=workers)
+        if nnear == 1:
+            dist = dist[:, np.newaxis]
+            idx = idx[:, np.newaxis]
+
+        valid = np.isfinite(dist)
+        zz = z[np.where(valid, idx, 0)]
+        weight = np.zeros_like(dist)
+        filt = valid & (dist > 0)
+        weight[filt] = 1/dist[filt]**power
+
+        wsum = weight.sum(1)
+        exact = dist[:, 0] == 0
+        empty = ~valid[:, 0]
+        wsum[exact | empty] = 1.
+
+        ztmp = (weight*zz).sum(1)/wsum
+        ztmp[exact] = zz[exact, 0]
+
+        zfin[r0:r1] = ztmp.reshape(r1-r0, cols)
+        newmask[r0:r1] = empty.reshape(r1-r0, cols)
+
+    print('Finished!')
+
+    newz = np.ma.array(zfin)
+    newz.mask = newmask
+    return newz
+
+
+def _blankmask(x, y, xmin, ymin, dxy, rows, cols, bdist, tilesize=None):
+    """
+    Mask grid nodes further than a blanking distance from data points.
+
+    Parameters
+    ----------
+    x : numpy array
+        array of x coordinates
+    y : numpy array
+        array of y coordinates
+    xmin : float
+        Minimum x coordinate of the grid.
+    ymin : float
+        Minimum y coordinate of the grid.
+    dxy : float
+        cell size for the grid, in both the x and y direction.
+    rows : int
+        Number of rows in the grid.
+    cols : int
+        Number of columns in the grid.
+    bdist : float
+        Blanking distance.
+    tilesize : int, optional
+        If set, nodes are checked this many rows at a time. The default is
+        None.
+
+    Returns
+    -------
+    mask : numpy array
+        Boolean mask, True where nodes are blanked.
+
+    """
+    if tilesize is None:
+        tilesize = rows
+
+    tree = cKDTree(np.transpose([x, y]))
+    xnode = xmin+(np.arange(cols)+0.5)*dxy
+    mask = np.zeros([rows, cols], dtype=bool)
+
+    for r0 in range(0, rows, tilesize):
+        r1 = min(r0+tilesize, rows)
+        ynode = ymin+(np.arange(r0, r1)+0.5)*dxy
+        xx, yy = np.meshgrid(xnode, ynode)
+        dist, _ = tree.query(np.transpose([xx.ravel(), yy.ravel()]),
+                             distance_upper_bound=bdist, workers=-1)
+        mask[r0:r1] = np.isinf(dist).reshape(r1-r0, cols)
+
+    return mask
+
+
+def _mincurv(xindex, yindex, z, rows, cols, tension, maxiter, tol):
+    """
+    Minimum curvature surface through data on grid nodes.
+
+    The surface minimises the squared second differences, plus the squared
+    first differences weighted by the tension, with data nodes held fixed.
+    It is solved with conjugate gradients, first on coarse grids and then on
+    successively finer grids, each starting from the previous solution.
+
+    Parameters
+    ----------
+    xindex : numpy array
+        Column index of each data point.
+    yindex : numpy array
+        Row index of each data point.
+    z : numpy array
+        Data values.
+    rows : int
+        Number of rows in the grid.
+    cols : int
+        Number of columns in the grid.
+    tension : float
+        Tension, between 0 and 1.
+    maxiter : int
+        Maximum number of iterations at each grid level.
+    tol : float
+        Iterations stop when the residual falls below this fraction of its
+        starting value.
+
+    Returns
+    -------
+    zfin : numpy array
+        Gridded surface.
+
+    """
+    cellindex = yindex*cols+xindex
+    zsum = np.bincount(cellindex, weights=z, minlength=rows*cols)
+    zdiv = np.bincount(cellindex, minlength=rows*cols)
+    zsum.shape = (rows, cols)
+    zdiv.shape = (rows, cols)
+
+    # Coarser levels are built from 2x2 block sums of the finer level.
+    levels = [(zsum, zdiv)]
+    while min(levels[-1][0].shape) > 8:
+        levels.append((_sum2x2(levels[-1][0]), _sum2x2(levels[-1][1])))
+
+    zfin = np.full(levels[-1][0].shape, z.mean())
+
+    for zsum, zdiv in levels[::-1]:
+        lrows, lcols = zsum.shape
+        if zfin.shape != zsum.shape:
+            yc = np.arange(lrows)/2-0.25
+            xc = np.arange(lcols)/2-0.25
+            yc, xc = np.meshgrid(yc, xc, indexing='ij')
+            zfin = ndimage.map_coordinates(zfin, [yc, xc], order=1,
+                                           mode='nearest')
+
+        fixed = zdiv > 0
+        zfin[fixed] = zsum[fixed]/zdiv[fixed]
+        if fixed.all():
+            continue
+
+        free = np.logical_not(fixed)
+        res = -_mincurv_hess(zfin, tension)*free
+        pdir = res.copy()
+        rsq = (res*res).sum()
+        rsq0 = rsq
+        for _ in range(maxiter):
+            if rsq <= (tol**2)*rsq0 or rsq == 0.:
+                break
+            hpdir = _mincurv_hess(pdir, tension)*free
+            alpha = rsq/(pdir*hpdir).sum()
+            zfin += alpha*pdir
+            res -= alpha*hpdir
+            rsqnew = (res*res).sum()
+            pdir = res+(rsqnew/rsq)*pdir
+            rsq = rsqnew
+
+    return zfin
+
+
+@jit(nopython=True, parallel=True)
+def _mincurv_hess(dat, tension):
+    """
+    Apply the minimum curvature operator to a grid.
+
+    The operator is the gradient of the surface energy, which is the sum of
+    the squared second differences and, weighted by the tension, the squared
+    first differences.
+
+    Parameters
+    ----------
+    dat : numpy array
+        Input grid.
+    tension : float
+        Tension, between 0 and 1.
+
+    Returns
+    -------
+    out : numpy array
+        Output grid.
+
+    """
+    rows, cols = dat.shape
+    out = np.zeros_like(dat)
+    curv = 1.-tension
+
+    for i in prange(rows):
+        for j in range(cols):
+            tmp = 0.
+            # Second differences in x, y and the mixed direction.
+            for k in range(-2, 1):
+                if 0 <= j+k and j+k+2 < cols:
+                    wgt = -2. if k == -1 else 1.
+                    tmp += wgt*curv*(dat[i, j+k]-2*dat[i, j+k+1] +
+                                     dat[i, j+k+2])
+                if 0 <= i+k and i+k+2 < rows:
+                    wgt = -2. if k == -1 else 1.
+                    tmp += wgt*curv*(dat[i+k, j]-2*dat[i+k+1, j] +
+                                     dat[i+k+2, j])
+            for ki in range(-1, 1):
+                for kj in range(-1, 1):
+                    if (0 <= i+ki and i+ki+1 < rows and 0 <= j+kj and
+                            j+kj+1 < cols):
+                        wgt = 2. if ki == kj else -2.
+                        tmp += wgt*curv*(dat[i+ki+1, j+kj+1] -
+                                         dat[i+ki+1, j+kj] -
+                                         dat[i+ki, j+kj+1] +
+                                         dat[i+ki, j+kj])
+            # First differences, weighted by tension.
+            if j > 0:
+                tmp += tension*(dat[i, j]-dat[i, j-1])
+            if j+1 < cols:
+                tmp -= tension*(dat[i, j+1]-dat[i, j])
+            if i > 0:
+                tmp += tension*(dat[i, j]-dat[i-1, j])
+            if i+1 < rows:
+                tmp -= tension*(dat[i+1, j]-dat[i, j])
+            out[i, j] = tmp
+
+    return out
@@ -92,10 +92,31 @@ class Data():
         projection information
     units : str
         description of units to be used with color bars
+    source : object or None
+        optional block reader for data which is still on disk. It needs a
+        shape attribute and a read(row, col, rows, cols) method returning a
+        masked array. The data attribute is only read in full when it is
+        first accessed.
+    maskmode : str
+        how null values are stored. 'masked' uses a numpy masked array,
+        'nan' uses a float array with NaN at null values and 'packed' uses
+        a plain array with a bit packed mask. Integer data is always stored
+        as 'packed' rather than 'nan'. Accessing the data attribute
+        converts the dataset to 'masked' mode, so that the masked array it
+        returns can be changed in place. Use get_values, get_mask,
+        set_values, get_window and blocks to work in the compact modes.
+
+    Histograms and statistics from get_histogram and get_stats are cached.
+    They are cleared when data is set through the data attribute,
+    set_values or set_source. Call clear_cache after changing data in place.
     """
 
     def __init__(self):
-        self.data = np.ma.array([])
+        self.source = None
+        self.maskmode = 'masked'
+        self._data = np.ma.array([])
+        self._packedmask = None
+        self._cache = {}
         self.extent = (0, 1, -1, 0)  # left, right, bottom, top
         self.xdim = 1.0
         self.ydim = 1.0
@@ -106,6 +127,347 @@ class Data():
         self.isrgb = False
         self.metadata = {'Cluster': {}}
 
+    @property
+    def data(self):
+        """
+        Raster data as a numpy masked array.
+
+        If the dataset is still on disk, it is read in full on first access.
+        Datasets in a compact mask mode are converted to 'masked' mode, so
+        that changes to the returned array and its mask are kept. See
+        maskmode for details.
+
+        Returns
+        -------
+        numpy masked array
+            raster data.
+
+        """
+        if self._data is None:
+            self._data = self.source.read()
+        if self.maskmode != 'masked':
+            self._data = np.ma.array(self._data, mask=self.get_mask(),
+                                     copy=False)
+            self._packedmask = None
+            self.maskmode = 'masked'
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+        self._packedmask = None
+        self._cache = {}
+        self.maskmode = 'masked'
+        self.source = None
+
+    def get_values(self):
+        """
+        Get the raster values as a plain numpy array, without copying.
+
+        In 'nan' mode null values are NaN. Otherwise they are whatever is
+        stored under the mask.
+
+        Returns
+        -------
+        numpy array
+            raster values.
+
+        """
+        if self._data is None:
+            self._data = self.source.read()
+        return np.ma.getdata(self._data)
+
+    def get_mask(self):
+        """
+        Get the null value mask as a boolean numpy array.
+
+        Returns
+        -------
+        numpy array
+            boolean array which is True at null values.
+
+        """
+        if self._data is None:
+            self._data = self.source.read()
+        if self.maskmode == 'nan':
+            return np.isnan(self._data)
+        if self.maskmode == 'packed':
+            if self._packedmask is None:
+                return np.zeros(self._data.shape, dtype=bool)
+            return np.unpackbits(self._packedmask, axis=-1,
+                                 count=self._data.shape[-1]).view(bool)
+        return np.ma.getmaskarray(self._data)
+
+    def set_values(self, values, mask=None):
+        """
+        Set the raster values and mask, keeping the current mask mode.
+
+        Parameters
+        ----------
+        values : numpy array
+            raster values. This is stored without copying, and may be
+            changed in place in 'nan' mode.
+        mask : numpy array, optional
+            boolean array which is True at null values. The default is None,
+            which means no values are masked (or only NaN values in 'nan'
+            mode).
+
+        Returns
+        -------
+        None.
+
+        """
+        self.source = None
+        self._cache = {}
+        values = np.ma.getdata(values)
+        if self.maskmode == 'nan' and values.dtype.kind != 'f':
+            self.maskmode = 'packed'
+
+        if self.maskmode == 'nan':
+            if mask is not None:
+                values[mask] = np.nan
+            self._data = values
+        elif self.maskmode == 'packed':
+            self._data = values
+            self._packedmask = None
+            if mask is not None and mask.any():
+                self._packedmask = np.packbits(mask, axis=-1)
+        else:
+            if mask is None:
+                mask = np.zeros(values.shape, dtype=bool)
+            self._data = np.ma.array(values, mask=mask, copy=False)
+
+    def set_maskmode(self, maskmode):
+        """
+        Convert the way null values are stored.
+
+        Converting to 'nan' overwrites null values with NaN. Integer data is
+        converted to 'packed' instead, so that it is not promoted to float.
+
+        Parameters
+        ----------
+        maskmode : str
+            'masked', 'nan' or 'packed'.
+
+        Returns
+        -------
+        None.
+
+        """
+        if maskmode not in ('masked', 'nan', 'packed'):
+            raise ValueError('Unknown mask mode: '+str(maskmode))
+        if maskmode == self.maskmode:
+            return
+
+        values = self.get_values()
+        mask = self.get_mask()
+        self.maskmode = maskmode
+        self.set_values(values, mask)
+
+    def set_source(self, source):
+        """
+        Leave the raster data on disk, to be read through a block reader.
+
+        Parameters
+        ----------
+        source : object
+            block reader, with a shape attribute and a
+            read(row, col, rows, cols) method.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.source = source
+        self.maskmode = 'masked'
+        self._data = None
+        self._packedmask = None
+        self._cache = {}
+
+    def clear_cache(self):
+        """
+        Clear cached histograms and statistics.
+
+        This is only needed if the data has been changed in place.
+
+        Returns
+        -------
+        None.
+
+        """
+        self._cache = {}
+
+    def compressed(self):
+        """
+        Get the unmasked values as a flat array.
+
+        Returns
+        -------
+        numpy array
+            unmasked values.
+
+        """
+        if self._data is None:
+            self._data = self.source.read()
+        if self.maskmode == 'masked':
+            return np.ma.compressed(self._data)
+        return self.get_values()[~self.get_mask()]
+
+    def get_histogram(self, nbins=256):
+        """
+        Get the histogram of the unmasked values.
+
+        The histogram is computed once, one block of data at a time, and
+        cached. Its range comes from get_minmax.
+
+        Parameters
+        ----------
+        nbins : int, optional
+            Number of bins. The default is 256.
+
+        Returns
+        -------
+        hist : numpy array
+            counts in each bin.
+        bins : numpy array
+            bin edges, with length nbins+1.
+
+        """
+        key = ('hist', nbins)
+        if key not in self._cache:
+            dmin, dmax = self.get_minmax()
+            hist = np.zeros(nbins, dtype=np.int64)
+            for _, strip in self.blocks(1024):
+                tmp, bins = np.histogram(np.ma.compressed(strip), nbins,
+                                         (dmin, dmax))
+                hist += tmp
+            self._cache[key] = (hist, bins)
+        return self._cache[key]
+
+    def get_minmax(self):
+        """
+        Get the minimum and maximum of the unmasked values.
+
+        These are taken from the cached statistics if there are any.
+        Otherwise they are found in a pass over blocks of the data, without
+        the cost of the full statistics, and cached.
+
+        Returns
+        -------
+        tuple
+            (minimum, maximum) of the unmasked values.
+
+        """
+        if 'stats' in self._cache:
+            return self._cache['stats']['min'], self._cache['stats']['max']
+        if 'minmax' not in self._cache:
+            dmin = np.inf
+            dmax = -np.inf
+            for _, strip in self.blocks(1024):
+                tmp = np.ma.compressed(strip)
+                if tmp.size > 0:
+                    dmin = min(dmin, tmp.min())
+                    dmax = max(dmax, tmp.max())
+            self._cache['minmax'] = (dmin, dmax)
+        return self._cache['minmax']
+
+    def get_stats(self):
+        """
+        Get summary statistics of the unmasked values.
+
+        The statistics are computed once, in a single pass over blocks of
+        the data, and cached. The median and median absolute deviation are
+        approximate for large datasets. See RunningStats for details.
+
+        Returns
+        -------
+        dict
+            min, max, mean, std, median, mad (median absolute deviation),
+            skew, kurtosis and count of the unmasked values.
+
+        """
+        if 'stats' not in self._cache:
+            rstats = RunningStats()
+            for _, strip in self.blocks(1024):
+                rstats.update(np.ma.compressed(strip))
+            self._cache['stats'] = rstats.get_stats()
+        return self._cache['stats']
+
+    @property
+    def shape(self):
+        """
+        Shape of the raster data, without reading it from disk.
+
+        Returns
+        -------
+        tuple
+            (rows, columns) of the raster data.
+
+        """
+        if self._data is None:
+            return self.source.shape
+        return self._data.shape
+
+    def get_window(self, row, col, rows, cols):
+        """
+        Get a window of the raster data.
+
+        Only the blocks covering the window are read if the dataset is still
+        on disk.
+
+        Parameters
+        ----------
+        row : int
+            first row of the window.
+        col : int
+            first column of the window.
+        rows : int
+            number of rows in the window.
+        cols : int
+            number of columns in the window.
+
+        Returns
+        -------
+        numpy masked array
+            window of raster data.
+
+        """
+        if self._data is None:
+            return self.source.read(row, col, rows, cols)
+        if self.maskmode == 'masked':
+            return self._data[row:row+rows, col:col+cols]
+
+        values = self._data[row:row+rows, col:col+cols]
+        if self.maskmode == 'nan':
+            return np.ma.masked_invalid(values)
+        if self._packedmask is None:
+            return np.ma.array(values, mask=np.zeros(values.shape, bool))
+        mask = np.unpackbits(self._packedmask[row:row+rows], axis=-1,
+                             count=self._data.shape[-1]).view(bool)
+        return np.ma.array(values, mask=mask[..., col:col+cols])
+
+    def blocks(self, blockrows=256):
+        """
+        Iterate through the raster data in strips of whole rows.
+
+        Parameters
+        ----------
+        blockrows : int, optional
+            Number of rows in each strip. The default is 256.
+
+        Yields
+        ------
+        row : int
+            first row of the strip.
+        numpy masked array
+            strip of raster data.
+
+        """
+        rows, cols = self.shape
+        for row in range(0, rows, blockrows):
+            yield row, self.get_window(row, 0, min(blockrows, rows-row), cols)
+
     def get_gtr(self):
         """
         Ger gtr.
@@ -135,7 +497,7 @@ class Data():
         None.
 
         """
-        rows, cols = self.data.shape
+        rows, cols = self.shape
 
         self.xdim = gtr[1]
         self.ydim = -gtr[5]
@@ -146,3 +508,233 @@ class Data():
         bottom = top - self.ydim*rows
 
         self.extent = (left, right, bottom, top)
+
+
+class RunningStats():
+    """
+    Single pass statistics, updated one block of values at a time.
+
+    Moments are combined with the pairwise updates of Chan and Terriberry,
+    so blocks, or whole accumulators, can be merged in any order. Quantiles
+    come from a mergeable compactor sketch, which keeps at most about k
+    values on each level. The median and median absolute deviation are
+    exact until more than k values have been added, and approximate after
+    that.
+
+    Attributes
+    ----------
+    count : int
+        number of values added.
+    mean : float
+        mean of the values.
+    min : float
+        minimum value.
+    max : float
+        maximum value.
+    k : int
+        size of each level of the quantile sketch.
+    levels : list
+        quantile sketch values. Values on level i have a weight of 2**i.
+    """
+
+    def __init__(self, k=8192):
+        self.count = 0
+        self.mean = 0.
+        self.m2 = 0.
+        self.m3 = 0.
+        self.m4 = 0.
+        self.min = np.inf
+        self.max = -np.inf
+        self.k = k
+        self.levels = [np.empty(0)]
+        self.offset = 0
+
+    def update(self, values):
+        """
+        Add a block of values.
+
+        Parameters
+        ----------
+        values : numpy array
+            values to add. Masked values should already be removed.
+
+        Returns
+        -------
+        None.
+
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if values.size == 0:
+            return
+
+        mean = values.mean()
+        dev = values - mean
+        dev2 = dev*dev
+        self._merge_moments(values.size, mean, dev2.sum(),
+                            (dev2*dev).sum(), (dev2*dev2).sum())
+
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compact()
+
+    def merge(self, other):
+        """
+        Merge another accumulator into this one.
+
+        Parameters
+        ----------
+        other : RunningStats
+            accumulator to merge.
+
+        Returns
+        -------
+        None.
+
+        """
+        if other.count == 0:
+            return
+
+        self._merge_moments(other.count, other.mean, other.m2, other.m3,
+                            other.m4)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+        for i, level in enumerate(other.levels):
+            if i == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[i] = np.concatenate([self.levels[i], level])
+        self._compact()
+
+    def quantile(self, q):
+        """
+        Get a quantile of the values.
+
+        Parameters
+        ----------
+        q : float
+            quantile, between 0 and 1.
+
+        Returns
+        -------
+        float
+            quantile value.
+
+        """
+        if len(self.levels) == 1:
+            return np.quantile(self.levels[0], q)
+        values, weights = self._weighted()
+        return _weighted_quantile(values, weights, q)
+
+    def get_stats(self):
+        """
+        Get the summary statistics.
+
+        Returns
+        -------
+        stats : dict
+            min, max, mean, std, median, mad (median absolute deviation),
+            skew, kurtosis and count of the values.
+
+        """
+        stats = {}
+        stats['count'] = self.count
+        if self.count == 0:
+            for i in ['min', 'max', 'mean', 'std', 'median', 'mad', 'skew',
+                      'kurtosis']:
+                stats[i] = np.nan
+            return stats
+
+        stats['min'] = self.min
+        stats['max'] = self.max
+        stats['mean'] = self.mean
+        stats['std'] = np.sqrt(self.m2/self.count)
+        stats['median'] = self.quantile(0.5)
+
+        if len(self.levels) == 1:
+            stats['mad'] = np.median(abs(self.levels[0] - stats['median']))
+        else:
+            values, weights = self._weighted()
+            stats['mad'] = _weighted_quantile(abs(values - stats['median']),
+                                              weights, 0.5)
+
+        if self.m2 > 0:
+            stats['skew'] = np.sqrt(self.count)*self.m3/self.m2**1.5
+            stats['kurtosis'] = self.count*self.m4/self.m2**2 - 3.
+        else:
+            stats['skew'] = np.nan
+            stats['kurtosis'] = np.nan
+
+        return stats
+
+    def _merge_moments(self, nb, meanb, m2b, m3b, m4b):
+        """Merge the central moments of another set of values."""
+        na = float(self.count)
+        nb = float(nb)
+        num = na + nb
+        delta = meanb - self.mean
+        d_n = delta/num
+
+        m2 = self.m2 + m2b + delta*d_n*na*nb
+        m3 = (self.m3 + m3b + d_n*d_n*delta*na*nb*(na-nb) +
+              3.*d_n*(na*m2b - nb*self.m2))
+        m4 = (self.m4 + m4b + d_n**3*delta*na*nb*(na*na - na*nb + nb*nb) +
+              6.*d_n*d_n*(na*na*m2b + nb*nb*self.m2) +
+              4.*d_n*(na*m3b - nb*self.m3))
+
+        self.count += int(nb)
+        self.mean += d_n*nb
+        self.m2 = m2
+        self.m3 = m3
+        self.m4 = m4
+
+    def _compact(self):
+        """Halve sketch levels holding more than k values."""
+        i = 0
+        while i < len(self.levels):
+            level = self.levels[i]
+            if level.size > self.k:
+                level = np.sort(level)
+                odd = level.size % 2
+                self.levels[i] = level[level.size-odd:]
+                if i+1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                # Alternate which half is kept to avoid a bias.
+                promoted = level[self.offset:level.size-odd:2]
+                self.offset = 1 - self.offset
+                self.levels[i+1] = np.concatenate([self.levels[i+1],
+                                                   promoted])
+            i += 1
+
+    def _weighted(self):
+        """Get the sketch values and their weights."""
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(level.size, 2.**i) for i, level
+                                  in enumerate(self.levels)])
+        return values, weights
+
+
+def _weighted_quantile(values, weights, q):
+    """
+    Get a quantile of weighted values.
+
+    Parameters
+    ----------
+    values : numpy array
+        values.
+    weights : numpy array
+        weight of each value.
+    q : float
+        quantile, between 0 and 1.
+
+    Returns
+    -------
+    float
+        quantile value.
+
+    """
+    idx = np.argsort(values)
+    cweights = np.cumsum(weights[idx])
+    pos = np.searchsorted(cweights, q*cweights[-1])
+    return values[idx[min(pos, idx.size-1)]]
@@ -28,7 +28,9 @@ import copy
 from PyQt5 import QtWidgets, QtCore
 import numpy as np
 import numexpr as ne
+from osgeo import gdal, gdal_array
 import pygmi.raster.dataprep as dataprep
+from pygmi.raster.iodefs import GDALBlockReader
 
 
 class EquationEditor(QtWidgets.QDialog):
@@ -254,8 +256,6 @@ class EquationEditor(QtWidgets.QDialog):
             True if successful, False otherwise.
 
         """
-        localdict = {}
-        bandsall = []
         self.bands = {}
         self.bands['all data'] = 'iall'
 
@@ -275,11 +275,6 @@ class EquationEditor(QtWidgets.QDialog):
         for j, i in enumerate(indata):
             self.combobox.addItem(i.dataid)
             self.bands[i.dataid] = 'i'+str(j)
-            bandsall.append(i.data)
-            localdict['i'+str(j)] = i.data
-
-        localdict_list = list(localdict.keys())
-        localdict['iall'] = np.ma.array(bandsall)
 
         if equation is None:
             temp = self.exec_()
@@ -292,76 +287,176 @@ class EquationEditor(QtWidgets.QDialog):
         if equation == '':
             return False
 
-        if 'iall' in equation:
-            usedbands = localdict_list
-        else:
-            usedbands = []
-            for i in localdict_list:
-                if i in equation:
-                    usedbands.append(i)
-
-        mask = None
-        for i in usedbands:
-            if mask is None:
-                mask = localdict[i].mask
-            else:
-                mask = np.logical_or(mask, localdict[i].mask)
-
         neweq = self.eq_fix(indata, equation)
 
-        if 'mosaic' in neweq:
-            findat = self.mosaic(neweq, localdict)
-            if findat is None:
-                QtWidgets.QMessageBox.warning(
-                    self.parent, 'Error',
-                    'Nothing processed! '
-                    'Your equation most likely had an error.',
-                    QtWidgets.QMessageBox.Ok)
-                return False
-            mask = findat.mask
+        errmsg = None
+        try:
+            outdata = self.evaluate(indata, neweq)
+        except ValueError as err:
+            errmsg = str(err)
+        except Exception:
+            errmsg = ('Nothing processed! Your equation most likely had an '
+                      'error.')
+
+        if errmsg is not None:
+            QtWidgets.QMessageBox.warning(self.parent, 'Error', errmsg,
+                                          QtWidgets.QMessageBox.Ok)
+            return False
 
-        else:
-            try:
-                findat = ne.evaluate(neweq, localdict)
-            except Exception:
-                QtWidgets.QMessageBox.warning(
-                    self.parent, 'Error',
-                    'Nothing processed! '
-                    'Your equation most likely had an error.',
-                    QtWidgets.QMessageBox.Ok)
-                return False
+        if len(outdata) == 1:
+            outdata[0].dataid = equation
 
-        outdata = []
+        self.outdata[intype] = outdata
 
-        if np.size(findat) == 1:
-            QtWidgets.QMessageBox.warning(
-                self.parent, 'Warning',
-                ' Nothing processed! Your equation outputs a single ' +
-                'value instead of a minimum of one band.',
-                QtWidgets.QMessageBox.Ok)
-            return False
-        if findat.ndim == 2:
-            findat.shape = (1, findat.shape[0], findat.shape[1])
+        return True
 
-        for i, findati in enumerate(findat):
-            findati[mask] = indata[i].nullvalue
+    def evaluate(self, indata, neweq, blockrows=512, ofile=None):
+        """
+        Evaluate an equation, one strip of rows at a time.
 
+        Only the strips of the bands used in the equation are read, and
+        numexpr still uses all its threads on each strip. The results are
+        kept in memory, or written to a GeoTIFF as they are calculated.
+
+        Parameters
+        ----------
+        indata : list of PyGMI Data
+            PyGMI raster datasets, all with the same rows and columns.
+        neweq : str
+            Equation, already corrected with eq_fix.
+        blockrows : int, optional
+            Number of rows evaluated at a time. The default is 512.
+        ofile : str, optional
+            GeoTIFF file to write the results to. The returned datasets then
+            read the results from disk. The default is None.
+
+        Returns
+        -------
+        outdata : list of PyGMI Data
+            Output datasets.
+
+        """
+        errmsg = 'Nothing processed! Your equation most likely had an error.'
+        rows, cols = indata[0].shape
+
+        localdict_list = ['i'+str(j) for j in range(len(indata))]
+        if 'iall' in neweq:
+            usedbands = localdict_list
+        else:
+            usedbands = [i for i in localdict_list if i in neweq]
+
+        out = None
+        outmask = None
+        for row in range(0, rows, blockrows):
+            nrows = min(blockrows, rows-row)
+
+            localdict = {}
+            for i in usedbands:
+                localdict[i] = indata[int(i[1:])].get_window(row, 0, nrows,
+                                                             cols)
+            if 'iall' in neweq:
+                localdict['iall'] = np.ma.array([localdict[i] for i in
+                                                 usedbands])
+
+            mask = np.zeros((nrows, cols), dtype=bool)
+            for i in usedbands:
+                mask |= np.ma.getmaskarray(localdict[i])
+
+            if 'mosaic' in neweq:
+                findat = self.mosaic(neweq, localdict)
+                if findat is None:
+                    raise ValueError(errmsg)
+                mask = np.ma.getmaskarray(findat)
+                findat = findat.data
+            else:
+                try:
+                    findat = ne.evaluate(neweq, localdict)
+                except Exception:
+                    raise ValueError(errmsg)
+
+            if np.ndim(findat) == 0:
+                raise ValueError('Nothing processed! Your equation outputs a '
+                                 'single value instead of a minimum of one '
+                                 'band.')
+            if findat.ndim == 2:
+                findat = findat[np.newaxis]
+
+            if out is None:
+                if ofile is None:
+                    out = np.empty((findat.shape[0], rows, cols),
+                                   dtype=findat.dtype)
+                    outmask = np.zeros(out.shape, dtype=bool)
+                else:
+                    out = _create_gtiff(ofile, indata, findat.shape[0],
+                                        findat.dtype)
+
+            for i, findati in enumerate(findat):
+                # This is needed to get rid of bad, unmasked values etc.
+                bmask = mask
+                if findati.dtype.kind == 'f':
+                    bmask = mask | ~np.isfinite(findati)
+                findati[bmask] = indata[i].nullvalue
+
+                if ofile is None:
+                    out[i, row:row+nrows] = findati
+                    outmask[i, row:row+nrows] = bmask
+                else:
+                    out.GetRasterBand(i+1).WriteArray(findati, 0, row)
+
+        outdata = []
+        for i in range(len(out) if ofile is None else out.RasterCount):
             outdata.append(copy.copy(indata[i]))
-            outdata[-1].data = np.ma.masked_equal(findati,
-                                                  indata[i].nullvalue)
             outdata[-1].nullvalue = indata[i].nullvalue
+            outdata[-1].metadata = copy.deepcopy(indata[i].metadata)
+            if ofile is None:
+                outdata[-1].data = np.ma.array(out[i], mask=outmask[i])
+                outdata[-1].data.set_fill_value(indata[i].nullvalue)
+            else:
+                out.GetRasterBand(i+1).SetNoDataValue(indata[i].nullvalue)
 
-        # This is needed to get rid of bad, unmasked values etc.
-        for i, outdatai in enumerate(outdata):
-            outdatai.data.set_fill_value(indata[i].nullvalue)
-            outdatai.data = np.ma.fix_invalid(outdatai.data)
+        if ofile is not None:
+            out = None  # Close File
+            for i, outdatai in enumerate(outdata):
+                outdatai.set_source(GDALBlockReader(ofile, i+1,
+                                                    outdatai.nullvalue))
 
-        if len(outdata) == 1:
-            outdata[0].dataid = equation
+        return outdata
 
-        self.outdata[intype] = outdata
 
-        return True
+def _create_gtiff(ofile, indata, nbands, dtype):
+    """
+    Create a tiled GeoTIFF for equation results.
+
+    Parameters
+    ----------
+    ofile : str
+        Output file name.
+    indata : list of PyGMI Data
+        PyGMI raster datasets, used for the georeferencing.
+    nbands : int
+        Number of bands.
+    dtype : numpy dtype
+        Data type of the results.
+
+    Returns
+    -------
+    out : GDAL dataset
+        Open GeoTIFF dataset.
+
+    """
+    rows, cols = indata[0].shape
+    if dtype == bool:
+        dtype = np.uint8
+    fmt = gdal_array.NumericTypeCodeToGDALTypeCode(dtype)
+
+    driver = gdal.GetDriverByName('GTiff')
+    out = driver.Create(ofile, cols, rows, nbands, fmt,
+                        options=['TILED=YES', 'BIGTIFF=IF_SAFER',
+                                 'COMPRESS=DEFLATE', 'NUM_THREADS=ALL_CPUS'])
+    out.SetGeoTransform(indata[0].get_gtr())
+    out.SetProjection(indata[0].wkt)
+
+    return out
 
 
 def hmode(data):
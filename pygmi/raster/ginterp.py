@@ -146,6 +146,8 @@ class ModestImage(mi.AxesImage):
         self._rgbacache = None
         self._oldxslice = None
         self._oldyslice = None
+        self._overviews = {}
+        self._suncache = None
 
     def set_data(self, A):
         """
@@ -165,6 +167,9 @@ class ModestImage(mi.AxesImage):
         self._A = A
         self.smallres = A
 
+        # Overviews hold references to the arrays they were made from, so
+        # they are only kept for the current data.
+        self._overviews = {}
         self._imcache = None
         self._rgbacache = None
         self._oldxslice = None
@@ -234,7 +239,8 @@ class ModestImage(mi.AxesImage):
             return
 
         if self.dtype == 'Single Color Map':
-            pseudo = self._full_res[(rows-y1):(rows-y0):sy, x0:x1:sx]
+            pseudo = self._get_window(self._full_res, rows-y1, rows-y0,
+                                      x0, x1, sx, sy)
             mask = np.ma.getmaskarray(pseudo)
 
             if self.htype == '95% Linear, 5% Compact':
@@ -256,51 +262,69 @@ class ModestImage(mi.AxesImage):
             self._A = colormap
 
         elif self.dtype == 'Sunshade':
-            pseudo = self._full_res[0][(rows-y1):(rows-y0):sy, x0:x1:sx]
-            sun = self._full_res[1][(rows-y1):(rows-y0):sy, x0:x1:sx]
-            mask = np.logical_or(pseudo.mask, sun.mask)
+            # Everything except the shading itself depends only on the
+            # window and stretch, and is kept while the sun is moved.
+            key = (id(self._full_res[0]), id(self._full_res[1]), rows-y1,
+                   rows-y0, x0, x1, sx, sy, self.htype, self.hstype,
+                   self.cbar)
+            if self._suncache is None or self._suncache[0] != key:
+                pseudo = self._get_window(self._full_res[0], rows-y1,
+                                          rows-y0, x0, x1, sx, sy)
+                sun = self._get_window(self._full_res[1], rows-y1, rows-y0,
+                                       x0, x1, sx, sy)
+                mask = np.logical_or(pseudo.mask, sun.mask)
 
-            if self.htype == '95% Linear, 5% Compact':
-                pseudo = histcomp(pseudo)
+                if self.htype == '95% Linear, 5% Compact':
+                    pseudo = histcomp(pseudo)
 
-            if self.htype == '98% Linear, 2% Compact':
-                pseudo = histcomp(pseudo, perc=2.)
+                if self.htype == '98% Linear, 2% Compact':
+                    pseudo = histcomp(pseudo, perc=2.)
 
-            if self.htype == 'Histogram Equalization':
-                pseudo = histeq(pseudo)
+                if self.htype == 'Histogram Equalization':
+                    pseudo = histeq(pseudo)
 
-            if self.hstype == '95% Linear, 5% Compact':
-                sun = histcomp(sun)
+                if self.hstype == '95% Linear, 5% Compact':
+                    sun = histcomp(sun)
 
-            if self.hstype == '98% Linear, 2% Compact':
-                sun = histcomp(sun, perc=2.)
+                if self.hstype == '98% Linear, 2% Compact':
+                    sun = histcomp(sun, perc=2.)
 
-            if self.hstype == 'Histogram Equalization':
-                sun = histeq(sun)
+                if self.hstype == 'Histogram Equalization':
+                    sun = histeq(sun)
 
-            self.smallres = np.ma.ones((sun.shape[0], sun.shape[1], 2))
-            self.smallres[:, :, 0] = pseudo
-            self.smallres[:, :, 1] = sun
+                smallres = np.ma.ones((sun.shape[0], sun.shape[1], 2))
+                smallres[:, :, 0] = pseudo
+                smallres[:, :, 1] = sun
 
-            sunshader = currentshader(sun.data, self.cell, self.theta,
-                                      self.phi, self.alpha)
+                colormap = self.cbar(norm2(pseudo))
+                colormap[:, :, 3] = np.logical_not(mask)
 
-            snorm = norm2(sunshader)
-            pnorm = norm2(pseudo)
+                # The arrays are kept so that their ids stay unique.
+                self._suncache = (key, smallres, colormap,
+                                  sobel_gradients(sun.data),
+                                  self._full_res[:2])
 
-            colormap = self.cbar(pnorm)
+            self.smallres, colormap, grads = self._suncache[1:4]
+
+            sunshader = currentshader(None, self.cell, self.theta,
+                                      self.phi, self.alpha, grads)
+
+            snorm = norm2(sunshader)
 
+            colormap = colormap.copy()
             colormap[:, :, 0] *= snorm  # red
             colormap[:, :, 1] *= snorm  # green
             colormap[:, :, 2] *= snorm  # blue
-            colormap[:, :, 3] = np.logical_not(mask)
 
             self._A = colormap
 
         elif 'Ternary' in self.dtype:
-            red = self._full_res[0][(rows-y1):(rows-y0):sy, x0:x1:sx]
-            green = self._full_res[1][(rows-y1):(rows-y0):sy, x0:x1:sx]
-            blue = self._full_res[2][(rows-y1):(rows-y0):sy, x0:x1:sx]
+            red = self._get_window(self._full_res[0], rows-y1, rows-y0,
+                                   x0, x1, sx, sy)
+            green = self._get_window(self._full_res[1], rows-y1, rows-y0,
+                                     x0, x1, sx, sy)
+            blue = self._get_window(self._full_res[2], rows-y1, rows-y0,
+                                    x0, x1, sx, sy)
             mask = np.logical_or(red.mask, green.mask)
             mask = np.logical_or(mask, blue.mask)
 
@@ -348,6 +372,54 @@ class ModestImage(mi.AxesImage):
         self._bounds = (x0, x1, y0, y1)
         self.changed()
 
+    def _get_window(self, dat, r0, r1, c0, c1, sx, sy):
+        """
+        Get a window of data, sampled to roughly match screen resolution.
+
+        The window is taken from the 2x overview whose cell size is closest
+        to, but not more than, the screen pixel size, so that the cost does
+        not depend on the size of the full resolution data. Overviews are
+        built as needed and cached for each array.
+
+        Parameters
+        ----------
+        dat : numpy masked array
+            full resolution data.
+        r0 : int
+            first row, at full resolution.
+        r1 : int
+            last row plus one, at full resolution.
+        c0 : int
+            first column, at full resolution.
+        c1 : int
+            last column plus one, at full resolution.
+        sx : int
+            number of full resolution columns per screen pixel.
+        sy : int
+            number of full resolution rows per screen pixel.
+
+        Returns
+        -------
+        numpy masked array
+            window of data.
+
+        """
+        if id(dat) not in self._overviews or \
+                self._overviews[id(dat)][0] is not dat:
+            self._overviews[id(dat)] = [dat]
+        levels = self._overviews[id(dat)]
+
+        level = int(np.log2(min(sx, sy)))
+        while len(levels) <= level and min(levels[-1].shape) > 1:
+            levels.append(_mean2x2(levels[-1]))
+        level = min(level, len(levels)-1)
+
+        fac = 2**level
+        sx = max(sx//fac, 1)
+        sy = max(sy//fac, 1)
+
+        return levels[level][r0//fac:-(-r1//fac):sy, c0//fac:-(-c1//fac):sx]
+
     def draw(self, renderer, *args, **kwargs):
         """
         Draw.
@@ -379,6 +451,49 @@ class ModestImage(mi.AxesImage):
         super().draw(renderer, *args, **kwargs)
 
 
+def _mean2x2(dat):
+    """
+    Average masked data over 2x2 cells, to make an overview.
+
+    Odd rows or columns are padded with masked values. A cell is only masked
+    if all four values are masked.
+
+    Parameters
+    ----------
+    dat : numpy masked array
+        data to average.
+
+    Returns
+    -------
+    numpy masked array
+        overview with half the rows and columns.
+
+    """
+    rows, cols = dat.shape
+    mask = np.ma.getmaskarray(dat)
+    vals = np.ma.getdata(dat)
+
+    if rows % 2 or cols % 2:
+        vals = np.pad(vals, ((0, rows % 2), (0, cols % 2)))
+        mask = np.pad(mask, ((0, rows % 2), (0, cols % 2)),
+                      constant_values=True)
+
+    dtype = np.result_type(vals.dtype, np.float32)
+    valid = ~mask
+    vals = np.where(mask, 0, vals).astype(np.float64, copy=False)
+
+    cnt = np.zeros((valid.shape[0]//2, valid.shape[1]//2), dtype=np.uint8)
+    tot = np.zeros(cnt.shape)
+    for i in range(2):
+        for j in range(2):
+            cnt += valid[i::2, j::2]
+            tot += vals[i::2, j::2]
+
+    vals = np.divide(tot, cnt, out=tot, where=(cnt > 0)).astype(dtype)
+
+    return np.ma.array(vals, mask=(cnt == 0))
+
+
 def imshow(axes, X, cmap=None, norm=None, aspect=None,
            interpolation=None, alpha=None, vmin=None, vmax=None,
            origin=None, extent=None, shape=None, filternorm=1,
@@ -494,6 +609,9 @@ class MyMplCanvas(FigureCanvas):
         matplotlib hist associated with argb
     hband: list
         list of strings containing the band names to be used.
+    hdata : list
+        list of PyGMI raster data objects for the displayed bands, in the
+        same order as hband.
     htxt : list
         list of strings associated with hhist, denoting a raster value (where
         mouse is currently hovering over on image)
@@ -543,6 +661,7 @@ class MyMplCanvas(FigureCanvas):
         self.argb = [None, None, None]
         self.hhist = [None, None, None]
         self.hband = [None, None, None]
+        self.hdata = [None, None, None]
         self.htxt = [None, None, None]
         self.image = None
         self.cnt = None
@@ -917,6 +1036,7 @@ class MyMplCanvas(FigureCanvas):
             for j in range(3):
                 if i.dataid == self.hband[j]:
                     dat[j] = i.data
+                    self.hdata[j] = i
 
         self.image.set_data(dat)
         hdata = self.image.smallres
@@ -971,6 +1091,7 @@ class MyMplCanvas(FigureCanvas):
         for i in self.data:
             if i.dataid == self.hband[0]:
                 dat = i.data
+                self.hdata[0] = i
 
         self.image.set_data(dat)
         dat = self.image.smallres
@@ -1012,10 +1133,12 @@ class MyMplCanvas(FigureCanvas):
         for i in self.data:
             if i.dataid == self.hband[0]:
                 data[0] = i.data
+                self.hdata[0] = i
 
         for i in self.sdata:
             if i.dataid == self.hband[1]:
                 data[1] = i.data
+                self.hdata[1] = i
 
         self.image.set_data(data)
 
@@ -1029,7 +1152,7 @@ class MyMplCanvas(FigureCanvas):
                                   self.hhist[i][1].max())
             self.argb[i].set_ylim(0, self.hhist[i][0].max()*1.2)
 
-        zval = [data[0].data.min(), data[1].data.min()]
+        zval = [hdata[:, :, 0].min(), hdata[:, :, 1].min()]
         self.update_hist_sun(zval)
 
         self.figure.canvas.restore_region(self.background)
@@ -1624,24 +1747,26 @@ class PlotInterp(QtWidgets.QDialog):
         elif dtype == 'Sunshade':
             pseudo = self.mmc.image._full_res[0]
             sun = self.mmc.image._full_res[1]
+            pdat, sdat = self.mmc.hdata[:2]
 
             if htype == '95% Linear, 5% Compact':
-                pseudo = histcomp(pseudo)
+                pseudo = histcomp(pseudo, hist=pdat.get_histogram(256))
 
             if htype == '98% Linear, 2% Compact':
-                pseudo = histcomp(pseudo, perc=2.)
+                pseudo = histcomp(pseudo, perc=2.,
+                                  hist=pdat.get_histogram(256))
 
             if htype == 'Histogram Equalization':
-                pseudo = histeq(pseudo)
+                pseudo = histeq(pseudo, hist=pdat.get_histogram(32768))
 
             if hstype == '95% Linear, 5% Compact':
-                sun = histcomp(sun)
+                sun = histcomp(sun, hist=sdat.get_histogram(256))
 
             if hstype == '98% Linear, 2% Compact':
-                sun = histcomp(pseudo, perc=2.)
+                sun = histcomp(sun, perc=2., hist=sdat.get_histogram(256))
 
             if hstype == 'Histogram Equalization':
-                sun = histeq(sun)
+                sun = histeq(sun, hist=sdat.get_histogram(32768))
 
             cmin = pseudo.min()
             cmax = pseudo.max()
@@ -1665,21 +1790,22 @@ class PlotInterp(QtWidgets.QDialog):
             mask = np.logical_or(red.mask, green.mask)
             mask = np.logical_or(mask, blue.mask)
             mask = np.logical_not(mask)
+            rdat, gdat, bdat = self.mmc.hdata
 
             if htype == '95% Linear, 5% Compact':
-                red = histcomp(red)
-                green = histcomp(green)
-                blue = histcomp(blue)
+                red = histcomp(red, hist=rdat.get_histogram(256))
+                green = histcomp(green, hist=gdat.get_histogram(256))
+                blue = histcomp(blue, hist=bdat.get_histogram(256))
 
             if htype == '98% Linear, 2% Compact':
-                red = histcomp(red, perc=2.)
-                green = histcomp(green, perc=2.)
-                blue = histcomp(blue, perc=2.)
+                red = histcomp(red, perc=2., hist=rdat.get_histogram(256))
+                green = histcomp(green, perc=2., hist=gdat.get_histogram(256))
+                blue = histcomp(blue, perc=2., hist=bdat.get_histogram(256))
 
             if htype == 'Histogram Equalization':
-                red = histeq(red)
-                green = histeq(green)
-                blue = histeq(blue)
+                red = histeq(red, hist=rdat.get_histogram(32768))
+                green = histeq(green, hist=gdat.get_histogram(32768))
+                blue = histeq(blue, hist=bdat.get_histogram(32768))
 
             cmin = red.min()
             cmax = red.max()
@@ -1953,14 +2079,7 @@ def aspect2(data):
     dzdy : numpy array
         gradient in y direction
     """
-    cdy = np.array([[1., 2., 1.], [0., 0., 0.], [-1., -2., -1.]])
-    cdx = np.array([[1., 0., -1.], [2., 0., -2.], [1., 0., -1.]])
-
-    dzdx = ndimage.convolve(data, cdx)  # Use convolve: matrix filtering
-    dzdy = ndimage.convolve(data, cdy)  # 'valid' gets reduced array
-
-    dzdx = ne.evaluate('dzdx/8.')
-    dzdy = ne.evaluate('dzdy/8.')
+    dzdx, dzdy = sobel_gradients(data)
 
 # Aspect Section
     pi = np.pi
@@ -1972,7 +2091,38 @@ def aspect2(data):
     return [adeg, dzdx, dzdy]
 
 
-def currentshader(data, cell, theta, phi, alpha):
+def sobel_gradients(data):
+    """
+    Sobel gradients of a dataset.
+
+    These do not depend on the sun angle, so they can be computed once and
+    passed to currentshader while the sun is moved.
+
+    Parameters
+    ----------
+    data : numpy MxN array
+        input data used for the gradient calculation
+
+    Returns
+    -------
+    dzdx : numpy array
+        gradient in x direction
+    dzdy : numpy array
+        gradient in y direction
+    """
+    cdy = np.array([[1., 2., 1.], [0., 0., 0.], [-1., -2., -1.]])
+    cdx = np.array([[1., 0., -1.], [2., 0., -2.], [1., 0., -1.]])
+
+    dzdx = ndimage.convolve(data, cdx)  # Use convolve: matrix filtering
+    dzdy = ndimage.convolve(data, cdy)  # 'valid' gets reduced array
+
+    dzdx = ne.evaluate('dzdx/8.')
+    dzdy = ne.evaluate('dzdy/8.')
+
+    return dzdx, dzdy
+
+
+def currentshader(data, cell, theta, phi, alpha, grads=None):
     """
     Blinn shader - used for sun shading.
 
@@ -1988,6 +2138,9 @@ def currentshader(data, cell, theta, phi, alpha):
         azimuth
     alpha : float
         how much incident light is reflected (0 to 1)
+    grads : tuple, optional
+        gradients of data from sobel_gradients. The default is None, which
+        computes them.
 
     Returns
     -------
@@ -1995,10 +2148,10 @@ def currentshader(data, cell, theta, phi, alpha):
         array containg the shaded results.
 
     """
-    asp = aspect2(data)
+    if grads is None:
+        grads = sobel_gradients(data)
     n = 2
-    pinit = asp[1]
-    qinit = asp[2]
+    pinit, qinit = grads
     p = ne.evaluate('pinit/cell')
     q = ne.evaluate('qinit/cell')
     sqrt_1p2q2 = ne.evaluate('sqrt(1+p**2+q**2)')
@@ -2018,7 +2171,7 @@ def currentshader(data, cell, theta, phi, alpha):
     return R
 
 
-def histcomp(img, nbr_bins=256, perc=5.):
+def histcomp(img, nbr_bins=256, perc=5., hist=None):
     """
     Histogram Compaction
 
@@ -2031,6 +2184,11 @@ def histcomp(img, nbr_bins=256, perc=5.):
         data to compact
     nbr_bins : int
         number of bins to use in compaction
+    perc : float
+        percentage of data to compact at each end
+    hist : tuple, optional
+        precomputed (histogram, bin edges) of img, such as from
+        Data.get_histogram(nbr_bins). The default is None, which computes it.
 
     Returns
     -------
@@ -2039,8 +2197,9 @@ def histcomp(img, nbr_bins=256, perc=5.):
     """
 # get image histogram
     imask = np.ma.getmaskarray(img)
-    tmp = img.compressed()
-    imhist, bins = np.histogram(tmp, nbr_bins)
+    if hist is None:
+        hist = np.histogram(img.compressed(), nbr_bins)
+    imhist, bins = hist
 
     cdf = imhist.cumsum()  # cumulative distribution function
     cdf = cdf / float(cdf[-1])  # normalize
@@ -2077,7 +2236,7 @@ def histcomp(img, nbr_bins=256, perc=5.):
     return img2
 
 
-def histeq(img, nbr_bins=32768):
+def histeq(img, nbr_bins=32768, hist=None):
     """
     Histogram Equalization.
 
@@ -2091,6 +2250,9 @@ def histeq(img, nbr_bins=32768):
         input data to be equalised
     nbr_bins : integer
         number of bins to be used in the calculation
+    hist : tuple, optional
+        precomputed (histogram, bin edges) of img, such as from
+        Data.get_histogram(nbr_bins). The default is None, which computes it.
 
     Returns
     -------
@@ -2098,7 +2260,9 @@ def histeq(img, nbr_bins=32768):
         output data
     """
 # get image histogram
-    imhist, bins = np.histogram(img.compressed(), nbr_bins)
+    if hist is None:
+        hist = np.histogram(img.compressed(), nbr_bins)
+    imhist, bins = hist
     bins = (bins[1:]-bins[:-1])/2+bins[:-1]
 
     cdf = imhist.cumsum()  # cumulative distribution function
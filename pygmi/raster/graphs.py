@@ -35,6 +35,7 @@ menu. The following are supported:
 """
 
 import numpy as np
+import scipy.stats as st
 from PyQt5 import QtWidgets, QtCore
 import matplotlib.cm as cm
 from matplotlib.backends.backend_qt5agg import FigureCanvas
@@ -60,7 +61,7 @@ class MyMplCanvas(FigureCanvas):
         self.axes = fig.add_subplot(111)
         super().__init__(fig)
 
-    def update_pcolor(self, data1, dmat):
+    def update_pcolor(self, data1, dmat, nsamples=None):
         """
         Update the correlation coefficient plot
 
@@ -70,6 +71,9 @@ class MyMplCanvas(FigureCanvas):
             raster dataset to be used in contouring.
         dmat : numpy array
             dummy matrix of numbers to be plotted using pcolor.
+        nsamples : int, optional
+            Number of randomly chosen pixels the coefficients were
+            calculated from. The default is None, meaning all pixels.
 
         Returns
         -------
@@ -78,13 +82,19 @@ class MyMplCanvas(FigureCanvas):
         """
         self.figure.clear()
         self.axes = self.figure.add_subplot(111)
-        self.axes.pcolor(dmat)
+        self.axes.pcolormesh(dmat)
         self.axes.axis('scaled')
-        self.axes.set_title('Correlation Coefficients')
-        for i in range(len(data1)):
-            for j in range(len(data1)):
-                self.axes.text(i + .1, j + .4, format(float(dmat[i, j]),
-                                                      '4.2f'))
+        if nsamples is None:
+            self.axes.set_title('Correlation Coefficients')
+        else:
+            self.axes.set_title('Correlation Coefficients (estimated from '
+                                + str(nsamples)+' random pixels)')
+        # Labelling each cell is slow and unreadable for many bands.
+        if len(data1) <= 20:
+            for i in range(len(data1)):
+                for j in range(len(data1)):
+                    self.axes.text(i + .1, j + .4, format(float(dmat[i, j]),
+                                                          '4.2f'))
         dat_mat = [i.dataid for i in data1]
         self.axes.set_xticks(np.array(list(range(len(data1)))) + .5)
 
@@ -374,10 +384,15 @@ class PlotCCoef(GraphWindow):
 
         self.show()
 
-        dummy_mat = [[corr2d(i.data, j.data) for j in data] for i in data]
-        dummy_mat = np.array(dummy_mat)
+        # Large datasets are subsampled, which is noted in the plot title.
+        nsamples = 1000000
+        rows, cols = data[0].shape
+        if rows*cols <= nsamples:
+            nsamples = None
 
-        self.mmc.update_pcolor(data, dummy_mat)
+        dummy_mat = corr_matrix(data, nsamples=nsamples)
+
+        self.mmc.update_pcolor(data, dummy_mat, nsamples)
 
 
 def check_bands(data):
@@ -397,9 +412,9 @@ def check_bands(data):
     """
     chk = True
 
-    dshape = data[0].data.shape
+    dshape = data[0].shape
     for i in data:
-        if i.data.shape != dshape:
+        if i.shape != dshape:
             chk = False
 
     return chk
@@ -424,12 +439,11 @@ def corr2d(dat1, dat2):
 
     out = None
     if dat1.shape == dat2.shape:
-        # These line are to avoid warnings due to powers of large fill values
-        mask = np.logical_or(dat1.mask, dat1.mask)
-        dat1.mask = mask
-        dat2.mask = mask
-        dat1 = dat1.compressed()
-        dat2 = dat2.compressed()
+        # Only use values which are valid in both datasets.
+        mask = np.logical_or(np.ma.getmaskarray(dat1),
+                             np.ma.getmaskarray(dat2))
+        dat1 = np.ma.getdata(dat1)[~mask]
+        dat2 = np.ma.getdata(dat2)[~mask]
 
         mdat1 = dat1 - dat1.mean()
         mdat2 = dat2 - dat2.mean()
@@ -440,6 +454,147 @@ def corr2d(dat1, dat2):
     return out
 
 
+def corr_matrix(data, method='pearson', nsamples=None, seed=0,
+                blockrows=256):
+    """
+    Calculate the correlation coefficients between all bands.
+
+    The bands are stacked a strip of rows at a time, and the sums needed
+    for every pair of bands are accumulated with matrix products. Each
+    pair only uses pixels which are valid in both bands.
+
+    Parameters
+    ----------
+    data : list of PyGMI Data
+        PyGMI raster datasets, all with the same rows and columns.
+    method : str, optional
+        'pearson' or 'spearman'. Spearman ranks are taken over the valid
+        pixels of each band. Ranking needs all the chosen pixels of every
+        band in memory at once, as float64, so nsamples should be set for
+        large datasets. The default is 'pearson'.
+    nsamples : int, optional
+        Number of randomly chosen pixels to use. All pixels are used if the
+        dataset has no more than this. The default is None, which uses all
+        pixels.
+    seed : int, optional
+        Seed for the random choice of pixels. The default is 0.
+    blockrows : int, optional
+        Number of rows stacked at a time. The default is 256.
+
+    Returns
+    -------
+    out : numpy array
+        Matrix of correlation coefficients.
+
+    """
+    rows, cols = data[0].shape
+    nbands = len(data)
+
+    sample = None
+    if nsamples is not None and nsamples < rows*cols:
+        rng = np.random.default_rng(seed)
+        sample = np.sort(rng.choice(rows*cols, nsamples, replace=False))
+
+    sums = None
+    shift = None
+    allvals = []
+    allvalid = []
+    for row in range(0, rows, blockrows):
+        nrows = min(blockrows, rows-row)
+        sel = slice(None)
+        if sample is not None:
+            idx = np.searchsorted(sample, [row*cols, (row+nrows)*cols])
+            sel = sample[idx[0]:idx[1]] - row*cols
+            if sel.size == 0:
+                continue
+
+        vals = []
+        valid = []
+        for band in data:
+            win = band.get_window(row, 0, nrows, cols)
+            vals.append(np.ma.getdata(win).ravel()[sel])
+            valid.append(~np.ma.getmaskarray(win).ravel()[sel])
+        vals = np.array(vals, dtype=np.float64)
+        valid = np.array(valid)
+
+        if method == 'spearman':
+            allvals.append(vals)
+            allvalid.append(valid)
+            continue
+
+        # Shifting by rough means keeps the sums accurate.
+        if shift is None:
+            shift = np.zeros((nbands, 1))
+            for i in range(nbands):
+                if valid[i].any():
+                    shift[i] = vals[i, valid[i]].mean()
+        sums = _corr_sums(vals - shift, valid, sums)
+
+    if method == 'spearman' and allvals:
+        vals = np.hstack(allvals)
+        valid = np.hstack(allvalid)
+        for i in range(nbands):
+            vals[i, valid[i]] = st.rankdata(vals[i, valid[i]])
+            vals[i] -= valid[i].sum()/2.
+        sums = _corr_sums(vals, valid)
+
+    if sums is None:
+        return np.full((nbands, nbands), np.nan)
+
+    num, sumx, sumxx, sumxy = sums
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = sumxy - sumx*sumx.T/num
+        var = sumxx - sumx*sumx/num
+        out = cov/np.sqrt(var*var.T)
+
+    out = np.clip(out, -1., 1.)
+    diag = np.diagonal(var) > 0
+    out[diag, diag] = 1.
+
+    return out
+
+
+def _corr_sums(vals, valid, sums=None):
+    """
+    Accumulate the sums needed for pairwise correlation coefficients.
+
+    Parameters
+    ----------
+    vals : numpy array
+        Band values, with shape (bands, pixels).
+    valid : numpy array
+        True where values are valid, with the same shape as vals.
+    sums : list, optional
+        Sums to add to. The default is None.
+
+    Returns
+    -------
+    list
+        Pixel counts, sums of x, sums of x squared and sums of x*y for each
+        pair of bands. For the first three, element [i, j] only uses pixels
+        valid in both band i and band j.
+
+    """
+    npix = vals.shape[1]
+    if valid.all():
+        sumxy = vals @ vals.T
+        num = np.full(sumxy.shape, float(npix))
+        sumx = np.repeat(vals.sum(1)[:, np.newaxis], vals.shape[0], 1)
+        sumxx = np.repeat(np.diagonal(sumxy)[:, np.newaxis], vals.shape[0],
+                          1)
+    else:
+        wgt = valid.astype(np.float64)
+        vals = np.where(valid, vals, 0.)
+        num = wgt @ wgt.T
+        sumx = vals @ wgt.T
+        sumxx = (vals*vals) @ wgt.T
+        sumxy = vals @ vals.T
+
+    if sums is None:
+        return [num, sumx, sumxx, sumxy]
+    return [i+j for i, j in zip(sums, [num, sumx, sumxx, sumxy])]
+
+
 class PlotRaster(GraphWindow):
     """
     Plot Raster Class.
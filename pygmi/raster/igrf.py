@@ -50,13 +50,11 @@ translated into Python from the Geomag code.
 
 import os
 import warnings
-from math import sin
-from math import cos
-from math import sqrt
-from math import atan2
 import copy
 from PyQt5 import QtWidgets, QtCore
 import numpy as np
+from numba import jit, prange, get_num_threads
+from scipy.interpolate import RegularGridInterpolator
 from osgeo import osr
 import pygmi.raster.dataprep as dp
 import pygmi.menu_default as menu_default
@@ -151,32 +149,12 @@ class IGRF(QtWidgets.QDialog):
         MAXCOEFF = (MAXDEG*(MAXDEG+2)+1)
 
         self.gh = np.zeros([4, MAXCOEFF])
-        self.d = 0
-        self.f = 0
-        self.h = 0
-        self.i = 0
-        self.dtemp = 0
-        self.ftemp = 0
-        self.htemp = 0
-        self.itemp = 0
-        self.x = 0
-        self.y = 0
-        self.z = 0
-        self.xtemp = 0
-        self.ytemp = 0
-        self.ztemp = 0
-        self.xdot = 0
-        self.ydot = 0
-        self.zdot = 0
-        self.fdot = 0
-        self.hdot = 0
-        self.idot = 0
-        self.ddot = 0
 
         self.dsb_alt = QtWidgets.QDoubleSpinBox()
         self.dateedit = QtWidgets.QDateEdit()
         self.combobox_dtm = QtWidgets.QComboBox()
         self.combobox_mag = QtWidgets.QComboBox()
+        self.sb_lattice = QtWidgets.QSpinBox()
         self.proj = dp.GroupProj('Input Projection')
 
         self.setupui()
@@ -200,11 +178,15 @@ class IGRF(QtWidgets.QDialog):
         label_1 = QtWidgets.QLabel('Date')
         label_2 = QtWidgets.QLabel('Digital Elevation Model')
         label_3 = QtWidgets.QLabel('Magnetic Data')
+        label_4 = QtWidgets.QLabel('Calculation spacing (cells)')
 
         buttonbox.setOrientation(QtCore.Qt.Horizontal)
         buttonbox.setStandardButtons(buttonbox.Cancel | buttonbox.Ok)
 
         self.dsb_alt.setMaximum(99999.9)
+        self.sb_lattice.setMinimum(1)
+        self.sb_lattice.setMaximum(1000)
+        self.sb_lattice.setValue(1)
 
         self.setWindowTitle('IGRF')
 
@@ -217,8 +199,10 @@ class IGRF(QtWidgets.QDialog):
         gridlayout.addWidget(self.combobox_dtm, 4, 1, 1, 1)
         gridlayout.addWidget(label_3, 5, 0, 1, 1)
         gridlayout.addWidget(self.combobox_mag, 5, 1, 1, 1)
-        gridlayout.addWidget(buttonbox, 6, 1, 1, 1)
-        gridlayout.addWidget(helpdocs, 6, 0, 1, 1)
+        gridlayout.addWidget(label_4, 6, 0, 1, 1)
+        gridlayout.addWidget(self.sb_lattice, 6, 1, 1, 1)
+        gridlayout.addWidget(buttonbox, 7, 1, 1, 1)
+        gridlayout.addWidget(helpdocs, 7, 0, 1, 1)
 
         buttonbox.accepted.connect(self.accept)
         buttonbox.rejected.connect(self.reject)
@@ -288,35 +272,7 @@ class IGRF(QtWidgets.QDialog):
 
         self.acceptall()
 
-        with open(os.path.join(os.path.dirname(__file__),
-                               'IGRF13.cof')) as mdf:
-            modbuff = mdf.readlines()
-        fileline = -1                            # First line will be 1
-        model = []
-        epoch = []
-        max1 = []
-        max2 = []
-        max3 = []
-        yrmin = []
-        yrmax = []
-        altmin = []
-        altmax = []
-        irec_pos = []
-# First model will be 0
-        for i in modbuff:
-            fileline += 1  # On new line
-            if i[:3] == '   ':
-                i2 = i.split()
-                model.append(i2[0])
-                epoch.append(float(i2[1]))
-                max1.append(int(i2[2]))
-                max2.append(int(i2[3]))
-                max3.append(int(i2[4]))
-                yrmin.append(float(i2[5]))
-                yrmax.append(float(i2[6]))
-                altmin.append(float(i2[7]))
-                altmax.append(float(i2[8]))
-                irec_pos.append(fileline)
+        model = get_model()
 
         i = self.combobox_mag.currentIndex()
         maggrid = data[i]
@@ -325,7 +281,7 @@ class IGRF(QtWidgets.QDialog):
         data = data[i]
         altgrid = data.data.flatten() * 0.001  # in km
 
-        maxyr = max(yrmax)
+        maxyr = model.yrmax.max()
         sdate = self.dateedit.date()
         sdate = sdate.year()+sdate.dayOfYear()/sdate.daysInYear()
         alt = self.dsb_alt.value()
@@ -342,9 +298,6 @@ class IGRF(QtWidgets.QDialog):
         igrf_F = altgrid * 0
         igrf_I = altgrid * 0
         igrf_D = altgrid * 0
-        # Pick model
-        yrmax = np.array(yrmax)
-        modelI = sum(yrmax < sdate)
         igdgc = 1
 
         if maxyr < sdate < maxyr+1:
@@ -353,50 +306,29 @@ class IGRF(QtWidgets.QDialog):
             print('An updated model file is available before 1.1.' +
                   str(maxyr))
 
-        if max2[modelI] == 0:
-            self.getshc(modbuff, 1, irec_pos[modelI], max1[modelI], 0)
-            self.getshc(modbuff, 1, irec_pos[modelI+1], max1[modelI+1], 1)
-            nmax = self.interpsh(sdate, yrmin[modelI], max1[modelI],
-                                 yrmin[modelI+1], max1[modelI+1], 2)
-            nmax = self.interpsh(sdate+1, yrmin[modelI], max1[modelI],
-                                 yrmin[modelI+1], max1[modelI+1], 3)
+        gh, nmax = model.get_gh([sdate, sdate+1])
+        self.gh[2:, :gh.shape[1]] = gh
+        nmax = nmax[0]
+
+        mask = np.ma.getmaskarray(altgrid)
+        altgrid = np.ma.getdata(altgrid)
+        lattice = self.sb_lattice.value()
+
+        if lattice > 1 and min(drows, dcols) > lattice:
+            x, y, z = self.lattice_xyz(xdat.reshape(drows, dcols),
+                                       ydat.reshape(drows, dcols),
+                                       altgrid.reshape(drows, dcols),
+                                       mask.reshape(drows, dcols),
+                                       lattice, igdgc, nmax)
         else:
-            self.getshc(modbuff, 1, irec_pos[modelI], max1[modelI], 0)
-            self.getshc(modbuff, 0, irec_pos[modelI], max2[modelI], 1)
-            nmax = self.extrapsh(sdate, epoch[modelI], max1[modelI],
-                                 max2[modelI], 2)
-            nmax = self.extrapsh(sdate+1, epoch[modelI], max1[modelI],
-                                 max2[modelI], 3)
-
-        progress = 0
-        maxlen = xdat.size
-
-        alli = []
-        alld = []
-        allf = []
-        for i in self.piter(range(maxlen)):
-            if igrf_F.mask[i]:
-                continue
-
-            tmp = int(i*100/maxlen)
-            if tmp > progress:
-                progress = tmp
-
-            longitude, latitude, _ = self.ctrans.TransformPoint(xdat[i],
-                                                                ydat[i])
-            alt = altgrid[i]
-
-# Do the first calculations
-            self.shval3(igdgc, latitude, longitude, alt, nmax, 3)
-            self.dihf(3)
-
-            igrf_F[i] = self.f
-            igrf_I[i] = np.rad2deg(self.i)
-            igrf_D[i] = np.rad2deg(self.d)
-
-            alli.append(self.i)
-            alld.append(self.d)
-            allf.append(self.f)
+            x, y, z = self.points_xyz(xdat[~mask], ydat[~mask],
+                                      altgrid[~mask], igdgc, nmax)
+
+        alld, alli, _, allf = dihf_points(x, y, z)
+
+        igrf_F[~mask] = allf
+        igrf_I[~mask] = np.rad2deg(alli)
+        igrf_D[~mask] = np.rad2deg(alld)
 
         fmean = np.mean(allf)
         imean = np.rad2deg(np.mean(alli))
@@ -446,435 +378,515 @@ class IGRF(QtWidgets.QDialog):
 
         return True
 
-    def getshc(self, file, iflag, strec, nmax_of_gh, gh):
+    def points_xyz(self, xdat, ydat, alt, igdgc, nmax, chunk=65536):
         """
-        Reads spherical harmonic coefficients from the specified model into an
-        array (Schmidt quasi-normal internal spherical harmonic coefficients).
+        Calculate field components at points in the input projection.
 
-        | FORTRAN: Bill Flanagan, NOAA CORPS, DESDIS, NGDC, 325 Broadway,
-        | Boulder CO.  80301
-        | C: C. H. Shaffer, Lockheed Missiles and Space Company, Sunnyvale CA
+        Points are transformed to degrees and evaluated in chunks, using the
+        coefficients in self.gh[2].
 
         Parameters
         ----------
-        file : file
-            reference to a file object
-        iflag :
-            Flag for SV equal to 1 or not equal to 1 for designated read
-            statements
-        strec : int
-            Starting record number to read from model
-        nmax_of_gh : int
-            Maximum degree and order of model
-        gh : int
-            Index for gh.
+        xdat : numpy array
+            x coordinates in the input projection.
+        ydat : numpy array
+            y coordinates in the input projection.
+        alt : numpy array
+            altitudes in km.
+        igdgc : int
+            1 if geodetic, 2 if geocentric.
+        nmax : int
+            maximum degree and order of coefficients.
+        chunk : int, optional
+            number of points per chunk. The default is 65536.
 
         Returns
         -------
-        None.
+        x : numpy array
+            northward component.
+        y : numpy array
+            eastward component.
+        z : numpy array
+            vertically downward component.
+
         """
-        ii = -1
-        cnt = 0
-
-        for nn in range(1, nmax_of_gh+1):
-            for _ in range(nn+1):
-                cnt += 1
-                tmp = file[strec+cnt]
-                tmp = tmp.split()
-                m = int(tmp[1])
-
-                if iflag == 1:
-                    g = float(tmp[2])
-                    hh = float(tmp[3])
-                else:
-                    g = float(tmp[4])
-                    hh = float(tmp[5])
+        x = np.zeros(xdat.size)
+        y = np.zeros(xdat.size)
+        z = np.zeros(xdat.size)
 
-                ii = ii + 1
-                self.gh[gh][ii] = g
+        for i in self.piter(range(0, xdat.size, chunk)):
+            pts = np.transpose([xdat[i:i+chunk], ydat[i:i+chunk]])
+            lonlat = np.array(self.ctrans.TransformPoints(pts))
+            x[i:i+chunk], y[i:i+chunk], z[i:i+chunk] = shval3_points(
+                igdgc, lonlat[:, 1], lonlat[:, 0], alt[i:i+chunk], nmax,
+                self.gh[2])
 
-                if m != 0:
-                    ii = ii + 1
-                    self.gh[gh][ii] = hh
+        return x, y, z
 
-    def extrapsh(self, date, dte1, nmax1, nmax2, gh):
+    def lattice_xyz(self, xdat, ydat, alt, mask, lattice, igdgc, nmax):
         """
-        Extrapolates linearly a spherical harmonic model with a
-        rate-of-change model.
+        Calculate field components on a coarse lattice and interpolate.
 
-        Updates self.gh (Schmidt quasi-normal internal spherical harmonic
-        coefficients).
-
-        | FORTRAN : A. Zunde, USGS, MS 964, box 25046 Federal Center, Denver,
-        | CO. 80225
-        | C : C. H. Shaffer, Lockheed Missiles and Space Company, Sunnyvale CA
+        The field is calculated at every lattice-th row and column, at the
+        lowest and highest altitude of the grid. It is then interpolated
+        bilinearly in position and linearly in altitude, which is accurate
+        since the field is smooth at grid scale.
 
         Parameters
         ----------
-        date : float
-            date of resulting model (in decimal year)
-        dte1 : float
-            date of base model
-        nmax1 : int
-            maximum degree and order of base model
-        nmax2 : int
-            maximum degree and order of rate-of-change model
-        gh  : numpy array
-            Schmidt quasi-normal internal spherical harmonic coefficients of
-            base model and rate-of-change model
+        xdat : numpy array
+            x coordinates in the input projection, as a grid.
+        ydat : numpy array
+            y coordinates in the input projection, as a grid.
+        alt : numpy array
+            altitudes in km, as a grid.
+        mask : numpy array
+            mask of cells not to calculate.
+        lattice : int
+            lattice spacing in cells.
+        igdgc : int
+            1 if geodetic, 2 if geocentric.
+        nmax : int
+            maximum degree and order of coefficients.
 
         Returns
         -------
-        nmax : int
-            maximum degree and order of resulting model
+        x : numpy array
+            northward component at unmasked cells.
+        y : numpy array
+            eastward component at unmasked cells.
+        z : numpy array
+            vertically downward component at unmasked cells.
+
         """
-        factor = date - dte1
-        if nmax1 == nmax2:
-            k = nmax1 * (nmax1 + 2)
-            nmax = nmax1
-        else:
-            if nmax1 > nmax2:
-                k = nmax2 * (nmax2 + 2)
-                l = nmax1 * (nmax1 + 2)
-                for ii in range(k, l):
-                    self.gh[gh][ii] = self.gh[0][ii]
+        drows, dcols = xdat.shape
+        rows = np.union1d(np.arange(0, drows, lattice), [drows-1])
+        cols = np.union1d(np.arange(0, dcols, lattice), [dcols-1])
 
-                nmax = nmax1
-            else:
-                k = nmax1 * (nmax1 + 2)
-                l = nmax2 * (nmax2 + 2)
-                for ii in range(k, l):
-                    self.gh[gh][ii] = factor * self.gh[1][ii]
+        lx = xdat[np.ix_(rows, cols)].flatten()
+        ly = ydat[np.ix_(rows, cols)].flatten()
+        altmin = alt[~mask].min()
+        altmax = alt[~mask].max()
 
-                nmax = nmax2
+        xyz = []
+        for lalt in [altmin, altmax]:
+            lxyz = self.points_xyz(lx, ly, np.full(lx.size, lalt), igdgc,
+                                   nmax)
+            xyz.append([i.reshape(rows.size, cols.size) for i in lxyz])
 
-        for ii in range(k):
-            self.gh[gh][ii] = self.gh[0][ii] + factor * self.gh[1][ii]
+        ri, ci = np.nonzero(~mask)
+        pts = np.transpose([ri, ci])
+        wts = 0.
+        if altmax > altmin:
+            wts = (alt[ri, ci]-altmin)/(altmax-altmin)
 
-        return nmax
+        out = []
+        for low, high in zip(*xyz):
+            flow = RegularGridInterpolator((rows, cols), low)(pts)
+            fhigh = RegularGridInterpolator((rows, cols), high)(pts)
+            out.append(flow + wts*(fhigh-flow))
+
+        return out
 
-    def interpsh(self, date, dte1, nmax1, dte2, nmax2, gh):
-        """
-        Interpolates linearly, in time, between two spherical harmonic
-        models.
 
-        Updates self.gh (Schmidt quasi-normal internal spherical harmonic
-        coefficients).
+class IGRFModel():
+    """
+    IGRF spherical harmonic coefficients for all epochs of a model file.
 
-        | FORTRAN : A. Zunde, USGS, MS 964, box 25046 Federal Center, Denver,
-        | CO. 80225
-        | C : C. H. Shaffer, Lockheed Missiles and Space Company, Sunnyvale CA
+    The coefficients are stored as arrays, so that the model for any number
+    of dates can be found at once with get_gh.
+
+    Attributes
+    ----------
+    model : numpy array
+        names of the models in the file.
+    epoch : numpy array
+        epoch of each model.
+    max1 : numpy array
+        maximum degree of the main field coefficients of each model.
+    max2 : numpy array
+        maximum degree of the secular variation coefficients of each model.
+    yrmin : numpy array
+        minimum year of each model.
+    yrmax : numpy array
+        maximum year of each model.
+    gh : numpy array
+        main field coefficients, one row per model, padded with zeros.
+    sv : numpy array
+        secular variation coefficients, one row per model, padded with
+        zeros.
+    """
+
+    def __init__(self):
+        self.model = np.array([], dtype=str)
+        self.epoch = np.array([])
+        self.max1 = np.array([], dtype=int)
+        self.max2 = np.array([], dtype=int)
+        self.yrmin = np.array([])
+        self.yrmax = np.array([])
+        self.gh = np.zeros((0, 0))
+        self.sv = np.zeros((0, 0))
+
+    def read_cof(self, ifile):
+        """
+        Read a model from an IGRF .cof text file.
 
         Parameters
         ----------
-        date : float
-            date of resulting model (in decimal year)
-        dte1 : float
-            date of earlier model
-        nmax1 : int
-            maximum degree and order of earlier model
-        dte2 : float
-            date of later model
-        nmax2 : int
-            maximum degree and order of later model
-        gh : numpy array
-            Schmidt quasi-normal internal spherical harmonic coefficients of
-            earlier model and internal model
+        ifile : str
+            filename of the .cof file.
 
         Returns
         -------
-        nmax : int
-            maximum degree and order of resulting model
+        None.
+
         """
-        factor = (date - dte1) / (dte2 - dte1)
-        if nmax1 == nmax2:
-            k = nmax1 * (nmax1 + 2)
-            nmax = nmax1
-        else:
-            if nmax1 > nmax2:
-                k = nmax2 * (nmax2 + 2)
-                l = nmax1 * (nmax1 + 2)
-                for ii in range(k, l):
-                    self.gh[gh][ii] = self.gh[0][ii] + factor*(-self.gh[0][ii])
-                nmax = nmax1
-            else:
-                k = nmax1 * (nmax1 + 2)
-                l = nmax2 * (nmax2 + 2)
-                for ii in range(k, l):
-                    self.gh[gh][ii] = factor * self.gh[1][ii]
+        with open(ifile) as mdf:
+            modbuff = mdf.readlines()
 
-                nmax = nmax2
+        header = [i for i, line in enumerate(modbuff) if line[:3] == '   ']
+        hdat = [modbuff[i].split() for i in header]
 
-        for ii in range(k):
-            self.gh[gh][ii] = self.gh[0][ii] + factor*(self.gh[1][ii] -
-                                                       self.gh[0][ii])
+        self.model = np.array([i[0] for i in hdat])
+        self.epoch = np.array([float(i[1]) for i in hdat])
+        self.max1 = np.array([int(i[2]) for i in hdat])
+        self.max2 = np.array([int(i[3]) for i in hdat])
+        self.yrmin = np.array([float(i[5]) for i in hdat])
+        self.yrmax = np.array([float(i[6]) for i in hdat])
 
-        return nmax
+        maxdeg = self.max1.max()
+        ncoeff = maxdeg*(maxdeg+2)
+        self.gh = np.zeros((len(header), ncoeff))
+        self.sv = np.zeros((len(header), ncoeff))
 
-    def shval3(self, igdgc, flat, flon, elev, nmax, gh):
-        """
-        Calculates field components from spherical harmonic (sh) models.
+        for i, strec in enumerate(header):
+            nmax = self.max1[i]
+            npq = (nmax*(nmax+3))//2
+            dat = np.array([line.split()[:6] for line in
+                            modbuff[strec+1:strec+1+npq]], dtype=float)
+
+            # g is stored for every m, and h only where m is not zero.
+            mnot0 = dat[:, 1] != 0
+            cnt = 1 + mnot0
+            idx = np.cumsum(cnt) - cnt
 
-        This routine updates self.x, self.y, self.z (Northward, Eastward and
-        vertically downward components respectively NED)
+            self.gh[i, idx] = dat[:, 2]
+            self.gh[i, idx[mnot0]+1] = dat[mnot0, 3]
 
-        Based on subroutine 'igrf' by D. R. Barraclough and S. R. C. Malin,
-        report no. 71/1, institute of geological sciences, U.K.
+            self.sv[i, idx] = dat[:, 4]
+            self.sv[i, idx[mnot0]+1] = dat[mnot0, 5]
+            self.sv[i, self.max2[i]*(self.max2[i]+2):] = 0.
+
+    def get_gh(self, dates):
+        """
+        Get the model coefficients for a list of dates.
 
-        | FORTRAN : Norman W. Peddie, USGS, MS 964, box 25046 Federal Center,
-        | Denver, CO. 80225
-        | C : C. H. Shaffer, Lockheed Missiles and Space Company, Sunnyvale CA
+        Between models without secular variation the coefficients are
+        interpolated linearly. After the last of them, they are extrapolated
+        with the secular variation.
 
         Parameters
         ----------
-        igdgc : int
-            indicates coordinate system used set equal to 1 if geodetic, 2 if
-            geocentric
-        flat : float
-            north latitude, in degrees
-        flon : float
-            east longitude, in degrees
-        elev : float
-            WGS84 altitude above ellipsoid (igdgc=1), or radial distance from
-            earth's center (igdgc=2)
-        nmax : int
-            maximum degree and order of coefficients
-        gh : numpy array
-            Schmidt quasi-normal internal spherical harmonic coefficients of
-            earlier model and internal model
+        dates : list or numpy array
+            dates in decimal years.
 
         Returns
         -------
-        None.
+        gh : numpy array
+            coefficients, one row per date.
+        nmax : numpy array
+            maximum degree and order of the coefficients for each date.
+
         """
+        dates = np.atleast_1d(np.asarray(dates, dtype=float))
+        nmod = self.epoch.size
+
+        imod = (self.yrmax[None, :] < dates[:, None]).sum(1)
+        imod = np.minimum(imod, nmod-1)
+        inext = np.minimum(imod+1, nmod-1)
+        interp = (self.max2[imod] == 0)
+
+        factor = np.where(interp,
+                          (dates - self.yrmin[imod]) /
+                          (self.yrmin[inext] - self.yrmin[imod] +
+                           (inext == imod)),
+                          dates - self.epoch[imod])
+        delta = np.where(interp[:, None],
+                         self.gh[inext] - self.gh[imod],
+                         self.sv[imod])
+
+        gh = self.gh[imod] + factor[:, None]*delta
+        nmax = np.where(interp,
+                        np.maximum(self.max1[imod], self.max1[inext]),
+                        np.maximum(self.max1[imod], self.max2[imod]))
+
+        return gh, nmax
+
+
+_MODELS = {}
+
+
+def get_model(ifile=None):
+    """
+    Get an IGRF model, parsing the .cof file only once.
+
+    The parsed model is kept in memory for the rest of the session, and is
+    parsed again if the .cof file changes.
+
+    Parameters
+    ----------
+    ifile : str, optional
+        filename of the .cof file. The default is None, which uses the
+        IGRF13.COF file supplied with PyGMI.
+
+    Returns
+    -------
+    model : IGRFModel
+        IGRF model coefficients.
+
+    """
+    if ifile is None:
+        ifile = os.path.join(os.path.dirname(__file__), 'IGRF13.COF')
+    ifile = os.path.abspath(ifile)
+    mtime = os.path.getmtime(ifile)
 
+    if ifile in _MODELS and _MODELS[ifile][0] == mtime:
+        return _MODELS[ifile][1]
+
+    model = IGRFModel()
+    model.read_cof(ifile)
+
+    _MODELS[ifile] = (mtime, model)
+
+    return model
+
+
+def dihf_points(x, y, z):
+    """
+    Compute the geomagnetic d, i, h, and f from arrays of x, y, and z.
+
+
+    Parameters
+    ----------
+    x : numpy array
+        northward component
+    y : numpy array
+        eastward component
+    z : numpy array
+        vertically-downward component
+
+    Returns
+    -------
+    d : numpy array
+        declination in radians
+    i : numpy array
+        inclination in radians
+    h : numpy array
+        horizontal intensity
+    f : numpy array
+        total intensity
+    """
+    sn = 0.0001
+
+    h = np.sqrt(x*x + y*y)
+    f = np.sqrt(h*h + z*z)
+    i = np.arctan2(z, h)
+    hpx = h + x
+    d = 2.0 * np.arctan2(y, hpx)
+    d[hpx < sn] = np.pi
+    d[h < sn] = np.nan
+    d[f < sn] = np.nan
+    i[f < sn] = np.nan
+
+    return d, i, h, f
+
+
+def shval3_points(igdgc, flat, flon, elev, nmax, gh):
+    """
+    Calculate field components from spherical harmonic models at points.
+
+    Points are evaluated in parallel.
+
+    Parameters
+    ----------
+    igdgc : int
+        indicates coordinate system used set equal to 1 if geodetic, 2 if
+        geocentric
+    flat : numpy array
+        north latitudes, in degrees
+    flon : numpy array
+        east longitudes, in degrees
+    elev : numpy array
+        WGS84 altitudes above ellipsoid (igdgc=1), or radial distances from
+        earth's center (igdgc=2)
+    nmax : int
+        maximum degree and order of coefficients
+    gh : numpy array
+        Schmidt quasi-normal internal spherical harmonic coefficients
+
+    Returns
+    -------
+    x : numpy array
+        northward component
+    y : numpy array
+        eastward component
+    z : numpy array
+        vertically downward component
+    """
+    flat = np.ascontiguousarray(flat, dtype=np.float64)
+    flon = np.ascontiguousarray(flon, dtype=np.float64)
+    elev = np.ascontiguousarray(elev, dtype=np.float64)
+    gh = np.ascontiguousarray(gh, dtype=np.float64)
+    nblocks = min(flat.size, 4*get_num_threads())
+
+    return _shval3(igdgc, flat, flon, elev, nmax, gh, max(nblocks, 1))
+
+
+@jit(nopython=True, parallel=True)
+def _shval3(igdgc, flat, flon, elev, nmax, gh, nblocks):
+    """
+    Calculate field components, in parallel blocks of points.
+
+    Parameters
+    ----------
+    igdgc : int
+        1 if geodetic, 2 if geocentric.
+    flat : numpy array
+        north latitudes, in degrees.
+    flon : numpy array
+        east longitudes, in degrees.
+    elev : numpy array
+        altitudes or radial distances.
+    nmax : int
+        maximum degree and order of coefficients.
+    gh : numpy array
+        spherical harmonic coefficients.
+    nblocks : int
+        number of blocks of points.
+
+    Returns
+    -------
+    xout : numpy array
+        northward component.
+    yout : numpy array
+        eastward component.
+    zout : numpy array
+        vertically downward component.
+
+    """
+    npts = flat.size
+    xout = np.zeros(npts)
+    yout = np.zeros(npts)
+    zout = np.zeros(npts)
+
+    earths_radius = 6371.2
+    dtr = np.pi/180.0
+    a2 = 40680631.59            # WGS84
+    b2 = 40408299.98            # WGS84
+    npq = (nmax * (nmax + 3)) // 2
+    bsize = (npts + nblocks - 1) // nblocks
+
+    for blk in prange(nblocks):
         sl = np.zeros(14)
         cl = np.zeros(14)
         p = np.zeros(119)
         q = np.zeros(119)
-        earths_radius = 6371.2
-        dtr = np.pi/180.0
-
-        # a2,b2 are squares of semi-major and semi-minor axes of the reference
-        # spheroid used for transforming between geodetic and geocentric
-        # coordinates or components
-
-        a2 = 40680631.59            # WGS84
-        b2 = 40408299.98            # WGS84
-        r = elev
-        argument = flat * dtr
-        slat = sin(argument)
-        if (90.0 - flat) < 0.001:
-            aa = 89.999            # 300 ft. from North pole
-        elif (90.0 + flat) < 0.001:
-            aa = -89.999        # 300 ft. from South pole
-        else:
-            aa = flat
-
-        argument = aa * dtr
-        clat = cos(argument)
-        argument = flon * dtr
-        sl[1] = sin(argument)
-        cl[1] = cos(argument)
-
-        if gh == 3:
-            self.x = 0
-            self.y = 0
-            self.z = 0
-        elif gh == 4:
-            self.xtemp = 0
-            self.ytemp = 0
-            self.ztemp = 0
-
-        sd = 0.0
-        cd = 1.0
-        l = 0
-        n = 0
-        m = 1
-        npq = int((nmax * (nmax + 3)) / 2)
-        if igdgc == 1:
-            aa = a2 * clat * clat
-            bb = b2 * slat * slat
-            cc = aa + bb
-            argument = cc
-            dd = sqrt(argument)
-            argument = elev * (elev + 2.0 * dd) + (a2 * aa + b2 * bb) / cc
-            r = sqrt(argument)
-            cd = (elev + dd) / r
-            sd = (a2 - b2) / dd * slat * clat / r
-            aa = slat
-            slat = slat * cd - clat * sd
-            clat = clat * cd + aa * sd
-
-        ratio = earths_radius / r
-        argument = 3.0
-        aa = sqrt(argument)
-        p[1] = 2.0 * slat
-        p[2] = 2.0 * clat
-        p[3] = 4.5 * slat * slat - 1.5
-        p[4] = 3.0 * aa * clat * slat
-        q[1] = -clat
-        q[2] = slat
-        q[3] = -3.0 * clat * slat
-        q[4] = aa * (slat * slat - clat * clat)
-        for k in range(1, npq+1):
-            if n < m:
-                m = 0
-                n = n + 1
-                argument = ratio
-                power = n + 2
-                rr = pow(argument, power)
-                fn = n
-
-            fm = m
-            if k >= 5:
-                if m == n:
-                    argument = (1.0 - 0.5/fm)
-                    aa = sqrt(argument)
-                    j = k - n - 1
-                    p[k] = (1.0 + 1.0/fm) * aa * clat * p[j]
-                    q[k] = aa * (clat * q[j] + slat/fm * p[j])
-                    sl[m] = sl[m-1] * cl[1] + cl[m-1] * sl[1]
-                    cl[m] = cl[m-1] * cl[1] - sl[m-1] * sl[1]
-                else:
-                    argument = fn*fn - fm*fm
-                    aa = sqrt(argument)
-                    argument = ((fn - 1.0)*(fn-1.0)) - (fm * fm)
-                    bb = sqrt(argument)/aa
-                    cc = (2.0 * fn - 1.0)/aa
-                    ii = k - n
-                    j = k - 2 * n + 1
-                    p[k] = (fn + 1.0) * (cc * slat/fn * p[ii]-bb/(fn-1.0)*p[j])
-                    q[k] = cc * (slat * q[ii] - clat/fn * p[ii]) - bb * q[j]
-
-            if gh == 3:
-                aa = rr * self.gh[2][l]
-            elif gh == 4:
-                aa = rr * self.gh[3][l]
-
-            if m == 0:
-                if gh == 3:
-                    self.x = self.x + aa * q[k]
-                    self.z = self.z - aa * p[k]
-                elif gh == 4:
-                    self.xtemp = self.xtemp + aa * q[k]
-                    self.ztemp = self.ztemp - aa * p[k]
-                else:
-                    warnings.warn('\nError in subroutine shval3')
 
-                l = l + 1
+        for ipt in range(blk*bsize, min(npts, (blk+1)*bsize)):
+            r = elev[ipt]
+            slat = np.sin(flat[ipt] * dtr)
+            if (90.0 - flat[ipt]) < 0.001:
+                aa = 89.999            # 300 ft. from North pole
+            elif (90.0 + flat[ipt]) < 0.001:
+                aa = -89.999        # 300 ft. from South pole
             else:
-                if gh == 3:
-                    bb = rr * self.gh[2][l+1]
-                    cc = aa * cl[m] + bb * sl[m]
-                    self.x = self.x + cc * q[k]
-                    self.z = self.z - cc * p[k]
-                    if clat > 0:
-                        self.y = (self.y + (aa*sl[m] - bb*cl[m])*fm *
-                                  p[k]/((fn + 1.0)*clat))
+                aa = flat[ipt]
+
+            clat = np.cos(aa * dtr)
+            sl[1] = np.sin(flon[ipt] * dtr)
+            cl[1] = np.cos(flon[ipt] * dtr)
+
+            x = 0.
+            y = 0.
+            z = 0.
+            sd = 0.0
+            cd = 1.0
+            l = 0
+            n = 0
+            m = 1
+            rr = 0.
+            fn = 0.
+            if igdgc == 1:
+                aa = a2 * clat * clat
+                bb = b2 * slat * slat
+                cc = aa + bb
+                dd = np.sqrt(cc)
+                r = np.sqrt(elev[ipt] * (elev[ipt] + 2.0 * dd) +
+                            (a2 * aa + b2 * bb) / cc)
+                cd = (elev[ipt] + dd) / r
+                sd = (a2 - b2) / dd * slat * clat / r
+                aa = slat
+                slat = slat * cd - clat * sd
+                clat = clat * cd + aa * sd
+
+            ratio = earths_radius / r
+            aa = np.sqrt(3.0)
+            p[1] = 2.0 * slat
+            p[2] = 2.0 * clat
+            p[3] = 4.5 * slat * slat - 1.5
+            p[4] = 3.0 * aa * clat * slat
+            q[1] = -clat
+            q[2] = slat
+            q[3] = -3.0 * clat * slat
+            q[4] = aa * (slat * slat - clat * clat)
+            for k in range(1, npq+1):
+                if n < m:
+                    m = 0
+                    n = n + 1
+                    rr = ratio ** (n + 2)
+                    fn = float(n)
+
+                fm = float(m)
+                if k >= 5:
+                    if m == n:
+                        aa = np.sqrt(1.0 - 0.5/fm)
+                        j = k - n - 1
+                        p[k] = (1.0 + 1.0/fm) * aa * clat * p[j]
+                        q[k] = aa * (clat * q[j] + slat/fm * p[j])
+                        sl[m] = sl[m-1] * cl[1] + cl[m-1] * sl[1]
+                        cl[m] = cl[m-1] * cl[1] - sl[m-1] * sl[1]
                     else:
-                        self.y = self.y + (aa*sl[m] - bb*cl[m])*q[k]*slat
-                    l = l + 2
-                elif gh == 4:
-                    bb = rr * self.gh[3][l+1]
+                        aa = np.sqrt(fn*fn - fm*fm)
+                        bb = np.sqrt(((fn - 1.0)*(fn-1.0)) - (fm * fm))/aa
+                        cc = (2.0 * fn - 1.0)/aa
+                        ii = k - n
+                        j = k - 2 * n + 1
+                        p[k] = (fn + 1.0) * (cc * slat/fn * p[ii] -
+                                             bb/(fn-1.0)*p[j])
+                        q[k] = cc * (slat * q[ii] - clat/fn * p[ii]) - bb*q[j]
+
+                aa = rr * gh[l]
+
+                if m == 0:
+                    x = x + aa * q[k]
+                    z = z - aa * p[k]
+                    l = l + 1
+                else:
+                    bb = rr * gh[l+1]
                     cc = aa * cl[m] + bb * sl[m]
-                    self.xtemp = self.xtemp + cc * q[k]
-                    self.ztemp = self.ztemp - cc * p[k]
+                    x = x + cc * q[k]
+                    z = z - cc * p[k]
                     if clat > 0:
-                        self.ytemp = (self.ytemp + (aa*sl[m] - bb*cl[m])*fm *
-                                      p[k]/((fn + 1.0) * clat))
+                        y = (y + (aa*sl[m] - bb*cl[m])*fm *
+                             p[k]/((fn + 1.0)*clat))
                     else:
-                        self.ytemp = (self.ytemp + (aa*sl[m] - bb*cl[m]) *
-                                      q[k]*slat)
+                        y = y + (aa*sl[m] - bb*cl[m])*q[k]*slat
                     l = l + 2
 
-            m = m + 1
-
-        if gh == 3:
-            aa = self.x
-            self.x = self.x * cd + self.z * sd
-            self.z = self.z * cd - aa * sd
-        elif gh == 4:
-            aa = self.xtemp
-            self.xtemp = self.xtemp * cd + self.ztemp * sd
-            self.ztemp = self.ztemp * cd - aa * sd
-
-    def dihf(self, gh):
-        """
-        Computes the geomagnetic d, i, h, and f from x, y, and z.
-
-        This updates self.d, self.i, self.h and self.f (declination,
-        inclination, horizontal intensity and total intensity).
+                m = m + 1
 
-        | FORTRAN : A. Zunde, USGS, MS 964, box 25046 Federal Center, Denver,
-        | CO. 80225
-        | C : C. H. Shaffer, Lockheed Missiles and Space Company, Sunnyvale CA
+            xout[ipt] = x * cd + z * sd
+            yout[ipt] = y
+            zout[ipt] = z * cd - x * sd
 
-        Parameters
-        ----------
-        x : float
-            northward component
-        y : float
-            eastward component
-        z : float
-            vertically-downward component
-
-        Returns
-        -------
-
-        None.
-
-        """
-        sn = 0.0001
-
-        if gh == 3:
-            x = self.x
-            y = self.y
-            z = self.z
-            h = self.h
-            f = self.f
-            i = self.i
-            d = self.d
-        else:
-            x = self.xtemp
-            y = self.ytemp
-            z = self.ztemp
-            h = self.htemp
-            f = self.ftemp
-            i = self.itemp
-            d = self.dtemp
-
-        for _ in range(2):
-            h2 = x*x + y*y
-            argument = h2
-            h = sqrt(argument)       # calculate horizontal intensity
-            argument = h2 + z*z
-            f = sqrt(argument)      # calculate total intensity
-            if f < sn:
-                d = np.nan        # If d and i cannot be determined,
-                i = np.nan        # set equal to NaN
-            else:
-                argument = z
-                argument2 = h
-                i = atan2(argument, argument2)
-                if h < sn:
-                    d = np.nan
-                else:
-                    hpx = h + x
-                    if hpx < sn:
-                        d = np.pi
-                    else:
-                        argument = y
-                        argument2 = hpx
-                        d = 2.0 * atan2(argument, argument2)
-
-        if gh == 3:
-            self.h = h
-            self.f = f
-            self.i = i
-            self.d = d
-        else:
-            self.htemp = h
-            self.ftemp = f
-            self.itemp = i
-            self.dtemp = d
+    return xout, yout, zout
@@ -27,11 +27,15 @@
 import warnings
 import os
 import glob
+import gzip
 import copy
 import struct
+import threading
+import zlib
+from collections import OrderedDict
 from PyQt5 import QtWidgets, QtCore
 import numpy as np
-from osgeo import gdal, osr
+from osgeo import gdal, osr, gdal_array
 from pygmi.raster.datatypes import Data
 from pygmi.raster.dataprep import merge
 from pygmi.raster.dataprep import quickgrid
@@ -177,7 +181,7 @@ class ImportData():
                'PCI Geomatics Database File (*.pix);;'
                'GeoTiff (*.tif);;'
                'SAGA binary grid (*.sdat);;'
-               'Geosoft UNCOMPRESSED grid (*.grd);;'
+               'Geosoft grid (*.grd);;'
                'Geosoft (*.gxf);;'
                'Surfer grid (v.6) (*.grd);;'
                'GeoPak grid (*.grd);;'
@@ -198,8 +202,8 @@ class ImportData():
 
         if filt == 'GeoPak grid (*.grd)':
             dat = get_geopak(self.ifile)
-        elif filt == 'Geosoft UNCOMPRESSED grid (*.grd)':
-            dat = get_geosoft(self.ifile)
+        elif filt == 'Geosoft grid (*.grd)':
+            dat = get_geosoft(self.ifile, lazy=True)
         elif filt == 'hdf (*.hdf)':
             dat = get_hdf(self.ifile)
         elif filt == 'hdf (*.h5)':
@@ -230,15 +234,12 @@ class ImportData():
                                               'another format, such as '
                                               'geosoft.',
                                               QtWidgets.QMessageBox.Ok)
-            elif filt == 'Geosoft UNCOMPRESSED grid (*.grd)':
+            elif filt == 'Geosoft grid (*.grd)':
                 QtWidgets.QMessageBox.warning(self.parent, 'Error',
                                               'Could not import the grid. '
                                               'Please make sure it is a '
-                                              'Geosoft FLOAT grid, and not a '
-                                              'compressed grid. You can '
-                                              'export your grid to '
-                                              'this format using the Geosoft '
-                                              'Viewer.',
+                                              'Geosoft grid, and not a '
+                                              'colour grid.',
                                               QtWidgets.QMessageBox.Ok)
             elif filt == 'hdf (*.hdf)':
                 QtWidgets.QMessageBox.warning(self.parent, 'Error',
@@ -452,7 +453,189 @@ def get_ascii(ifile):
     return dat
 
 
-def get_raster(ifile, nval=None):
+class GDALBlockReader():
+    """
+    Read a raster band from disk on demand, one block at a time.
+
+    The GDAL dataset is kept open, and blocks are kept in a least recently
+    used cache so that neighbouring windows do not read the disk again.
+
+    Attributes
+    ----------
+    ifile : str
+        filename of the raster dataset
+    bandnum : int
+        band number, starting at 1
+    nval : float
+        No data/null value
+    lessequal : bool
+        mask all values less than or equal to nval, and not only equal to it
+    shape : tuple
+        (rows, columns) of the band
+    blocksize : tuple
+        (rows, columns) of a cached block
+    maxblocks : int
+        maximum number of blocks kept in the cache
+    """
+
+    def __init__(self, ifile, bandnum, nval, lessequal=False,
+                 blocksize=512, maxblocks=64):
+        self.ifile = ifile
+        self.bandnum = bandnum
+        self.nval = nval
+        self.lessequal = lessequal
+        self.maxblocks = maxblocks
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.dataset = None
+
+        band = self.get_band()
+        self.shape = (band.YSize, band.XSize)
+
+        # Use whole multiples of the native GDAL blocks.
+        bcols, brows = band.GetBlockSize()
+        brows = min(-(-blocksize//brows)*brows, self.shape[0])
+        bcols = min(-(-blocksize//bcols)*bcols, self.shape[1])
+        self.blocksize = (brows, bcols)
+
+    def __deepcopy__(self, memo):
+        # The data on disk does not change, so copies can share the reader.
+        return self
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['dataset'] = None
+        state['cache'] = OrderedDict()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def get_band(self):
+        """
+        Get the GDAL raster band, opening the dataset if needed.
+
+        Returns
+        -------
+        GDAL raster band
+            raster band to read from.
+
+        """
+        if self.dataset is None:
+            self.dataset = gdal.Open(self.ifile, gdal.GA_ReadOnly)
+        return self.dataset.GetRasterBand(self.bandnum)
+
+    def mask(self, data):
+        """
+        Mask invalid and null values in an array read from disk.
+
+        Parameters
+        ----------
+        data : numpy array
+            array read from disk.
+
+        Returns
+        -------
+        numpy masked array
+            masked array.
+
+        """
+        data = np.ma.masked_invalid(data)
+        if self.lessequal:
+            data.mask = (np.ma.getmaskarray(data) |
+                         (data.data <= self.nval))
+        else:
+            data.mask = np.ma.getmaskarray(data) | (data.data == self.nval)
+        return data
+
+    def read(self, row=0, col=0, rows=None, cols=None):
+        """
+        Read a window of the band.
+
+        Parameters
+        ----------
+        row : int, optional
+            first row of the window. The default is 0.
+        col : int, optional
+            first column of the window. The default is 0.
+        rows : int, optional
+            number of rows in the window. The default is None, which reads
+            to the last row.
+        cols : int, optional
+            number of columns in the window. The default is None, which reads
+            to the last column.
+
+        Returns
+        -------
+        numpy masked array
+            window of data.
+
+        """
+        if rows is None:
+            rows = self.shape[0]-row
+        if cols is None:
+            cols = self.shape[1]-col
+
+        # Large windows are read directly, bypassing the cache.
+        if rows*cols > self.maxblocks*self.blocksize[0]*self.blocksize[1]//4:
+            with self.lock:
+                data = self.get_band().ReadAsArray(col, row, cols, rows)
+            return self.mask(data)
+
+        brows, bcols = self.blocksize
+        out = None
+        for bi in range(row//brows, (row+rows-1)//brows+1):
+            for bj in range(col//bcols, (col+cols-1)//bcols+1):
+                block = self.get_block(bi, bj)
+                if out is None:
+                    out = np.ma.masked_all((rows, cols), block.dtype)
+                r0 = max(row, bi*brows)
+                r1 = min(row+rows, (bi+1)*brows)
+                c0 = max(col, bj*bcols)
+                c1 = min(col+cols, (bj+1)*bcols)
+                out[r0-row:r1-row, c0-col:c1-col] = \
+                    block[r0-bi*brows:r1-bi*brows, c0-bj*bcols:c1-bj*bcols]
+        return out
+
+    def get_block(self, bi, bj):
+        """
+        Get a block from the cache, reading it from disk if needed.
+
+        Parameters
+        ----------
+        bi : int
+            block row index.
+        bj : int
+            block column index.
+
+        Returns
+        -------
+        numpy masked array
+            block of data.
+
+        """
+        with self.lock:
+            if (bi, bj) in self.cache:
+                self.cache.move_to_end((bi, bj))
+                return self.cache[(bi, bj)]
+
+            brows, bcols = self.blocksize
+            row = bi*brows
+            col = bj*bcols
+            rows = min(brows, self.shape[0]-row)
+            cols = min(bcols, self.shape[1]-col)
+            block = self.mask(self.get_band().ReadAsArray(col, row,
+                                                          cols, rows))
+            self.cache[(bi, bj)] = block
+            if len(self.cache) > self.maxblocks:
+                self.cache.popitem(last=False)
+
+        return block
+
+
+def get_raster(ifile, nval=None, lazy=False, maskmode='masked'):
     """
     This function loads a raster dataset off the disk using the GDAL
     libraries. It returns the data in a PyGMI data object.
@@ -463,6 +646,13 @@ def get_raster(ifile, nval=None):
         filename to import
     nval : float, optional
         No data/null value. The default is None.
+    lazy : bool, optional
+        Leave the data on disk and read it in blocks when needed, using
+        GDALBlockReader. The default is False.
+    maskmode : str, optional
+        How null values are stored, 'masked', 'nan' or 'packed'. See Data
+        for details. This is ignored if lazy is True. The default is
+        'masked'.
 
     Returns
     -------
@@ -516,17 +706,38 @@ def get_raster(ifile, nval=None):
             nval = rtmp.GetNoDataValue()
 
         dat.append(Data())
-        dat[i].data = rtmp.ReadAsArray()
-        if dat[i].data.dtype.kind == 'i':
+        if lazy:
+            dkind = np.dtype(gdal_array.GDALTypeCodeToNumericTypeCode(
+                rtmp.DataType)).kind
+        else:
+            dat[i].data = rtmp.ReadAsArray()
+            dkind = dat[i].data.dtype.kind
+
+        if dkind == 'i':
             if nval is None:
                 nval = 999999
                 print('Adjusting null value to '+str(nval))
             nval = int(nval)
-        elif dat[i].data.dtype.kind == 'u':
+        elif dkind == 'u':
             if nval is None:
                 nval = 0
                 print('Adjusting null value to '+str(nval))
             nval = int(nval)
+        elif lazy:
+            if nval is None:
+                nval = 1e+20
+            nval = float(nval)
+            # GDAL leaves a band's own nodata value out of its statistics,
+            # so the check is only useful without one. Approximate values
+            # come from overviews or a sample, rather than a full read.
+            if rtmp.GetNoDataValue() is None:
+                dmin, dmax = rtmp.ComputeRasterMinMax(True)
+                if nval != dmin and np.isclose(dmin, nval):
+                    nval = dmin
+                    print('Adjusting null value to '+str(nval))
+                if nval != dmax and np.isclose(dmax, nval):
+                    nval = dmax
+                    print('Adjusting null value to '+str(nval))
         else:
             if nval is None:
                 nval = 1e+20
@@ -538,17 +749,32 @@ def get_raster(ifile, nval=None):
                 nval = dat[i].data.max()
                 print('Adjusting null value to '+str(nval))
 
-        if ext == 'ers' and nval == -1.0e+32:
-            dat[i].data[np.ma.less_equal(dat[i].data, nval)] = -1.0e+32
+        if lazy:
+            lessequal = (ext == 'ers' and nval == -1.0e+32)
+            dat[i].set_source(GDALBlockReader(ifile, i+1, nval, lessequal))
+        elif maskmode != 'masked':
+            values = dat[i].get_values()
+            if ext == 'ers' and nval == -1.0e+32:
+                mask = values <= nval
+            else:
+                mask = values == nval
+            if dkind == 'f':
+                mask |= ~np.isfinite(values)
+            dat[i].maskmode = maskmode
+            dat[i].set_values(values, mask)
+        else:
+            if ext == 'ers' and nval == -1.0e+32:
+                dat[i].data[np.ma.less_equal(dat[i].data, nval)] = -1.0e+32
 
 # Note that because the data is stored in a masked array, the array ends up
-# being double the size that it was on the disk.
-        dat[i].data = np.ma.masked_invalid(dat[i].data)
-        dat[i].data.mask = (np.ma.getmaskarray(dat[i].data) |
-                            (dat[i].data == nval))
-        if dat[i].data.mask.size == 1:
-            dat[i].data.mask = (np.ma.make_mask_none(dat[i].data.shape)
-                                + np.ma.getmaskarray(dat[i].data))
+# being double the size that it was on the disk. Use maskmode='nan' or
+# 'packed' to avoid this.
+            dat[i].data = np.ma.masked_invalid(dat[i].data)
+            dat[i].data.mask = (np.ma.getmaskarray(dat[i].data) |
+                                (dat[i].data == nval))
+            if dat[i].data.mask.size == 1:
+                dat[i].data.mask = (np.ma.make_mask_none(dat[i].data.shape)
+                                    + np.ma.getmaskarray(dat[i].data))
 
         dat[i].extent_from_gtr(gtr)
         if bandid == '':
@@ -1162,9 +1388,11 @@ class ExportData():
             return False
 
         ext = ('GeoTiff (*.tif);;'
+               'GeoTiff, cloud optimised (*.tif);;'
                'ENVI (*.hdr);;'
                'ERMapper (*.ers);;'
                'Geosoft (*.gxf);;'
+               'Geosoft grid (*.grd);;'
                'ERDAS Imagine (*.img);;'
                'SAGA binary grid (*.sdat);;'
                'Surfer grid (v.6) (*.grd);;'
@@ -1191,6 +1419,8 @@ class ExportData():
             self.export_ascii_xyz(data)
         if filt == 'Geosoft (*.gxf)':
             self.export_gxf(data)
+        if filt == 'Geosoft grid (*.grd)':
+            self.export_geosoft(data)
         if filt == 'Surfer grid (v.6) (*.grd)':
             self.export_surfer(data)
 #            self.export_gdal(data, 'GSBG')
@@ -1202,6 +1432,9 @@ class ExportData():
             export_gdal(self.ifile, data, 'SAGA')
         if filt == 'GeoTiff (*.tif)':
             export_gdal(self.ifile, data, 'GTiff')
+        if filt == 'GeoTiff, cloud optimised (*.tif)':
+            export_gdal(self.ifile, data, 'GTiff', compress='DEFLATE',
+                        predictor=True, cog=True)
         if filt == 'ENVI (*.hdr)':
             export_gdal(self.ifile, data, 'ENVI')
         if filt == 'ArcGIS BIL (*.bil)':
@@ -1278,6 +1511,30 @@ class ExportData():
 
             fno.close()
 
+    def export_geosoft(self, data):
+        """
+        Export a Geosoft grid
+
+        Parameters
+        ----------
+        data : PyGMI raster Data
+            dataset to export
+
+        Returns
+        -------
+        None.
+
+        """
+        if len(data) > 1:
+            print('Band names will be appended to the output filenames since '
+                  'you have a multiple band image')
+
+        file_out = self.ifile.rpartition('.')[0] + '.grd'
+        for k in data:
+            if len(data) > 1:
+                file_out = self.get_filename(k, 'grd')
+            export_geosoft(file_out, k)
+
     def export_surfer(self, data):
         """
         Export a surfer binary grid
@@ -1344,29 +1601,7 @@ class ExportData():
         for k in data:
             if len(data) > 1:
                 file_out = self.get_filename(k, 'asc')
-            fno = open(file_out, 'w')
-
-            extent = k.extent
-            xmin = extent[0]
-            ymin = extent[2]
-            krows, kcols = k.data.shape
-
-            fno.write('ncols \t\t\t' + str(kcols))
-            fno.write('\nnrows \t\t\t' + str(krows))
-            fno.write('\nxllcorner \t\t\t' + str(xmin))
-            fno.write('\nyllcorner \t\t\t' + str(ymin))
-            fno.write('\ncellsize \t\t\t' + str(k.xdim))
-            fno.write('\nnodata_value \t\t' + str(k.nullvalue))
-
-            tmp = k.data.filled(k.nullvalue)
-            krows, kcols = k.data.shape
-
-            for j in range(krows):
-                fno.write('\n')
-                for i in range(kcols):
-                    fno.write(str(tmp[j, i]) + ' ')
-
-            fno.close()
+            export_ascii(file_out, k)
 
     def export_ascii_xyz(self, data):
         """
@@ -1390,20 +1625,7 @@ class ExportData():
         for k in data:
             if len(data) > 1:
                 file_out = self.get_filename(k, 'xyz')
-            fno = open(file_out, 'w')
-
-            tmp = k.data.filled(k.nullvalue)
-
-            xmin = k.extent[0]
-            ymax = k.extent[-1]
-            krows, kcols = k.data.shape
-
-            for j in range(krows):
-                for i in range(kcols):
-                    fno.write(str(xmin+i*k.xdim) + ' ' +
-                              str(ymax-j*k.ydim) + ' ' +
-                              str(tmp[j, i]) + '\n')
-            fno.close()
+            export_xyz(file_out, k)
 
     def get_filename(self, data, ext):
         """
@@ -1547,86 +1769,251 @@ def get_geopak(hfile):
     return dat
 
 
-def get_geosoft(hfile):
+# Geosoft grid header, 512 bytes little endian.
+_GRD_HEADER = np.dtype([('es', '<i4'), ('sf', '<i4'), ('ncols', '<i4'),
+                        ('nrows', '<i4'), ('kx', '<i4'), ('dx', '<f8'),
+                        ('dy', '<f8'), ('x0', '<f8'), ('y0', '<f8'),
+                        ('rot', '<f8'), ('zbase', '<f8'), ('zmult', '<f8'),
+                        ('label', 'S48'), ('mapno', 'S16'), ('proj', '<i4'),
+                        ('unitx', '<i4'), ('unity', '<i4'),
+                        ('unitz', '<i4'), ('nvpts', '<i4'),
+                        ('izmin', '<i4'), ('izmax', '<i4'),
+                        ('izmed', '<i4'), ('izmea', '<i4'), ('zvar', '<f8'),
+                        ('prcs', '<i4'), ('temspc', 'S324')])
+
+# Geosoft dummy values, keyed by (element size, sign flag).
+_GRD_DUMMIES = {(1, 0): 255, (1, 1): -127, (2, 0): 65535, (2, 1): -32767,
+                (4, 0): 4294967295, (4, 1): -2147483647, (4, 2): -1.0E+32,
+                (8, 1): -9223372036854775807, (8, 2): -1.0E+32}
+
+
+class GeosoftBlockReader():
+    """
+    Read a Geosoft grid from disk on demand.
+
+    Uncompressed grids are read through a memory map. Compressed grids are
+    decompressed one block of rows at a time, and the blocks are kept in a
+    least recently used cache.
+
+    Attributes
+    ----------
+    ifile : str
+        filename of the Geosoft grid
+    header : numpy record
+        grid header
+    nval : float
+        No data/null value, as stored in the file
+    compressed : bool
+        True if the grid is compressed
+    shape : tuple
+        (rows, columns) of the grid
+    maxblocks : int
+        maximum number of decompressed blocks kept in the cache
+    """
+
+    def __init__(self, ifile, maxblocks=16):
+        self.ifile = ifile
+        self.maxblocks = maxblocks
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.memmap = None
+
+        self.header = np.fromfile(ifile, dtype=_GRD_HEADER, count=1)[0]
+        esize = int(self.header['es'])
+        sflag = int(self.header['sf'])
+
+        self.compressed = esize > 1024
+        esize = esize % 1024
+        if (esize, sflag) not in _GRD_DUMMIES:
+            raise ValueError('Unsupported Geosoft grid type.')
+
+        self.dtype = np.dtype('<'+'uif'[sflag]+str(esize))
+        self.nval = _GRD_DUMMIES[(esize, sflag)]
+
+        # Vectors are rows if kx is 1, and columns otherwise.
+        nelem = int(self.header['ncols'])
+        nvec = int(self.header['nrows'])
+        self.transpose = (self.header['kx'] != 1)
+        self.vshape = (nvec, nelem)
+        if self.transpose:
+            self.shape = (nelem, nvec)
+        else:
+            self.shape = (nvec, nelem)
+
+        if self.compressed:
+            with open(ifile, 'rb') as fno:
+                fno.seek(512)
+                _, nblocks, self.vpb = np.fromfile(fno, '<i4', 3)
+                self.offsets = np.fromfile(fno, '<i8', nblocks)
+                self.sizes = np.fromfile(fno, '<i4', nblocks)
+
+    def __deepcopy__(self, memo):
+        # The data on disk does not change, so copies can share the reader.
+        return self
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['memmap'] = None
+        state['cache'] = OrderedDict()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def get_vectors(self, vec0, vec1):
+        """
+        Get raw vectors, as stored in the file.
+
+        Parameters
+        ----------
+        vec0 : int
+            first vector.
+        vec1 : int
+            vector after the last one.
+
+        Returns
+        -------
+        numpy array
+            vectors from vec0 to vec1.
+
+        """
+        if not self.compressed:
+            if self.memmap is None:
+                self.memmap = np.memmap(self.ifile, dtype=self.dtype,
+                                        mode='r', offset=512,
+                                        shape=self.vshape)
+            return self.memmap[vec0:vec1]
+
+        blocks = [self.get_block(i) for i in range(vec0//self.vpb,
+                                                   (vec1-1)//self.vpb+1)]
+        start = vec0 - (vec0//self.vpb)*self.vpb
+        return np.concatenate(blocks)[start:start+vec1-vec0]
+
+    def get_block(self, bnum):
+        """
+        Get a decompressed block from the cache, decompressing it if needed.
+
+        Parameters
+        ----------
+        bnum : int
+            block number.
+
+        Returns
+        -------
+        numpy array
+            vectors in the block.
+
+        """
+        with self.lock:
+            if bnum in self.cache:
+                self.cache.move_to_end(bnum)
+                return self.cache[bnum]
+
+            with open(self.ifile, 'rb') as fno:
+                fno.seek(self.offsets[bnum])
+                tmp = fno.read(self.sizes[bnum])
+
+            # Each block starts with a 16 byte block header.
+            block = np.frombuffer(zlib.decompress(tmp[16:]), self.dtype)
+            block = block.reshape((-1, self.vshape[1]))
+
+            self.cache[bnum] = block
+            if len(self.cache) > self.maxblocks:
+                self.cache.popitem(last=False)
+
+        return block
+
+    def read(self, row=0, col=0, rows=None, cols=None):
+        """
+        Read a window of the grid.
+
+        Parameters
+        ----------
+        row : int, optional
+            first row of the window. The default is 0.
+        col : int, optional
+            first column of the window. The default is 0.
+        rows : int, optional
+            number of rows in the window. The default is None, which reads
+            to the last row.
+        cols : int, optional
+            number of columns in the window. The default is None, which reads
+            to the last column.
+
+        Returns
+        -------
+        numpy masked array
+            window of data.
+
+        """
+        if rows is None:
+            rows = self.shape[0]-row
+        if cols is None:
+            cols = self.shape[1]-col
+
+        # Rows are stored from the bottom of the grid up.
+        nrows = self.shape[0]
+        if self.transpose:
+            data = self.get_vectors(col, col+cols)
+            data = data[:, nrows-row-rows:nrows-row].T
+        else:
+            data = self.get_vectors(nrows-row-rows, nrows-row)
+            data = data[:, col:col+cols]
+        data = data[::-1]
+
+        mask = (data == self.nval)
+        data = data/self.header['zmult'] + self.header['zbase']
+
+        return np.ma.array(data, mask=mask)
+
+
+def get_geosoft(hfile, lazy=False):
     """
     Get geosoft file
 
+    Both uncompressed and compressed grids are supported.
+
     Parameters
     ----------
     ifile : str
         filename to import
+    lazy : bool, optional
+        Leave the data on disk and read it when needed, using
+        GeosoftBlockReader. The default is False.
 
     Returns
     -------
     dat : PyGMI Data
         Dataset imported
     """
-    f = open(hfile, mode='rb')
-
-    es = np.fromfile(f, dtype=np.int32, count=1)[0]  # 4
-    sf = np.fromfile(f, dtype=np.int32, count=1)[0]  # signf
-    ncols = np.fromfile(f, dtype=np.int32, count=1)[0]  # ncol
-    nrows = np.fromfile(f, dtype=np.int32, count=1)[0]  # nrow
-    kx = np.fromfile(f, dtype=np.int32, count=1)[0]  # 1
-
-    dx = np.fromfile(f, dtype=np.float64, count=1)[0]  # dx
-    dy = np.fromfile(f, dtype=np.float64, count=1)[0]  # dy
-    x0 = np.fromfile(f, dtype=np.float64, count=1)[0]  # xllcor
-    y0 = np.fromfile(f, dtype=np.float64, count=1)[0]  # yllcor
-    rot = np.fromfile(f, dtype=np.float64, count=1)[0]  # rot
-    zbase = np.fromfile(f, dtype=np.float64, count=1)[0]  # zbase
-    zmult = np.fromfile(f, dtype=np.float64, count=1)[0]  # zmult
-
-    label = np.fromfile(f, dtype='a48', count=1)[0]
-    mapno = np.fromfile(f, dtype='a16', count=1)[0]
-
-    proj = np.fromfile(f, dtype=np.int32, count=1)[0]
-    unitx = np.fromfile(f, dtype=np.int32, count=1)[0]
-    unity = np.fromfile(f, dtype=np.int32, count=1)[0]
-    unitz = np.fromfile(f, dtype=np.int32, count=1)[0]
-    nvpts = np.fromfile(f, dtype=np.int32, count=1)[0]
-    izmin = np.fromfile(f, dtype=np.int32, count=1)[0]
-    izmax = np.fromfile(f, dtype=np.int32, count=1)[0]
-    izmed = np.fromfile(f, dtype=np.int32, count=1)[0]
-    izmea = np.fromfile(f, dtype=np.int32, count=1)[0]
-
-    zvar = np.fromfile(f, dtype=np.float64, count=1)[0]
-
-    prcs = np.fromfile(f, dtype=np.int32, count=1)[0]
-
-    temspc = np.fromfile(f, dtype='a324', count=1)[0]
-
-    if es == 2:
-        nval = -32767
-        data = np.fromfile(f, dtype=np.int16, count=nrows*ncols)
-
-    elif es == 4:
-        data = np.fromfile(f, dtype=np.float32, count=nrows*ncols)
-        nval = -1.0E+32
-    else:
+    try:
+        source = GeosoftBlockReader(hfile)
+    except ValueError:
         return None
 
-    data = np.ma.masked_equal(data, nval)
-
-    data = data/zmult + zbase
-    data.shape = (nrows, ncols)
-    data = data[::-1]
-
-    f.close()
+    header = source.header
+    nrows, ncols = source.shape
+    dx = float(header['dx'])
+    dy = float(header['dy'])
 
     dat = []
     dat.append(Data())
     i = 0
 
-    dat[i].data = data
+    if lazy:
+        dat[i].set_source(source)
+    else:
+        dat[i].data = source.read()
     dat[i].dataid = hfile[:-4]
-    dat[i].nullvalue = nval
+    dat[i].nullvalue = source.nval
     dat[i].xdim = dx
     dat[i].ydim = dy
 
-    xmin = x0
-    ymax = y0 + dy*nrows
-    ymin = y0
+    xmin = float(header['x0'])
+    ymin = float(header['y0'])
+    ymax = ymin + dy*nrows
     xmax = xmin + ncols*dx
 
     dat[i].extent = [xmin, xmax, ymin, ymax]
@@ -1634,16 +2021,89 @@ def get_geosoft(hfile):
     return dat
 
 
-def export_gdal(ifile, dat, drv):
+def export_geosoft(ofile, data, blockrows=256):
+    """
+    Export to an uncompressed Geosoft float grid.
+
+    The grid is written through a memory map, one strip of rows at a time,
+    so large grids never need to be held in memory.
+
+    Parameters
+    ----------
+    ofile : str
+        output file name.
+    data : PyGMI raster Data
+        dataset to export.
+    blockrows : int, optional
+        number of rows written at a time. The default is 256.
+
+    Returns
+    -------
+    None.
+
+    """
+    rows, cols = data.shape
+    nval = _GRD_DUMMIES[(4, 2)]
+
+    header = np.zeros(1, dtype=_GRD_HEADER)
+    header['es'] = 4
+    header['sf'] = 2
+    header['ncols'] = cols
+    header['nrows'] = rows
+    header['kx'] = 1
+    header['dx'] = data.xdim
+    header['dy'] = data.ydim
+    header['x0'] = data.extent[0]
+    header['y0'] = data.extent[2]
+    header['zmult'] = 1.
+    header['label'] = data.dataid.encode('ascii', 'replace')[:48]
+    with open(ofile, 'wb') as fno:
+        header.tofile(fno)
+        fno.truncate(512 + rows*cols*4)
+
+    grid = np.memmap(ofile, dtype='<f4', mode='r+', offset=512,
+                     shape=(rows, cols))
+
+    # Rows are stored from the bottom of the grid up.
+    for row, strip in data.blocks(blockrows):
+        grid[rows-row-strip.shape[0]:rows-row] = strip.filled(nval)[::-1]
+
+    grid.flush()
+    del grid
+
+
+def export_gdal(ifile, dat, drv, compress=None, predictor=False,
+                tiled=False, cog=False, overviews=False, blocksize=256):
      """
      Export to GDAL format
 
+     The data is written one strip of rows at a time, for all bands, so
+     only one row of tiles is held in memory. GeoTIFFs can be tiled,
+     compressed with multiple threads, given internal overviews or written
+     as cloud optimised GeoTIFFs (COG).
+
      Parameters
      ----------
      dat : PyGMI raster Data
          dataset to export
      drv : str
          name of the GDAL driver to use
+     compress : str, optional
+         GeoTIFF compression, e.g. 'DEFLATE', 'ZSTD', 'LZW' or 'LERC'. The
+         default is None, which means no compression.
+     predictor : bool, optional
+         Use a horizontal (integer) or floating point predictor with the
+         compression. The default is False.
+     tiled : bool, optional
+         Write a tiled GeoTIFF. Compressed GeoTIFFs are always tiled. The
+         default is False.
+     cog : bool, optional
+         Write a cloud optimised GeoTIFF, with overviews. The default is
+         False.
+     overviews : bool, optional
+         Add internal overviews to a GeoTIFF. The default is False.
+     blocksize : int, optional
+         Tile size of a tiled GeoTIFF. The default is 256.
 
      Returns
      -------
@@ -1654,7 +2114,7 @@ def export_gdal(ifile, dat, drv):
      data = merge(dat)
 
      driver = gdal.GetDriverByName(drv)
-     dtype = data[0].data.dtype
+     dtype = data[0].get_window(0, 0, 1, 1).dtype
 
      if dtype == np.uint8:
          fmt = gdal.GDT_Byte
@@ -1684,13 +2144,31 @@ def export_gdal(ifile, dat, drv):
      else:  # ENVI and ER Mapper
          tmpfile = tmp[0]
 
-     drows, dcols = data[0].data.shape
+     copts = []
+     if compress is not None:
+         copts = ['COMPRESS='+compress, 'NUM_THREADS=ALL_CPUS']
+         if predictor and 'LERC' not in compress:
+             copts.append('PREDICTOR=' + ('3' if np.dtype(dtype).kind == 'f'
+                                         else '2'))
+
+     drows, dcols = data[0].shape
+     blockrows = 256
      if drv == 'GTiff':
+         if cog:
+             cogfile = tmpfile
+             tmpfile = tmp[0] + '_tmp.tif'
+         options = ['TFW=YES', 'PROFILE=GeoTIFF', 'ESRI_XML_PAM=True',
+                    'BIGTIFF=IF_SAFER']
+         if compress is None or cog:
+             options.append('COMPRESS=NONE')
+         else:
+             options += copts
+         if tiled or compress is not None or cog:
+             options += ['TILED=YES', 'BLOCKXSIZE='+str(blocksize),
+                         'BLOCKYSIZE='+str(blocksize)]
+             blockrows = blocksize
          out = driver.Create(tmpfile, int(dcols), int(drows),
-                             len(data), fmt, options=['COMPRESS=NONE',
-                                                      'TFW=YES',
-                                                      'PROFILE=GeoTIFF',
-                                                      'ESRI_XML_PAM=True'])
+                             len(data), fmt, options=options)
      elif drv == 'ERS' and 'Cape / TM' in data[0].wkt:
          tmp = data[0].wkt.split('TM')[1][:2]
          out = driver.Create(tmpfile, int(dcols), int(drows),
@@ -1710,24 +2188,245 @@ def export_gdal(ifile, dat, drv):
 
      out.SetProjection(data[0].wkt)
 
+     # Write a strip of all bands at a time, so that data still on disk is
+     # never read whole, and only one row of tiles is cached for writing.
+     blocks = [datai.blocks(blockrows) for datai in data]
+     for strips in zip(*blocks):
+         for i, (row, dtmp) in enumerate(strips):
+             dtmp = np.ma.array(dtmp).astype(dtype)
+
+             dtmp.set_fill_value(data[i].nullvalue)
+             dtmp = dtmp.filled()
+             out.GetRasterBand(i+1).WriteArray(dtmp, 0, row)
+
      for i, datai in enumerate(data):
          rtmp = out.GetRasterBand(i+1)
          rtmp.SetDescription(datai.dataid)
          rtmp.SetMetadataItem('BandName', datai.dataid)
 
-         dtmp = np.ma.array(datai.data).astype(dtype)
-
-         dtmp.set_fill_value(datai.nullvalue)
-         dtmp = dtmp.filled()
-
          if dtype == np.uint8:
              datai.nullvalue = int(datai.nullvalue)
 
          rtmp.SetNoDataValue(datai.nullvalue)
-         rtmp.WriteArray(dtmp)
          rtmp.GetStatistics(False, True)
 
+     if drv == 'GTiff' and overviews and not cog:
+         levels = _overview_levels(drows, dcols, blocksize)
+         if levels:
+             out.BuildOverviews('AVERAGE', levels)
+
      out = None  # Close File
      if drv == 'ENVI':
          with open(tmpfile+'.hdr', 'a') as myfile:
              myfile.write('data ignore value = ' + str(data[0].nullvalue))
+
+     if drv == 'GTiff' and cog:
+         if compress is None:
+             copts = ['COMPRESS=NONE']
+         copts += ['BLOCKSIZE='+str(blocksize), 'OVERVIEWS=AUTO',
+                   'OVERVIEW_RESAMPLING=AVERAGE', 'BIGTIFF=IF_SAFER']
+         gdal.Translate(cogfile, tmpfile, format='COG',
+                        creationOptions=copts)
+         gdal.GetDriverByName('GTiff').Delete(tmpfile)
+
+
+def _overview_levels(rows, cols, blocksize=256):
+    """
+    Get overview levels down to about the size of one tile.
+
+    Parameters
+    ----------
+    rows : int
+        number of rows.
+    cols : int
+        number of columns.
+    blocksize : int, optional
+        tile size. The default is 256.
+
+    Returns
+    -------
+    levels : list
+        overview decimation factors.
+
+    """
+    levels = []
+    factor = 2
+    while max(rows, cols)/factor >= blocksize/2:
+        levels.append(factor)
+        factor *= 2
+    return levels
+
+
+def export_ascii(ofile, data, nodata=None, fmt=None, blockrows=256,
+                 compress=False):
+    """
+    Export to an ArcInfo ASCII grid.
+
+    Rows are formatted a block at a time, so large grids are written
+    quickly and without holding the whole grid as text.
+
+    Parameters
+    ----------
+    ofile : str
+        output file name.
+    data : PyGMI raster Data
+        dataset to export.
+    nodata : float, optional
+        value written for nulls. The default is None, which uses the
+        dataset's null value.
+    fmt : str, optional
+        printf style format for the values. The default is None, which
+        writes floats with the fewest digits that read back exactly.
+    blockrows : int, optional
+        number of rows formatted at a time. The default is 256.
+    compress : bool, optional
+        write a gzip compressed file. The default is False.
+
+    Returns
+    -------
+    None.
+
+    """
+    if nodata is None:
+        nodata = data.nullvalue
+    if fmt is None:
+        fmt = _ascii_format(data, nodata)
+
+    xmin, _, ymin, _ = data.extent
+    krows, kcols = data.shape
+    line = ' '.join([fmt]*kcols)+'\n'
+
+    with _open_ascii(ofile, compress) as fno:
+        fno.write('ncols \t\t\t' + str(kcols))
+        fno.write('\nnrows \t\t\t' + str(krows))
+        fno.write('\nxllcorner \t\t\t' + str(xmin))
+        fno.write('\nyllcorner \t\t\t' + str(ymin))
+        fno.write('\ncellsize \t\t\t' + str(data.xdim))
+        fno.write('\nnodata_value \t\t' + str(nodata) + '\n')
+
+        for _, strip in data.blocks(blockrows):
+            tmp = _ascii_values(strip.filled(nodata), fmt)
+            fno.write((line*tmp.shape[0]) % tuple(tmp.ravel().tolist()))
+
+
+def export_xyz(ofile, data, nodata=None, fmt=None, blockrows=256,
+               compress=False):
+    """
+    Export to an ASCII XYZ file.
+
+    Each line holds the x and y coordinates and value of a cell. Rows are
+    formatted a block at a time, so large grids are written quickly and
+    without holding the whole grid as text.
+
+    Parameters
+    ----------
+    ofile : str
+        output file name.
+    data : PyGMI raster Data
+        dataset to export.
+    nodata : float, optional
+        value written for nulls. The default is None, which uses the
+        dataset's null value.
+    fmt : str, optional
+        printf style format for the values. The default is None, which
+        writes floats with the fewest digits that read back exactly.
+    blockrows : int, optional
+        number of rows formatted at a time. The default is 256.
+    compress : bool, optional
+        write a gzip compressed file. The default is False.
+
+    Returns
+    -------
+    None.
+
+    """
+    if nodata is None:
+        nodata = data.nullvalue
+    if fmt is None:
+        fmt = _ascii_format(data, nodata)
+
+    xmin = data.extent[0]
+    ymax = data.extent[-1]
+    krows, kcols = data.shape
+    xcoords = (xmin + np.arange(kcols)*data.xdim).astype(str)
+    line = '%s %s ' + fmt + '\n'
+
+    with _open_ascii(ofile, compress) as fno:
+        for row, strip in data.blocks(blockrows):
+            nrows = strip.shape[0]
+            ycoords = ymax - (row + np.arange(nrows)[:, None])*data.ydim
+            xyz = np.empty((nrows, kcols, 3), dtype=object)
+            xyz[:, :, 0] = xcoords
+            xyz[:, :, 1] = ycoords.astype(str)
+            xyz[:, :, 2] = _ascii_values(strip.filled(nodata), fmt)
+            fno.write((line*nrows*kcols) % tuple(xyz.ravel().tolist()))
+
+
+def _ascii_format(data, nodata):
+    """
+    Get a printf style format which writes values without loss.
+
+    Parameters
+    ----------
+    data : PyGMI raster Data
+        dataset to export.
+    nodata : float
+        value written for nulls.
+
+    Returns
+    -------
+    str
+        format string.
+
+    """
+    dtype = data.get_window(0, 0, 1, 1).dtype
+    if dtype.kind in 'iu' and float(nodata).is_integer():
+        return '%d'
+    return '%s'
+
+
+def _ascii_values(values, fmt):
+    """
+    Get values ready for printf style formatting.
+
+    With the '%s' format, floats are converted to the shortest strings which
+    read back to the same value, for their own precision.
+
+    Parameters
+    ----------
+    values : numpy array
+        values to write.
+    fmt : str
+        printf style format for the values.
+
+    Returns
+    -------
+    numpy array
+        values, or their strings.
+
+    """
+    if fmt == '%s' and values.dtype.kind == 'f':
+        return values.astype(str)
+    return values
+
+
+def _open_ascii(ofile, compress=False):
+    """
+    Open a text file for writing, optionally gzip compressed.
+
+    Parameters
+    ----------
+    ofile : str
+        output file name.
+    compress : bool, optional
+        gzip compress the file. The default is False.
+
+    Returns
+    -------
+    file object
+        text file object.
+
+    """
+    if compress:
+        return gzip.open(ofile, 'wt')
+    return open(ofile, 'w')
@@ -113,32 +113,39 @@ class Normalisation(QtWidgets.QDialog):
 
         data = copy.deepcopy(self.indata['Raster'])
         transform = np.zeros((2, 2))
+        # Statistics come from each copy as it is transformed. The copies
+        # keep any aliasing in the input list, and setting data clears the
+        # cached statistics, so a repeated dataset is left unchanged.
         if self.radiobutton_interval.isChecked():
             for i in data:
-                tmp1 = i.data.min()
-                tmp2 = i.data.max() - i.data.min()
+                stats = i.get_stats()
+                tmp1 = stats['min']
+                tmp2 = stats['max'] - stats['min']
                 tmp3 = 'minmax'
                 i, transform = datacommon(i, tmp1, tmp2, tmp3)
         elif self.radiobutton_mean.isChecked():
             for i in data:
-                tmp1 = i.data.mean()
-                tmp2 = i.data.std()
+                stats = i.get_stats()
+                tmp1 = stats['mean']
+                tmp2 = stats['std']
                 tmp3 = 'meanstd'
                 i, transform = datacommon(i, tmp1, tmp2, tmp3)
         elif self.radiobutton_median.isChecked():
             for i in data:
-                tmp1 = np.median(i.data.compressed())
-                tmp2 = np.median(abs(i.data.compressed() - tmp1))
+                stats = i.get_stats()
+                tmp1 = stats['median']
+                tmp2 = stats['mad']
                 tmp3 = 'medmad'
                 i, transform = datacommon(i, tmp1, tmp2, tmp3)
         elif self.radiobutton_8bit.isChecked():
             for i in data:
-                i.data = histeq(i.data)
+                i.data = histeq(i.data, hist=i.get_histogram(32768))
                 i.data = 255*(i.data/i.data.ptp())
 
         # Correct the null value
         for i in data:
             i.data.data[i.data.mask] = i.nullvalue
+            i.clear_cache()
 
         self.outdata['Raster'] = data
         if self.pbar is not None:
@@ -24,9 +24,9 @@
 # -----------------------------------------------------------------------------
 """This is a routine which displays a table graphically with various stats."""
 
+from concurrent.futures import ThreadPoolExecutor
 from PyQt5 import QtWidgets
 import numpy as np
-import scipy.stats.mstats as st
 
 
 class BasicStats(QtWidgets.QDialog):
@@ -157,21 +157,25 @@ def basicstats_calc(data):
     """
 # Minimum, maximum, mean, std dev, median, median abs deviation
 # no samples, no samples in x dir, no samples in y dir, band
+    # Each band is read once, in blocks, and the bands are run in parallel.
+    with ThreadPoolExecutor() as pool:
+        allstats = list(pool.map(lambda i: i.get_stats(), data))
+
     stats = []
-    for i in data:
+    for i, dstats in zip(data, allstats):
         srow = []
-        dtmp = i.data.compressed()
-        srow.append(dtmp.min())
-        srow.append(dtmp.max())
-        srow.append(dtmp.mean())
-        srow.append(dtmp.std())
-        srow.append(np.median(dtmp))
-        srow.append(np.median(abs(dtmp - srow[-1])))
-        srow.append(i.data.size)
-        srow.append(i.data.shape[1])
-        srow.append(i.data.shape[0])
-        srow.append(st.skew(dtmp))
-        srow.append(st.kurtosis(dtmp))
+        rows, cols = i.shape
+        srow.append(dstats['min'])
+        srow.append(dstats['max'])
+        srow.append(dstats['mean'])
+        srow.append(dstats['std'])
+        srow.append(dstats['median'])
+        srow.append(dstats['mad'])
+        srow.append(rows*cols)
+        srow.append(cols)
+        srow.append(rows)
+        srow.append(dstats['skew'])
+        srow.append(dstats['kurtosis'])
         srow = np.array(srow).tolist()
         stats.append([i.dataid] + srow)
 
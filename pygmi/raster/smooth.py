@@ -29,6 +29,7 @@ import warnings
 from PyQt5 import QtWidgets
 import numpy as np
 import scipy.signal as ssig
+from numba import jit, prange, get_num_threads
 import pygmi.menu_default as menu_default
 
 
@@ -306,8 +307,8 @@ class Smooth(QtWidgets.QDialog):
         ----------
         dat : numpy array.
             Data for a PyGMI raster dataset.
-        fmat : TYPE
-            DESCRIPTION.
+        fmat : numpy array
+            Filter matrix, or footprint for the median filter.
         itype : str
             Filter type. Can be '2D Mean' or '2D Median'.
         title : str
@@ -323,35 +324,15 @@ class Smooth(QtWidgets.QDialog):
 
         rowf = fmat.shape[0]
         colf = fmat.shape[1]
-        rowd = dat.shape[0]
-        cold = dat.shape[1]
-        drr = round(rowf/2.0)
-        dcc = round(colf/2.0)
 
-        dummy = np.zeros((rowd+rowf-1, cold+colf-1))*np.nan
-        dummy[drr-1:drr-1+rowd, dcc-1:dcc-1+cold] = dat
-        dummy = np.ma.masked_invalid(dummy)
-        dummy.mask[drr-1:drr-1+rowd, dcc-1:dcc-1+cold] = dat.mask
-
-        dummy.data[dummy.mask] = np.nan
         dat.data[dat.mask] = np.nan
 
         if itype == '2D Mean':
-            out = ssig.correlate(dat, fmat, 'same', method='direct')
+            out = masked_correlate2d(dat, fmat)
 
         elif itype == '2D Median':
             print('Calculating Median...')
-            out = np.ma.zeros([rowd, cold])*np.nan
-            out.mask = np.ma.getmaskarray(dat)
-            fmat = fmat.astype(bool)
-            dummy = dummy.data
-
-            for i in self.piter(range(rowd)):
-#                print(title+' Progress: ' + str(round(100*i/rowd))+'%', True)
-                for j in range(cold):
-                    tmp1 = dummy[i:i+rowf, j:j+colf][fmat]
-                    if np.isnan(tmp1).min() == False:
-                        out[i, j] = np.nanmedian(tmp1)
+            out = median2d(dat, fmat, self.piter)
 
         out = np.ma.masked_invalid(out)
         out.shape = out.shape[0:2]
@@ -362,6 +343,338 @@ class Smooth(QtWidgets.QDialog):
         return out
 
 
+def correlate2d(data, fmat, mode='same'):
+    """
+    2D correlation with automatic choice of method.
+
+    Separable filters, such as box and gaussian filters, are applied as two
+    1D passes. Otherwise scipy chooses between FFT and direct correlation,
+    depending on the filter and data sizes. Values outside the data are
+    taken as zero.
+
+    Parameters
+    ----------
+    data : numpy array
+        Input data. Must not contain NaN values.
+    fmat : numpy array
+        Filter matrix.
+    mode : str, optional
+        Output size, as used by scipy.signal.correlate. The default is
+        'same'.
+
+    Returns
+    -------
+    out : numpy array
+        Filtered data.
+
+    """
+    data = np.asarray(data, dtype=np.float64)
+    fmat = np.asarray(fmat, dtype=np.float64)
+
+    fsum = fmat.sum()
+    if min(fmat.shape) > 1 and fsum != 0:
+        fcol = fmat.sum(1)
+        frow = fmat.sum(0)/fsum
+        if np.allclose(np.outer(fcol, frow), fmat, rtol=1e-10, atol=0):
+            out = _correlate(data, fcol[:, np.newaxis], mode)
+            return _correlate(out, frow[np.newaxis, :], mode)
+
+    return _correlate(data, fmat, mode)
+
+
+def _correlate(data, fmat, mode):
+    """
+    Correlate using the faster of the FFT and direct methods.
+
+    Parameters
+    ----------
+    data : numpy array
+        Input data.
+    fmat : numpy array
+        Filter matrix.
+    mode : str
+        Output size, as used by scipy.signal.correlate.
+
+    Returns
+    -------
+    numpy array
+        Filtered data.
+
+    """
+    method = ssig.choose_conv_method(data, fmat, mode)
+    return ssig.correlate(data, fmat, mode, method=method)
+
+
+def masked_correlate2d(dat, fmat):
+    """
+    2D correlation of masked data, using normalised convolution.
+
+    Masked and NaN values are given zero weight, and the result in each
+    window is rescaled by the filter weight of the valid values. Masked
+    values remain masked, and windows with no valid values are NaN.
+
+    Parameters
+    ----------
+    dat : numpy masked array
+        Input data.
+    fmat : numpy array
+        Filter matrix.
+
+    Returns
+    -------
+    out : numpy array
+        Filtered data.
+
+    """
+    mask = np.ma.getmaskarray(dat) | np.isnan(np.ma.getdata(dat))
+    out = correlate2d(np.where(mask, 0., np.ma.getdata(dat)), fmat)
+
+    fsum = fmat.sum()
+    if not mask.any() or fsum == 0:
+        return out
+
+    wsum = fsum - correlate2d(mask, fmat)
+    empty = np.abs(wsum) < 1e-10*abs(fsum)
+    wsum[empty] = fsum
+    out = out*(fsum/wsum)
+    out[empty | mask] = np.nan
+
+    return out
+
+
+def median2d(dat, fmat, piter=iter):
+    """
+    Moving window median filter.
+
+    Masked and NaN values are ignored. The window is defined by an arbitrary
+    footprint, and the median of each window is found from a running
+    cumulative histogram of value ranks, so that the cost of moving the window
+    depends on the footprint outline rather than its area. Rows are processed
+    in strips, in parallel.
+
+    Parameters
+    ----------
+    dat : numpy masked array
+        Input data.
+    fmat : numpy array
+        Filter footprint. Non-zero entries are part of the window.
+    piter : function, optional
+        Progress bar iterable. Default is iter.
+
+    Returns
+    -------
+    out : numpy array
+        Median filtered data. Windows with no valid values are NaN.
+
+    """
+    rowf, colf = fmat.shape
+    rowd, cold = dat.shape
+    roff = round(rowf/2.0)-1
+    coff = round(colf/2.0)-1
+
+    data = np.ma.filled(np.ma.masked_invalid(dat).astype(np.float64), np.nan)
+    data = np.ascontiguousarray(data)
+
+    # Break the footprint rows into runs of consecutive columns.
+    fmat = fmat.astype(bool)
+    frow = []
+    fcol0 = []
+    fcol1 = []
+    for i in range(rowf):
+        edges = np.diff(np.concatenate(([0], fmat[i].astype(int), [0])))
+        for j0, j1 in zip(np.nonzero(edges == 1)[0],
+                          np.nonzero(edges == -1)[0]):
+            frow.append(i)
+            fcol0.append(j0)
+            fcol1.append(j1-1)
+
+    out = np.full((rowd, cold), np.nan)
+    if not frow:
+        return out
+
+    frow = np.array(frow)
+    fcol0 = np.array(fcol0)
+    fcol1 = np.array(fcol1)
+
+    rstep = 32
+    rstarts = np.arange(0, rowd, rstep)
+    nthreads = get_num_threads()
+    for i in piter(range(0, rstarts.size, nthreads)):
+        _median_strips(data, frow, fcol0, fcol1, roff, coff,
+                       rstarts[i:i+nthreads], rstep, out)
+
+    return out
+
+
+@jit(nopython=True, parallel=True)
+def _median_strips(data, frow, fcol0, fcol1, roff, coff, rstarts, rstep,
+                   out):
+    """
+    Moving window median for strips of rows.
+
+    Parameters
+    ----------
+    data : numpy array
+        Input data, with NaN for invalid values.
+    frow : numpy array
+        Footprint row of each footprint run.
+    fcol0 : numpy array
+        First footprint column of each run.
+    fcol1 : numpy array
+        Last footprint column of each run.
+    roff : int
+        Row offset of the footprint relative to the output pixel.
+    coff : int
+        Column offset of the footprint relative to the output pixel.
+    rstarts : numpy array
+        First row of each strip.
+    rstep : int
+        Number of rows in a strip.
+    out : numpy array
+        Output array.
+
+    Returns
+    -------
+    None.
+
+    """
+    rowd, cold = data.shape
+    nruns = frow.size
+
+    for s in prange(rstarts.size):
+        r0 = rstarts[s]
+        r1 = min(r0+rstep, rowd)
+        b0 = max(r0-roff+frow.min(), 0)
+        b1 = min(r1-roff+frow.max(), rowd)
+        if b1 <= b0:
+            continue
+
+        # Rank the valid values in the block of rows used by this strip.
+        flat = data[b0:b1].ravel()
+        vidx = np.nonzero(~np.isnan(flat))[0]
+        nvalid = vidx.size
+        if nvalid == 0:
+            continue
+        order = np.argsort(flat[vidx])
+        ranks = np.full(flat.size, -1, dtype=np.int64)
+        svals = np.empty(nvalid)
+        for k in range(nvalid):
+            ranks[vidx[order[k]]] = k
+            svals[k] = flat[vidx[order[k]]]
+
+        tree = np.zeros(nvalid+1, dtype=np.int64)
+        top = 1
+        while top*2 <= nvalid:
+            top *= 2
+
+        for i in range(r0, r1):
+            cnt = 0
+            for r in range(nruns):
+                ii = i-roff+frow[r]
+                if ii < b0 or ii >= b1:
+                    continue
+                for jj in range(max(fcol0[r]-coff, 0),
+                                min(fcol1[r]-coff+1, cold)):
+                    rank = ranks[(ii-b0)*cold+jj]
+                    if rank >= 0:
+                        _fenwick_add(tree, rank, 1)
+                        cnt += 1
+
+            for j in range(cold):
+                if cnt > 0:
+                    if cnt % 2 == 1:
+                        out[i, j] = svals[_fenwick_kth(tree, top,
+                                                       (cnt+1)//2)]
+                    else:
+                        out[i, j] = (svals[_fenwick_kth(tree, top, cnt//2)] +
+                                     svals[_fenwick_kth(tree, top,
+                                                        cnt//2+1)])/2
+
+                # Move the window one column to the right.
+                for r in range(nruns):
+                    ii = i-roff+frow[r]
+                    if ii < b0 or ii >= b1:
+                        continue
+                    jj = j+fcol0[r]-coff
+                    if 0 <= jj < cold:
+                        rank = ranks[(ii-b0)*cold+jj]
+                        if rank >= 0:
+                            _fenwick_add(tree, rank, -1)
+                            cnt -= 1
+                    jj = j+fcol1[r]-coff+1
+                    if 0 <= jj < cold:
+                        rank = ranks[(ii-b0)*cold+jj]
+                        if rank >= 0:
+                            _fenwick_add(tree, rank, 1)
+                            cnt += 1
+
+            # Empty the histogram for the next row.
+            for r in range(nruns):
+                ii = i-roff+frow[r]
+                if ii < b0 or ii >= b1:
+                    continue
+                for jj in range(max(cold+fcol0[r]-coff, 0),
+                                min(cold+fcol1[r]-coff+1, cold)):
+                    rank = ranks[(ii-b0)*cold+jj]
+                    if rank >= 0:
+                        _fenwick_add(tree, rank, -1)
+
+
+@jit(nopython=True)
+def _fenwick_add(tree, rank, val):
+    """
+    Add a value to a rank in a Fenwick (binary indexed) tree.
+
+    Parameters
+    ----------
+    tree : numpy array
+        Fenwick tree of counts.
+    rank : int
+        Zero based rank.
+    val : int
+        Value to add.
+
+    Returns
+    -------
+    None.
+
+    """
+    i = rank+1
+    while i < tree.size:
+        tree[i] += val
+        i += i & (-i)
+
+
+@jit(nopython=True)
+def _fenwick_kth(tree, top, k):
+    """
+    Find the k-th smallest rank in a Fenwick tree of counts.
+
+    Parameters
+    ----------
+    tree : numpy array
+        Fenwick tree of counts.
+    top : int
+        Largest power of two not greater than the number of ranks.
+    k : int
+        One based order of the rank to find.
+
+    Returns
+    -------
+    pos : int
+        Zero based rank.
+
+    """
+    pos = 0
+    step = top
+    while step > 0:
+        if pos+step < tree.size and tree[pos+step] < k:
+            pos += step
+            k -= tree[pos]
+        step //= 2
+    return pos
+
+
 def filters2d(filtertype, sze, *sigma):
     """
     Filter 2D.
@@ -41,7 +41,7 @@ from matplotlib.figure import Figure
 import matplotlib.cm as cm
 from matplotlib.backends.backend_qt5agg import FigureCanvas
 from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT
-from numba import jit
+from scipy.spatial import cKDTree
 import pygmi.raster.cooper as cooper
 import pygmi.raster.dataprep as dataprep
 import pygmi.menu_default as menu_default
@@ -285,7 +285,7 @@ class TiltDepth(QtWidgets.QDialog):
 
         return True
 
-    def tiltdepth(self, data):
+    def tiltdepth(self, data, workers=-1):
         """
         Calculate tilt depth.
 
@@ -295,6 +295,9 @@ class TiltDepth(QtWidgets.QDialog):
         ----------
         data : PyGMI Data.
             PyGMI raster dataset.
+        workers : int, optional
+            Number of threads used for the nearest neighbour queries. -1 uses
+            all available processors. The default is -1.
 
         Returns
         -------
@@ -342,17 +345,11 @@ class TiltDepth(QtWidgets.QDialog):
         gx45, gy45, _, _ = vgrad(cnt45)
         gxm45, gym45, _, _ = vgrad(cntm45)
 
-        g0 = np.transpose([gx0, gy0])
+        dmin1 = nearest_vertex(gx45, gy45, gx0, gy0, workers)
+        dmin2 = nearest_vertex(gxm45, gym45, gx0, gy0, workers)
 
         self.pbar.setValue(4)
 
-        dmin1 = []
-        dmin2 = []
-
-        for i, j in self.pbar.iter(g0):
-            dmin1.append(distpc(gx45, gy45, i, j, 0))
-            dmin2.append(distpc(gxm45, gym45, i, j, 0))
-
         dx1 = gx45[dmin1] - gx0
         dy1 = gy45[dmin1] - gy0
 
@@ -410,38 +407,32 @@ class TiltDepth(QtWidgets.QDialog):
         self.outdata['Raster'] = [dat]
 
 
-@jit(nopython=True, nogil=True)
-def distpc(dx, dy, dx0, dy0, dcnt):
+def nearest_vertex(dx, dy, dx0, dy0, workers=-1):
     """
-    Find closest distances.
+    Find the closest contour vertices.
 
     Parameters
     ----------
     dx : numpy array
-        X array.
+        X array of contour vertices.
     dy : numpy array
-        Y array.
-    dx0 : float
-        X point to measure distance from.
-    dy0 : float
-        Y point to measure distance from.
-    dcnt : int
-        Starting index to measure distance from.
+        Y array of contour vertices.
+    dx0 : numpy array
+        X points to measure distances from.
+    dy0 : numpy array
+        Y points to measure distances from.
+    workers : int, optional
+        Number of threads used for the query. -1 uses all available
+        processors. The default is -1.
 
     Returns
     -------
-    dcnt : int
-        Index of closest distance found in x and y arrays.
+    dcnt : numpy array
+        Index of the closest vertex in x and y arrays, for each point.
 
     """
-    num = dx.size
-    dmin = (dx0-dx[dcnt])**2+(dy0-dy[dcnt])**2
-
-    for i in range(num):
-        dist = (dx0-dx[i])**2+(dy0-dy[i])**2
-        if dmin > dist:
-            dcnt = i
-            dmin = dist
+    tree = cKDTree(np.transpose([dx, dy]))
+    _, dcnt = tree.query(np.transpose([dx0, dy0]), workers=workers)
 
     return dcnt
 
@@ -467,29 +458,21 @@ def vgrad(cnt):
         Contour index.
 
     """
-    gx = []
-    gy = []
-    dx2 = []
-    dy2 = []
-    cntid = []
-
-    n = 0
-    for cntvert in cnt.allsegs[0]:
-        n += 1
-
-        dx = np.diff(cntvert[:, 0])
-        dy = np.diff(cntvert[:, 1])
-
-        cntid.extend([n]*dx.size)
-
-        gx.extend((cntvert[:, 0][:-1] + dx/2).tolist())
-        gy.extend((cntvert[:, 1][:-1] + dy/2).tolist())
-        dx2.extend(dx)
-        dy2.extend(dy)
-
-    cgrad = np.arctan2(dy2, dx2)
+    segs = list(cnt.allsegs[0])
+    if not segs:
+        segs = [np.zeros((0, 2))]
+
+    # Segment midpoints and direction vectors, with contour numbers from 1.
+    dx = np.concatenate([np.diff(i[:, 0]) for i in segs])
+    dy = np.concatenate([np.diff(i[:, 1]) for i in segs])
+    gx = np.concatenate([i[:-1, 0] for i in segs]) + dx/2
+    gy = np.concatenate([i[:-1, 1] for i in segs]) + dy/2
+    cntid = np.repeat(np.arange(1, len(segs)+1),
+                      [max(len(i)-1, 0) for i in segs])
+
+    cgrad = np.arctan2(dy, dx)
     cgrad = np.rad2deg(cgrad)
     cgrad[cgrad > 90] -= 180.
     cgrad[cgrad < -90] += 180.
 
-    return np.array(gx), np.array(gy), cgrad, np.array(cntid)
+    return gx, gy, cgrad, cntid
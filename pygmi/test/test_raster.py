@@ -31,12 +31,18 @@ import os
 import glob
 import sys
 import tempfile
+import warnings
+import zlib
 from PyQt5 import QtWidgets, QtCore
 import numpy as np
+from matplotlib.figure import Figure
+import scipy.stats as st
 import pytest
-from pygmi.raster.datatypes import Data
-from pygmi.raster import cooper, dataprep, equation_editor, ginterp, graphs
-from pygmi.raster import igrf, iodefs, normalisation, smooth, tiltdepth
+from osgeo import ogr
+from pygmi.raster.datatypes import Data, RunningStats
+from pygmi.raster import anaglyph, cooper, dataprep, equation_editor
+from pygmi.raster import ginterp, graphs, igrf, iodefs, normalisation
+from pygmi.raster import smooth, tiltdepth
 
 APP = QtWidgets.QApplication(sys.argv)  # Necessary to test Qt Classes
 
@@ -94,17 +100,103 @@ def test_tilt1():
     np.testing.assert_array_equal(tdx, tdx2)
 
 
+def test_vertical():
+    """test vertical derivative."""
+    datin = np.ma.array([[1., 2., 3.], [1., 2., 4.], [2., 3., 5.]])
+    dz2 = [[-4.695504202100649, -1.5539115485108557, -1.5876811050789374],
+           [-5.035990820172267, -1.8943981665824743, 1.8943981665824738],
+           [-3.0348725278969777, 0.10672012569281586, 3.0348725278969777]]
+    dz = cooper.vertical(datin, 4, 1)
+
+    np.testing.assert_allclose(dz, dz2)
+
+
+def test_vertical_default():
+    """test vertical derivative with the default padding."""
+    datin = np.ma.array([[-3., -5., -6., -6., -5., -3.],
+                         [0., -5., -8., -9., -8., -5.],
+                         [2., 0., -6., 0., -9., -6.],
+                         [3., 3., 0., -6., -8., -6.],
+                         [3., 4., 3., 0., -5., -5.]])
+    datin[2, 3] = np.ma.masked
+    dz2 = [[-0.05131547540146003, -0.1759159153562566, -0.113521439852311,
+            -0.0012286889627082243, 0.0014166043006448303,
+            0.24223687037282288],
+           [0.4147436326102952, -0.543048968329957, -0.7548461697698536,
+            -0.8984503949446554, -0.607982045428194, 0.010400900943494863],
+           [0.3812463655405396, 0.5488690228117594, -0.7719299822962586,
+            0.4712106245266795, -0.894354385829369, 0.0014570865840481118],
+           [0.32441034299162547, 0.5986689081828206, 0.343927823067562,
+            -0.7686982383910885, -0.7579129469607777, -0.11118861950239559],
+           [0.22628634480385312, 0.6371665266584194, 0.6118311282437965,
+            0.6871216355563183, -0.2867251167238627, -0.024352726654900625]]
+    dz = cooper.vertical(datin, xint=10)
+
+    np.testing.assert_allclose(dz, dz2, atol=1e-12)
+
+
 def test_rtp():
     """test rtp."""
     datin = Data()
     datin.data = np.ma.array([[1, 2], [1, 2]])
-    dat2 = [[0.8763800720931049, 2.123619927906895],
-            [0.8763800720931049, 2.123619927906895]]
+    dat2 = [[0.9792899408284023, 2.0207100591715976],
+            [0.9792899408284023, 2.0207100591715976]]
 
     dat = dataprep.rtp(datin, 60, 30)
     np.testing.assert_array_equal(dat.data, dat2)
 
 
+def test_rtp_batch():
+    """test batched rtp with a pseudo-inclination."""
+    rng = np.random.default_rng(0)
+    datin = []
+    for shape in [(20, 30), (25, 16), (20, 30)]:
+        dat = Data()
+        dat.data = np.ma.array(rng.random(shape))
+        dat.data[3:5, 4:6] = np.ma.masked
+        datin.append(dat)
+
+    dat = dataprep.rtp_batch(datin, -20, 15, -20)
+
+    for i, j in zip(datin, dat):
+        dat2 = dataprep.rtp(i, -20, 15)
+        np.testing.assert_allclose(j.data, dat2.data)
+        np.testing.assert_array_equal(j.data.mask, i.data.mask)
+
+    dat = dataprep.rtp_batch(datin, -5, 15, -30)
+    dat2 = dataprep.rtp(datin[0], -5, 15)
+
+    assert np.std(dat[0].data) < np.std(dat2.data)
+
+
+def test_rtp_dipole():
+    """test rtp against the field of an induced point dipole."""
+
+    def dipole(inc, dec):
+        inc, dec = np.deg2rad([inc, dec])
+        fdir = np.array([np.cos(inc)*np.sin(dec), np.cos(inc)*np.cos(dec),
+                         np.sin(inc)])[:, np.newaxis, np.newaxis]
+        rows, cols = np.indices((128, 128))
+        rvec = np.array([(cols-64)*10., (64-rows)*10.,
+                         np.full(rows.shape, -100.)])
+        rlen = np.sqrt((rvec**2).sum(0))
+        mdotr = (fdir*rvec).sum(0)/rlen
+        bvec = (3*mdotr*rvec/rlen-fdir)/rlen**3
+        return (bvec*fdir).sum(0)
+
+    datin = Data()
+    datin.data = np.ma.array(dipole(-62.5, -16.75))
+    datin.xdim = 10.
+    datin.ydim = 10.
+    dat2 = dipole(90., 0.)
+
+    dat = dataprep.rtp(datin, -62.5, -16.75)
+
+    win = np.s_[32:96, 32:96]
+    np.testing.assert_allclose(dat.data[win], dat2[win],
+                               atol=0.002*np.abs(dat2).max())
+
+
 def test_check_dataid():
     """test check dataid."""
     datin = [Data(), Data()]
@@ -130,6 +222,150 @@ def test_trimraster():
     np.testing.assert_array_equal(dat[0].data, dat2)
 
 
+@pytest.mark.parametrize("maskmode", ['nan', 'packed'])
+def test_trimraster_maskmode(maskmode):
+    """test trim raster with compact masks."""
+    datin = Data()
+    datin.data = np.ma.masked_equal([[0., 0., 0., 0.],
+                                     [0., 1., 2., 0.],
+                                     [0., 1., 0., 0.],
+                                     [0., 0., 0., 0.]], 0)
+    datin.nullvalue = 0.
+    datin.set_maskmode(maskmode)
+
+    dat = dataprep.trim_raster([datin])
+
+    assert dat[0].maskmode == maskmode
+    np.testing.assert_array_equal(dat[0].get_mask(), [[False, False],
+                                                      [False, True]])
+    np.testing.assert_array_equal(dat[0].get_window(0, 0, 2, 1), [[1.],
+                                                                  [1.]])
+    assert dat[0].maskmode == maskmode
+    np.testing.assert_array_equal(dat[0].data.compressed(), [1., 2., 1.])
+    assert dat[0].maskmode == 'masked'
+
+
+def test_maskmode_integer():
+    """test that integer data is packed rather than promoted to float."""
+    datin = Data()
+    datin.data = np.ma.masked_equal(np.array([[0, 1], [2, 3]], np.uint8), 0)
+    datin.set_maskmode('nan')
+
+    assert datin.maskmode == 'packed'
+    assert datin.get_values().dtype == np.uint8
+    np.testing.assert_array_equal(datin.data.mask, [[True, False],
+                                                    [False, False]])
+
+
+@pytest.mark.parametrize("maskmode", ['nan', 'packed'])
+def test_maskmode_data(maskmode):
+    """test that changes through the data attribute are kept."""
+    datin = Data()
+    datin.data = np.ma.array([[1., 2.], [3., 4.]], mask=[[0, 0], [0, 1]])
+    datin.set_maskmode(maskmode)
+
+    datin.data.mask[0, 0] = True
+    datin.data[1, 0] = 5.
+
+    assert datin.maskmode == 'masked'
+    assert datin.data.count() == 2
+    np.testing.assert_array_equal(datin.get_mask(), [[True, False],
+                                                     [False, True]])
+    np.testing.assert_array_equal(datin.data.compressed(), [2., 5.])
+
+    datin.set_maskmode(maskmode)
+    datin.data.mask = [[True, True], [False, True]]
+
+    np.testing.assert_array_equal(datin.compressed(), [5.])
+
+
+@pytest.mark.parametrize("method, overlap", [('first', 1.), ('last', 3.),
+                                             ('mean', 2.)])
+def test_mosaic(method, overlap):
+    """test mosaic."""
+    dat1 = Data()
+    dat1.data = np.ma.ones((4, 4))
+    dat1.extent = (0., 4., 0., 4.)
+    dat2 = Data()
+    dat2.data = np.ma.ones((4, 4))*3.
+    dat2.extent = (2., 6., 0., 4.)
+
+    dat = dataprep.mosaic([dat1, dat2], method=method, resampling='near')
+
+    dat3 = np.ma.array([[1., 1., overlap, overlap, 3., 3.]]*4)
+
+    assert dat.extent == (0., 6., 0., 4.)
+    np.testing.assert_array_equal(dat.data, dat3)
+
+
+def test_mosaic_dtype():
+    """test that mosaic keeps a common integer data type."""
+    dat1 = Data()
+    dat1.data = np.ma.masked_equal(np.array([[0, 1], [2, 3]], np.int16), 0)
+    dat1.extent = (0., 2., 0., 2.)
+    dat1.nullvalue = 0
+    dat2 = Data()
+    dat2.data = np.ma.array(np.full((2, 2), 7, np.int16))
+    dat2.extent = (2., 4., 0., 2.)
+    dat2.nullvalue = 0
+
+    dat = dataprep.mosaic([dat1, dat2], resampling='near')
+
+    assert dat.data.dtype == np.int16
+    np.testing.assert_array_equal(dat.data, np.ma.masked_equal([[0, 1, 7, 7],
+                                                                [2, 3, 7, 7]],
+                                                               0))
+
+
+def test_data_reproject():
+    """test data reproject."""
+    datin = Data()
+    datin.data = np.ma.array([[1., 2., 3.],
+                              [4., 5., 6.]], mask=[[0, 0, 0], [0, 0, 1]])
+    datin.extent = (500000., 500030., 7000000., 7000020.)
+    datin.xdim = 10.
+    datin.ydim = 10.
+    wkt = dataprep.epsgtowkt(32735)
+
+    dat = dataprep.data_reproject(datin, wkt, wkt, resampling='near')
+
+    np.testing.assert_array_equal(dat.data, datin.data)
+    np.testing.assert_array_equal(dat.data.mask, datin.data.mask)
+    assert dat.wkt == wkt
+
+
+def test_cut_raster_polygons():
+    """test cutting data with several polygons."""
+    ofile = os.path.join(tempfile.gettempdir(), 'cuttest.shp')
+
+    driver = ogr.GetDriverByName('ESRI Shapefile')
+    shapef = driver.CreateDataSource(ofile)
+    lyr = shapef.CreateLayer('cuttest', geom_type=ogr.wkbPolygon)
+    for wkt in ['POLYGON ((1 1,1 3,3 3,3 1,1 1))',
+                'POLYGON ((5 4,5 6,8 6,8 4,5 4))']:
+        feat = ogr.Feature(lyr.GetLayerDefn())
+        feat.SetGeometry(ogr.CreateGeometryFromWkt(wkt))
+        lyr.CreateFeature(feat)
+    shapef = None
+
+    datin = Data()
+    datin.data = np.ma.array(np.arange(100.).reshape((10, 10)))
+    datin.extent = (0., 10., 0., 10.)
+
+    dat = dataprep.cut_raster_polygons([datin], ofile)
+    dat2 = dataprep.cut_raster([datin], ofile)
+
+    driver.DeleteDataSource(ofile)
+
+    np.testing.assert_array_equal(dat[0][0].data, [[71., 72.],
+                                                   [81., 82.]])
+    assert dat[0][0].extent == (1., 3., 1., 3.)
+    np.testing.assert_array_equal(dat[1][0].data, [[45., 46., 47.],
+                                                   [55., 56., 57.]])
+    np.testing.assert_array_equal(dat2[0].extent, [1., 8., 1., 6.])
+    assert dat2[0].data.count() == 10
+
+
 def test_quickgrid():
     """test quick grid."""
     dat2 = [[1, 1],
@@ -143,6 +379,46 @@ def test_quickgrid():
     np.testing.assert_array_equal(dat, dat2)
 
 
+def test_idwgrid():
+    """test inverse distance and nearest neighbour grids."""
+    dat2 = [[1.3333333333333335, 1.1428571428571428],
+            [1.7142857142857142, 1.391304347826087]]
+    dat3 = [[1, 1],
+            [2, 1]]
+
+    x = np.array([1, 2, 1])
+    y = np.array([1, 1, 2])
+    z = np.array([1, 1, 2])
+
+    dat = dataprep.idwgrid(x, y, z, 1)
+    np.testing.assert_array_almost_equal(dat, dat2)
+
+    dat = dataprep.idwgrid(x, y, z, 1, nnear=1)
+    np.testing.assert_array_equal(dat, dat3)
+
+    dat = dataprep.idwgrid(x, y, z, 1, tilesize=1)
+    np.testing.assert_array_almost_equal(dat, dat2)
+
+
+def test_mincurvgrid():
+    """test minimum curvature grid."""
+    x = np.array([0., 4., 0., 4., 2.])
+    y = np.array([0., 0., 4., 4., 2.])
+    z = x+y
+    dat2 = np.add.outer(np.arange(5.), np.arange(5.))
+
+    dat = dataprep.mincurvgrid(x, y, z, 1., tension=0.)
+    np.testing.assert_array_almost_equal(dat, dat2)
+
+    dat = dataprep.mincurvgrid(x, y, z, 1., tension=0., bdist=1.5)
+    assert not dat.mask[0, 0]
+    assert dat.mask[0, 2]
+
+    dat = dataprep.mincurvgrid(x, y, z, 1., tension=0., tilesize=2,
+                               overlap=4)
+    np.testing.assert_array_almost_equal(dat, dat2)
+
+
 def test_equation():
     """tests equation editor."""
     datin = Data()
@@ -156,6 +432,21 @@ def test_equation():
     np.testing.assert_array_equal(tmp.outdata['Raster'][0].data, datout)
 
 
+def test_equation_blocks():
+    """tests equation editor evaluation in blocks."""
+    datin = Data()
+    datin.data = np.ma.masked_equal([[1., 2.], [0., 2.], [1., 0.]], 0)
+    datin2 = Data()
+    datin2.data = np.ma.masked_equal([[3., 0.], [3., 4.], [3., 0.]], 0)
+    datout = np.ma.masked_equal([[2., 2.], [3., 3.], [2., 0.]], 0)
+
+    tmp = equation_editor.EquationEditor()
+    dat = tmp.evaluate([datin, datin2], 'mosaic(i0, i1)', blockrows=2)
+
+    np.testing.assert_array_equal(dat[0].data, datout)
+    np.testing.assert_array_equal(dat[0].data.mask, datout.mask)
+
+
 def test_hmode():
     """tests hmode."""
     datin = [1, 2, 3, 3, 4, 5, 6]
@@ -215,6 +506,41 @@ def test_shader():
     dat = ginterp.currentshader(data, cell, theta, phi, alpha)
     np.testing.assert_array_equal(dat, dat2)
 
+    grads = ginterp.sobel_gradients(data)
+    dat = ginterp.currentshader(None, cell, theta, phi, alpha, grads)
+    np.testing.assert_array_equal(dat, dat2)
+
+
+def test_overviews():
+    """test ModestImage overview levels against direct 2x2 means."""
+    data = np.ma.array(np.arange(42.).reshape(6, 7))
+    data[0, :3] = np.ma.masked
+
+    def mean2x2(dat):
+        rows, cols = dat.shape
+        dat = np.pad(dat.filled(np.nan), ((0, rows % 2), (0, cols % 2)),
+                     constant_values=np.nan)
+        dat = dat.reshape(dat.shape[0]//2, 2, dat.shape[1]//2, 2)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            return np.ma.masked_invalid(np.nanmean(dat, axis=(1, 3)))
+
+    figure = Figure()
+    axes = figure.add_subplot(111)
+    img = ginterp.ModestImage(axes)
+    img.set_data(data)
+
+    dat1 = mean2x2(data)
+    dat2 = mean2x2(dat1)
+
+    for sxy, dat in [(2, dat1), (4, dat2)]:
+        dat3 = img._get_window(data, 0, 6, 0, 7, sxy, sxy)
+        np.testing.assert_array_equal(dat3.mask, dat.mask)
+        np.testing.assert_allclose(dat3.compressed(), dat.compressed())
+
+    img.set_data(data+1)
+    assert not img._overviews
+
 
 def test_histcomp():
     """tests histogram compaction."""
@@ -249,6 +575,62 @@ def test_histeq():
     dat = ginterp.histeq(data)
     np.testing.assert_array_almost_equal(dat, dat2)
 
+    datin = Data()
+    datin.data = data
+    dat = ginterp.histeq(data, hist=datin.get_histogram(32768))
+    np.testing.assert_array_almost_equal(dat, dat2)
+
+
+def test_datastats():
+    """tests cached Data statistics."""
+    datin = Data()
+    datin.data = np.ma.array([[0., 1., 2., 1.], [0., 1., 5., 1.]],
+                             mask=[[0, 0, 0, 0], [0, 0, 1, 0]])
+
+    stats = datin.get_stats()
+    assert stats['max'] == 2.
+    assert stats['median'] == 1.
+    assert stats['count'] == 7
+    assert datin.get_stats() is stats
+
+    datin.data = datin.data*2
+    assert datin.get_stats()['max'] == 4.
+
+
+def test_datahistogram():
+    """tests cached Data histograms."""
+    datin = Data()
+    datin.data = np.ma.array([[0., 1., 2., 1.], [0., 1., 5., 1.]],
+                             mask=[[0, 0, 0, 0], [0, 0, 1, 0]])
+
+    hist, bins = datin.get_histogram(4)
+
+    assert 'stats' not in datin._cache
+    assert datin.get_minmax() == (0., 2.)
+    np.testing.assert_array_equal(hist, [2, 0, 4, 1])
+    np.testing.assert_array_equal(bins, [0., 0.5, 1., 1.5, 2.])
+
+
+def test_runningstats():
+    """tests single pass statistics over merged blocks."""
+    dat = np.random.default_rng(0).gamma(2., 3., 100000)
+
+    rstats = RunningStats(k=1024)
+    rstats2 = RunningStats(k=1024)
+    for i in np.array_split(dat[:60000], 6):
+        rstats.update(i)
+    rstats2.update(dat[60000:])
+    rstats.merge(rstats2)
+    stats = rstats.get_stats()
+
+    assert stats['count'] == dat.size
+    assert stats['max'] == dat.max()
+    np.testing.assert_allclose(stats['mean'], dat.mean())
+    np.testing.assert_allclose(stats['std'], dat.std())
+    np.testing.assert_allclose(stats['skew'], st.skew(dat))
+    np.testing.assert_allclose(stats['kurtosis'], st.kurtosis(dat))
+    assert abs((dat < stats['median']).mean() - 0.5) < 0.01
+
 
 def test_img2rgb():
     """tests img to rgb."""
@@ -327,6 +709,22 @@ def test_corr2d():
     np.testing.assert_array_equal(dat, dat2)
 
 
+def test_corr_matrix():
+    """tests corr_matrix with masked values."""
+    datin = Data()
+    datin.data = np.ma.array([[0., 1., 2., 1.], [5., 1., 3., 4.]],
+                             mask=[[0, 0, 0, 0], [0, 0, 0, 1]])
+    datin2 = Data()
+    datin2.data = np.ma.array([[1., 3., 2., 2.], [4., 0., 2., 1.]],
+                              mask=[[0, 0, 0, 1], [0, 0, 0, 0]])
+
+    dat = graphs.corr_matrix([datin, datin2], blockrows=1)
+    dat2 = graphs.corr2d(datin.data, datin2.data)
+
+    np.testing.assert_allclose(dat, [[1., dat2], [dat2, 1.]])
+    assert not datin.data.mask[0, 3]
+
+
 @pytest.fixture
 def smalldata():
     """Small test dataset."""
@@ -359,6 +757,60 @@ def test_IGRF(smalldata):
     np.testing.assert_array_almost_equal(dat, dat2)
 
 
+def test_IGRF_model():
+    """Tests IGRF model coefficients for several dates at once."""
+    model = igrf.get_model()
+
+    assert igrf.get_model() is model
+
+    gh, nmax = model.get_gh([1902.5, 2000., 2021.])
+
+    np.testing.assert_array_equal(nmax, [10, 13, 13])
+    np.testing.assert_allclose(gh[0, 0], (-31543. + -31464.)/2)
+    np.testing.assert_allclose(gh[1], model.gh[model.epoch == 2000.][0])
+
+    gh2, _ = model.get_gh(2021.)
+    np.testing.assert_array_equal(gh[2], gh2[0])
+
+
+@pytest.mark.parametrize("date, igdgc, pts, dat2", [
+    (1965.25, 1, [[-27.5, 25., 0.], [60., -100., 10.], [0., 0., 100.]],
+     [[12941.761194, -4432.548255, -27882.336937, -0.329977, -1.114676,
+       13679.790453, 31057.388491],
+      [6673.601638, 1674.340379, 60562.735226, 0.245816, 1.457673,
+       6880.434182, 60952.319665],
+      [26530.347746, -5326.350974, -11130.796071, -0.198131, -0.390245,
+       27059.736994, 29259.596501]]),
+    (2021.5, 1, [[-27.5, 25., 0.], [60., -100., 10.], [0., 0., 100.]],
+     [[11408.223697, -4185.422764, -24533.77074, -0.351631, -1.11091,
+       12151.762491, 27378.298676],
+      [9373.513972, 739.559165, 57388.602849, 0.078736, 1.408398,
+       9402.643881, 58153.774159],
+      [26170.392517, -2058.011312, -14803.182183, -0.078477, -0.513456,
+       26251.187688, 30137.336607]]),
+    (2000., 2, [[-27.5, 25., 6371.2], [10., 20., 6500.]],
+     [[11244.076505, -3738.574822, -25381.65147, -0.320994, -1.134022,
+       11849.312138, 28011.326807],
+      [32207.846368, -73.552245, -647.018587, -0.002284, -0.020086,
+       32207.930352, 32214.42861]])])
+def test_shval3_points(date, igdgc, pts, dat2):
+    """
+    Tests the vectorised field calculation.
+
+    Expected values are x, y, z, d, i, h and f from the original scalar
+    shval3 and dihf routines.
+    """
+    pts = np.array(pts)
+    gh, nmax = igrf.get_model().get_gh(date)
+
+    x, y, z = igrf.shval3_points(igdgc, pts[:, 0], pts[:, 1], pts[:, 2],
+                                 nmax[0], gh[0])
+    d, i, h, f = igrf.dihf_points(x, y, z)
+
+    np.testing.assert_allclose(np.transpose([x, y, z, d, i, h, f]), dat2,
+                               rtol=1e-7, atol=1e-6)
+
+
 @pytest.mark.parametrize("ext, drv", [('.bil', 'EHdr'), ('.tif', 'GTiff'),
                                       ('.ers', 'ERS'), ('.hdr', 'ENVI'),
                                       ('.grd', 'GSBG'), ('.sdat', 'SAGA'),
@@ -380,6 +832,42 @@ def test_io_gdal(smalldata, ext, drv):
     np.testing.assert_array_equal(smalldata.data, dat2[0].data)
 
 
+@pytest.mark.parametrize("cog", [False, True])
+def test_io_gtiff_compressed(smalldata, cog):
+    """Tests IO for tiled, compressed and cloud optimised GeoTIFFs."""
+    ofile = os.path.join(tempfile.gettempdir(), 'iotestcog.tif')
+
+    iodefs.export_gdal(ofile, [smalldata], 'GTiff', compress='DEFLATE',
+                       predictor=True, cog=cog, overviews=True, blocksize=16)
+
+    dat2 = iodefs.get_raster(ofile)
+
+    for i in glob.glob(os.path.join(tempfile.gettempdir(), 'iotestcog*')):
+        os.unlink(i)
+
+    np.testing.assert_array_equal(smalldata.data, dat2[0].data)
+
+
+def test_io_lazy(smalldata):
+    """Tests block reading of data left on disk."""
+    ofile = tempfile.gettempdir() + '\\iotest.tif'
+
+    iodefs.export_gdal(ofile, [smalldata], 'GTiff')
+
+    dat2 = iodefs.get_raster(ofile, lazy=True)
+    win = dat2[0].get_window(1, 1, 2, 2)
+    blocks = [i for _, i in dat2[0].blocks(1)]
+    dat3 = dat2[0].data
+
+    dat2 = None
+    for i in glob.glob(tempfile.gettempdir() + '\\iotest*'):
+        os.unlink(i)
+
+    np.testing.assert_array_equal(smalldata.data[1:3, 1:3], win)
+    np.testing.assert_array_equal(smalldata.data, np.ma.vstack(blocks))
+    np.testing.assert_array_equal(smalldata.data, dat3)
+
+
 def test_io_ascii(smalldata):
     """Tests IO for ascii files."""
     ofile = tempfile.gettempdir() + '\\iotest.asc'
@@ -414,6 +902,120 @@ def test_io_xyz(smalldata):
     np.testing.assert_array_equal(smalldata.data, dat2[0].data)
 
 
+def test_io_xyz_gzip():
+    """Tests gzip compressed xyz export with nodata substitution."""
+    ofile = os.path.join(tempfile.gettempdir(), 'iotest.xyz.gz')
+
+    datin = Data()
+    datin.data = np.ma.array([[1., 2.],
+                              [3., 4.]], mask=[[0, 1], [0, 0]])
+    datin.extent = (0., 2., 0., 2.)
+
+    iodefs.export_xyz(ofile, datin, nodata=-99., compress=True)
+    dat = np.loadtxt(ofile)
+    os.unlink(ofile)
+
+    np.testing.assert_array_equal(dat, [[0., 2., 1.],
+                                        [1., 2., -99.],
+                                        [0., 1., 3.],
+                                        [1., 1., 4.]])
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+def test_io_ascii_shortest(dtype):
+    """Tests ascii exports write the shortest exact values."""
+    ofile = os.path.join(tempfile.gettempdir(), 'iotests.xyz')
+
+    datin = Data()
+    datin.data = np.ma.array([[0.1, 1/3]], dtype=dtype)
+    datin.extent = (0.1, 0.3, 0.2, 0.3)
+    datin.xdim = 0.1
+    datin.ydim = 0.1
+
+    iodefs.export_xyz(ofile, datin)
+    with open(ofile, encoding='utf-8') as fno:
+        lines = fno.read().split()
+    iodefs.export_ascii(ofile, datin)
+    with open(ofile, encoding='utf-8') as fno:
+        vals = fno.read().split()[-2:]
+    os.unlink(ofile)
+
+    assert lines[:3] == ['0.1', '0.3', '0.1']
+    assert vals[0] == '0.1'
+    np.testing.assert_array_equal(np.array(vals, dtype=dtype),
+                                  datin.data[0])
+    np.testing.assert_array_equal(np.array(lines[2::3], dtype=dtype),
+                                  datin.data[0])
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_io_geosoft(smalldata, lazy):
+    """Tests IO for Geosoft grids."""
+    ofile = os.path.join(tempfile.gettempdir(), 'iotest.grd')
+
+    iodefs.export_geosoft(ofile, smalldata)
+    dat2 = iodefs.get_geosoft(ofile, lazy)
+    win = dat2[0].get_window(1, 0, 1, 2)
+    dat3 = dat2[0].data
+
+    dat2 = None
+    os.unlink(ofile)
+
+    np.testing.assert_array_equal(smalldata.data[1:], win)
+    np.testing.assert_array_equal(smalldata.data, dat3)
+
+
+def test_io_geosoft_compressed():
+    """Tests reading a compressed Geosoft grid."""
+    ofile = os.path.join(tempfile.gettempdir(), 'iotestc.grd')
+
+    data = np.arange(15, dtype=np.float32).reshape(5, 3)
+    data[1, 2] = -1.0E+32
+    vpb = 2
+
+    header = np.zeros(1, dtype=iodefs._GRD_HEADER)
+    header['es'] = 1024 + 4
+    header['sf'] = 2
+    header['ncols'] = 3
+    header['nrows'] = 5
+    header['kx'] = 1
+    header['dx'] = 10.
+    header['dy'] = 10.
+    header['zmult'] = 1.
+
+    # Rows are stored from the bottom up, in zlib blocks of vpb rows.
+    vecs = data[::-1]
+    blocks = [b'\0'*16 + zlib.compress(vecs[i:i+vpb].tobytes())
+              for i in range(0, 5, vpb)]
+    nblocks = len(blocks)
+    sizes = np.array([len(i) for i in blocks], dtype='<i4')
+    offsets = 512 + 12 + 12*nblocks + np.cumsum([0]+list(sizes[:-1]))
+
+    with open(ofile, 'wb') as fno:
+        header.tofile(fno)
+        np.array([1, nblocks, vpb], dtype='<i4').tofile(fno)
+        offsets.astype('<i8').tofile(fno)
+        sizes.tofile(fno)
+        for i in blocks:
+            fno.write(i)
+
+    source = iodefs.GeosoftBlockReader(ofile, maxblocks=2)
+    full = source.read()
+    win = source.read(1, 1, 3, 2)
+    ncache = len(source.cache)
+    dat2 = iodefs.get_geosoft(ofile, lazy=True)[0].data
+
+    source = None
+    os.unlink(ofile)
+
+    mask = (data == -1.0E+32)
+    assert ncache == 2
+    np.testing.assert_array_equal(full.mask, mask)
+    np.testing.assert_array_equal(full, np.ma.array(data, mask=mask))
+    np.testing.assert_array_equal(win, full[1:4, 1:3])
+    np.testing.assert_array_equal(dat2, full)
+
+
 def test_normalisation():
     """Tests for normalisation."""
 
@@ -539,6 +1141,50 @@ def test_smooth():
     np.testing.assert_array_almost_equal(datout2, datout)
 
 
+def test_masked_correlate2d():
+    """Tests for normalised convolution of masked data."""
+    datin = np.ma.ones([5, 5])
+    datin[2, 2] = 10.
+    datin[2, 2] = np.ma.masked
+    fmat = smooth.filters2d('average', [3, 3])
+
+    datout = smooth.masked_correlate2d(datin, fmat)
+
+    assert np.isnan(datout[2, 2])
+    np.testing.assert_array_almost_equal(datout[1:4, 1], [1., 1., 1.])
+    np.testing.assert_array_almost_equal(datout[1:4, 3], [1., 1., 1.])
+
+
+@pytest.mark.parametrize("fmat", [np.ones((3, 3)), np.ones((4, 2)),
+                                  [[0, 1, 0], [1, 1, 1], [0, 1, 0]]])
+def test_median2d(fmat):
+    """Tests the moving window median against np.nanmedian windows."""
+    rng = np.random.default_rng(0)
+    fmat = np.array(fmat)
+    datin = np.ma.array(rng.integers(0, 10, (40, 7)).astype(float))
+    datin[5:9, 2:5] = np.ma.masked
+    datin[20, 3] = np.nan
+
+    datout = smooth.median2d(datin, fmat)
+
+    rowf, colf = fmat.shape
+    roff = round(rowf/2.0)-1
+    coff = round(colf/2.0)-1
+    tmp = np.pad(datin.filled(np.nan), ((roff, rowf-roff-1),
+                                        (coff, colf-coff-1)),
+                 constant_values=np.nan)
+    dat2 = np.full(datin.shape, np.nan)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        for i in range(datin.shape[0]):
+            for j in range(datin.shape[1]):
+                win = tmp[i:i+rowf, j:j+colf][fmat.astype(bool)]
+                dat2[i, j] = np.nanmedian(win)
+
+    assert np.isnan(dat2).any()
+    np.testing.assert_allclose(datout, dat2)
+
+
 def test_tilt():
     """test tilt depth."""
 
@@ -567,5 +1213,38 @@ def test_tilt():
     np.testing.assert_array_almost_equal(datout2, datout)
 
 
+def test_stereo_columns():
+    """test anaglyph stereo columns and row shifts."""
+    y, x = np.indices((3, 6))
+    x = x*10
+    z = np.ma.zeros((3, 6))
+
+    scol = anaglyph.stereo_columns(x, z, 60, 'red')
+    scol2 = np.minimum(x/10/np.cos(np.deg2rad(60)), 5)
+
+    np.testing.assert_allclose(scol, scol2)
+
+    scol = anaglyph.stereo_columns(x, z, 60, 'blue')
+
+    np.testing.assert_allclose(scol, 5-scol2[:, ::-1])
+
+    dat = anaglyph.shift_columns(y*6.+x/10, np.full((3, 6), 2.5))
+
+    np.testing.assert_allclose(dat, y*6.+2.5)
+
+
+def test_nearest_vertex():
+    """test nearest contour vertex search."""
+    rng = np.random.default_rng(0)
+    gx, gy = rng.random((2, 200))
+    x0, y0 = rng.random((2, 50))
+
+    dist = (x0[:, None]-gx)**2+(y0[:, None]-gy)**2
+
+    dcnt = tiltdepth.nearest_vertex(gx, gy, x0, y0)
+
+    np.testing.assert_array_equal(dcnt, dist.argmin(1))
+
+
 if __name__ == "__main__":
     test_tilt()